@@ -0,0 +1,77 @@
+"""
+Benchmark of the cold start of a worker.
+
+Every run starts a fresh interpreter that imports the app, which is what a new worker does.
+The script prints the time until the app is importable ("import") and the time until the
+readiness endpoint reports the schema bootstrap as done ("ready"). When Weaviate is not
+reachable the import still has to succeed quickly and the worker has to report itself not ready.
+
+The Weaviate instance is the one configured by HOST, use --host to point to another one, for
+example an address where nothing listens to measure the start without a database.
+
+Usage:
+    python -m benchmarks.bench_cold_start [--runs 5] [--host http://127.0.0.1:8080] [--ready-timeout 30]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+WORKER = """
+import json, time
+started = time.perf_counter()
+import src.main
+imported = time.perf_counter() - started
+from fastapi.testclient import TestClient
+ready = None
+with TestClient(src.main.app) as client:
+    deadline = started + {ready_timeout}
+    while time.perf_counter() < deadline:
+        if client.get("/utility/ready").status_code == 200:
+            ready = time.perf_counter() - started
+            break
+        time.sleep(0.01)
+print(json.dumps({{"import": imported, "ready": ready}}))
+"""
+
+
+def run_worker(env: dict, ready_timeout: float) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", WORKER.format(ready_timeout=ready_timeout)],
+        env=env, capture_output=True, text=True
+    )
+    if completed.returncode != 0:
+        return {"import": None, "ready": None, "error": completed.stderr.strip().splitlines()[-1]}
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def summarize(values: list) -> dict:
+    values = [value for value in values if value is not None]
+    if not values:
+        return {"runs": 0}
+    return {"runs": len(values), "median_s": statistics.median(values), "max_s": max(values)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--host", default=None)
+    parser.add_argument("--ready-timeout", type=float, default=30)
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if args.host:
+        env["HOST"] = args.host
+    results = [run_worker(env, args.ready_timeout) for _ in range(args.runs)]
+    errors = [result["error"] for result in results if "error" in result]
+    print(json.dumps({
+        "import": summarize([result["import"] for result in results]),
+        "ready": summarize([result["ready"] for result in results]),
+        "errors": errors,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Benchmark of /calculator/zakat-property latency against the number of line items.
+
+metalpriceapi is replaced by a stub that blocks for a fixed time per call. The rates of a request
+are fetched in one call, then the line items are valued from them in a single pass. Two states of
+the rate cache are compared:
+- "cold": the cache is cleared before every request, so each one makes the upstream call;
+- "warm": the rates are already cached, so the request makes no upstream call.
+
+Usage:
+    python -m benchmarks.bench_property_items [--items 1 5 20 100] [--latency-ms 50] [--repeat 5]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from src.calculator.router import calculate_zakat_on_property
+from src.calculator.schemas import ZakatOnProperty
+from src.calculator.utility import nisab_api_client
+from src.calculator.utility.nisab_api_client import RateCache
+
+STUB_RATES = {"RUB": 90.0, "EUR": 0.92, "KZT": 450.0, "GBP": 0.79, "XAU": 0.0004, "XAG": 0.034}
+
+
+def stub_provider(latency: float):
+    def fetch_rates(currencies):
+        time.sleep(latency)
+        return {currency: STUB_RATES[currency] for currency in currencies}
+    return fetch_rates
+
+
+def build_property(items: int) -> dict:
+    codes = ["EUR", "KZT", "GBP", "RUB"]
+    cash = [{"currency_code": codes[i % len(codes)], "value": 1000 + i} for i in range(items)]
+    fields = ["cash_on_bank_cards", "silver_jewelry", "gold_jewelry", "purchased_product_for_resaling",
+              "unfinished_product", "produced_product_for_resaling", "purchased_not_for_resaling",
+              "used_after_nisab", "rent_money", "stocks_for_resaling", "income_from_stocks", "taxes_value"]
+    return {"cash": cash, **{field: None for field in fields}, "currency": "RUB"}
+
+
+async def measure(items: int, cold: bool, latency: float, repeat: int) -> float:
+    nisab_api_client.rate_cache = RateCache(stub_provider(latency), ttl=600, timeout=60)
+    await calculate_zakat_on_property(ZakatOnProperty(**build_property(items)))
+    timings = []
+    for _ in range(repeat):
+        if cold:
+            nisab_api_client.rate_cache.clear()
+        property = ZakatOnProperty(**build_property(items))
+        start = time.perf_counter()
+        await calculate_zakat_on_property(property)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[1, 5, 20, 100])
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'items':>6} {'cold ms':>10} {'warm ms':>10}")
+    for items in args.items:
+        cold = await measure(items, True, args.latency_ms / 1000, args.repeat)
+        warm = await measure(items, False, args.latency_ms / 1000, args.repeat)
+        print(f"{items:>6} {cold:>10.1f} {warm:>10.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,350 @@
+"""
+Load test of every router against the in-process Weaviate stand-in.
+
+Weaviate is replaced by FakeWeaviateClient (WEAVIATE_FAKE) with a fixed latency per call, and the
+other upstreams (Jina embeddings, Mistral generation, metalpriceapi, the link checks) by stubs with
+their own latency, so the run needs no database and no API keys. The collections are seeded with
+the same data on every run. Each scenario sends --requests requests to one endpoint with at most
+--concurrency in flight, and records the throughput and the p50/p95/p99 latency. Latency is
+measured from the moment a request is issued, so it includes the time waiting for the event loop.
+
+The results are written as JSON with --output. With --compare, the run is checked against a
+baseline written earlier: the script exits with status 1 if the throughput of a scenario dropped
+or its p95 latency grew by more than --tolerance (and by at least --min-delta-ms), or if it started
+failing requests.
+
+Usage:
+    python -m benchmarks.bench_routers [--requests 200] [--concurrency 20] [--latency-ms 5]
+        [--upstream-latency-ms 20] [--only search] [--output baseline.json]
+        [--compare benchmarks/baseline.json] [--tolerance 0.25] [--min-delta-ms 2]
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+SEED_ARTICLES = 200
+SEED_NEWS = 300
+SEED_ORGANIZATIONS = 300
+SEED_REQUESTS = 100
+
+TOPICS = ["zakat", "nisab", "gold", "silver", "livestock", "charity", "ramadan", "fitr", "sadaqah", "waqf"]
+COUNTRIES = ["KZ", "RU", "UZ", "TR", "AE", "ID", "MY", "EG"]
+CATEGORIES = ["orphans", "education", "health", "water", "food", "mosques"]
+
+
+def article(i: int) -> dict:
+    topic = TOPICS[i % len(TOPICS)]
+    text = f"Article {i} about {topic} and {TOPICS[(i * 7) % len(TOPICS)]}. " * 20
+    return {"tags": [topic, TOPICS[(i + 3) % len(TOPICS)]], "title": f"{topic.title()} guide {i}", "text": text,
+            "content": json.dumps({"ops": [{"insert": text}, {"insert": "bold", "attributes": {"bold": True}}]})}
+
+
+def news(i: int) -> dict:
+    topic = TOPICS[i % len(TOPICS)]
+    return {"name": f"{topic.title()} news {i}", "body": f"News {i} about {topic}. " * 30,
+            "source_link": f"https://example.org/news/{i}", "tags": [topic]}
+
+
+def organization(i: int) -> dict:
+    return {"name": f"{CATEGORIES[i % len(CATEGORIES)].title()} fund {i}",
+            "description": f"Organization {i} helping with {CATEGORIES[i % len(CATEGORIES)]}. " * 10,
+            "link": f"https://example.org/organizations/{i}",
+            "categories": [CATEGORIES[i % len(CATEGORIES)], CATEGORIES[(i + 2) % len(CATEGORIES)]],
+            "countries": [COUNTRIES[i % len(COUNTRIES)]]}
+
+
+def article_payload(i: int) -> dict:
+    return dict(article(i), content=json.loads(article(i)["content"]))
+
+
+def property_payload(i: int) -> dict:
+    fields = ["cash_on_bank_cards", "silver_jewelry", "gold_jewelry", "purchased_product_for_resaling",
+              "unfinished_product", "produced_product_for_resaling", "purchased_not_for_resaling",
+              "used_after_nisab", "rent_money", "stocks_for_resaling", "income_from_stocks", "taxes_value"]
+    cash = [{"currency_code": code, "value": 1000 + i} for code in ("EUR", "KZT", "RUB")]
+    return {"cash": cash, **{field: None for field in fields}, "currency": "RUB"}
+
+
+class Scenario:
+    """
+    Requests to one endpoint. `path` may contain '{id}', filled from the objects of `pool_class`
+    seeded for the scenario, one object per request. `body` builds the JSON body or the raw content
+    of request i.
+    """
+
+    def __init__(self, name: str, method: str, path: str, body: Optional[Callable[[int], object]] = None,
+                 pool_class: Optional[str] = None, pool_factory: Optional[Callable[[int], dict]] = None,
+                 reuse_pool: bool = False):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.pool_class = pool_class
+        self.pool_factory = pool_factory
+        self.reuse_pool = reuse_pool
+
+
+SCENARIOS = [
+    # Knowledge base
+    Scenario("articles.list", "GET", "/knowledge-base/get-articles"),
+    Scenario("articles.list_page", "GET", "/knowledge-base/get-articles?limit=20"),
+    Scenario("articles.get", "GET", "/knowledge-base/get-article/{id}", pool_class="Article",
+             pool_factory=article, reuse_pool=True),
+    Scenario("articles.search", "POST", "/knowledge-base/search-article/",
+             lambda i: {"searchString": f"{TOPICS[i % len(TOPICS)]} rules {i % 40}"}),
+    Scenario("articles.ask", "POST", "/knowledge-base/ask-question/",
+             lambda i: {"question": f"How much {TOPICS[i % len(TOPICS)]} is due after {i % 30} years"}),
+    Scenario("articles.ask_stream", "POST", "/knowledge-base/ask-question/stream",
+             lambda i: {"question": f"When is {TOPICS[i % len(TOPICS)]} paid in year {i % 30}"}),
+    Scenario("articles.send_request", "POST", "/knowledge-base/send-request",
+             lambda i: {"requestText": f"Please write about {TOPICS[i % len(TOPICS)]}"}),
+    Scenario("articles.create", "POST", "/knowledge-base/edit/create-article/", article_payload),
+    Scenario("articles.edit", "PUT", "/knowledge-base/edit/edit-article/{id}", article_payload,
+             pool_class="Article", pool_factory=article),
+    Scenario("articles.delete", "DELETE", "/knowledge-base/edit/delete-article/{id}", pool_class="Article",
+             pool_factory=article),
+    Scenario("articles.unpublish", "POST", "/knowledge-base/edit/unpublish/{id}", pool_class="Article",
+             pool_factory=article),
+    Scenario("articles.export", "GET", "/knowledge-base/edit/export-articles"),
+    Scenario("requests.list", "GET", "/knowledge-base/edit/get-requests"),
+    Scenario("saved_articles.list", "GET", "/saved-articles/get-saved-articles"),
+    Scenario("saved_articles.create", "POST", "/saved-articles/create-saved-article/", article_payload),
+    Scenario("saved_articles.publish", "POST", "/saved-articles/publish/{id}", pool_class="ArticleSaved",
+             pool_factory=article),
+    Scenario("saved_articles.import", "POST", "/saved-articles/import-saved-articles",
+             lambda i: "\n".join(json.dumps(article_payload(i * 10 + j)) for j in range(10))),
+    # News
+    Scenario("news.list", "GET", "/news/get-news"),
+    Scenario("news.get", "GET", "/news/get-news/{id}", pool_class="News", pool_factory=news, reuse_pool=True),
+    Scenario("news.search", "POST", "/news/search-news/",
+             lambda i: {"searchString": f"{TOPICS[i % len(TOPICS)]} {i % 25}", "limitOfNews": 10}),
+    Scenario("news.create", "POST", "/news/edit/create-news_article/", news),
+    Scenario("news.bulk_unpublish", "POST", "/news/edit/bulk-unpublish", None, pool_class="News",
+             pool_factory=news),
+    Scenario("saved_news.list", "GET", "/saved-news/get-saved-news"),
+    Scenario("saved_news.create", "POST", "/saved-news/create-saved_news_article/", news),
+    # Organizations
+    Scenario("organizations.list", "GET", "/organization/get-organizations"),
+    Scenario("organizations.get", "GET", "/organization/get-organization/{id}", pool_class="Organization",
+             pool_factory=organization, reuse_pool=True),
+    Scenario("organizations.filter", "POST", "/organization/search-organization/",
+             lambda i: {"categories": [CATEGORIES[i % len(CATEGORIES)]], "countries": [COUNTRIES[i % len(COUNTRIES)]]}),
+    Scenario("organizations.search", "POST", "/organization/search-organization-by-name/",
+             lambda i: {"searchString": f"{CATEGORIES[i % len(CATEGORIES)]} {i % 25}", "limitOfOrganizations": 10}),
+    Scenario("organizations.create", "POST", "/organization/edit/create-organization/", organization),
+    Scenario("saved_organizations.list", "GET", "/saved-organization/get-saved-organizations"),
+    Scenario("saved_organizations.publish", "POST", "/saved-organization/publish/{id}",
+             pool_class="OrganizationSaved", pool_factory=organization),
+    # Calculator
+    Scenario("calculator.property", "POST", "/calculator/zakat-property", property_payload),
+    Scenario("calculator.property_batch", "POST", "/calculator/zakat-property/batch",
+             lambda i: [property_payload(i + j) for j in range(10)]),
+    Scenario("calculator.livestock", "POST", "/calculator/zakat-livestock",
+             lambda i: {"camels": 5 + i % 100, "cows": 30 + i % 50, "buffaloes": 0, "sheep": 40 + i % 200,
+                        "goats": 0, "horses_value": 0, "isFemale_horses": False, "isForSale_horses": False}),
+    Scenario("calculator.ushr", "POST", "/calculator/zakat-ushr",
+             lambda i: {"crops": [{"type": "wheat", "quantity": 1000 + i}], "is_ushr_land": True,
+                        "is_irrigated": bool(i % 2)}),
+    # Sync
+    Scenario("sync.news_full", "GET", "/sync/news"),
+    Scenario("sync.news_changes", "GET", f"/sync/news?since={int(time.time() * 1000) - 3600 * 1000}.0&limit=100"),
+    Scenario("sync.organizations_changes", "GET",
+             f"/sync/organizations?since={int(time.time() * 1000) - 3600 * 1000}.0&limit=100"),
+    # Utility
+    Scenario("utility.facets", "GET", "/utility/get-facets"),
+    Scenario("utility.categories", "GET", "/utility/get-categories"),
+    Scenario("utility.metrics", "GET", "/metrics"),
+]
+
+STUB_RATES = {"RUB": 90.0, "EUR": 0.92, "KZT": 450.0, "XAU": 0.0004, "XAG": 0.034}
+
+
+def stub_upstreams(latency: float) -> None:
+    """
+    Replace the HTTP clients of the upstream services with stubs answering after `latency` seconds.
+    """
+    from src import embeddings, generation, link_checker
+    from src.calculator.utility import nisab_api_client
+    from src.fake_weaviate import fake_vector
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(latency)
+        if request.url.path.endswith("/embeddings"):
+            texts = json.loads(request.content)["input"]
+            return httpx.Response(200, json={"data": [{"index": index, "embedding": fake_vector(text)}
+                                                      for index, text in enumerate(texts)]})
+        if request.url.path.endswith("/chat/completions"):
+            chunks = [f'data: {json.dumps({"choices": [{"delta": {"content": word + " "}}]})}\n\n'
+                      for word in "This is a streamed answer about zakat".split()]
+            return httpx.Response(200, content="".join(chunks) + "data: [DONE]\n\n",
+                                  headers={"Content-Type": "text/event-stream"})
+        return httpx.Response(200)
+
+    transport = httpx.MockTransport(handler)
+    embeddings._http_client = httpx.AsyncClient(transport=transport)
+    generation._http_client = httpx.AsyncClient(transport=transport)
+    link_checker._http_client = httpx.AsyncClient(transport=transport, follow_redirects=True)
+
+    def fetch_rates(currencies: List[str]) -> Dict[str, float]:
+        time.sleep(latency)
+        return {currency: STUB_RATES.get(currency, 1.0) for currency in currencies}
+
+    nisab_api_client.rate_cache.fetch_rates = fetch_rates
+
+
+def percentile(ordered: List[float], percent: float) -> float:
+    return ordered[min(len(ordered) - 1, max(int(len(ordered) * percent / 100 + 0.5) - 1, 0))]
+
+
+async def run_scenario(http: httpx.AsyncClient, fake, scenario: Scenario, total: int, concurrency: int) -> dict:
+    ids: List[str] = []
+    if scenario.pool_class is not None:
+        size = min(total, 50) if scenario.reuse_pool else total
+        ids = fake.load(scenario.pool_class, (scenario.pool_factory(100000 + i) for i in range(size)))
+    id_cycle = itertools.cycle(ids) if ids else None
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    failures: Dict[str, int] = {}
+
+    async def one(i: int) -> None:
+        path = scenario.path.replace("{id}", next(id_cycle)) if id_cycle is not None else scenario.path
+        kwargs = {}
+        if scenario.name.endswith("bulk_unpublish"):
+            kwargs["json"] = {"ids": [ids[i]]}
+        elif scenario.body is not None:
+            body = scenario.body(i)
+            kwargs["content" if isinstance(body, str) else "json"] = body
+        started = time.perf_counter()
+        async with semaphore:
+            response = await http.request(scenario.method, path, **kwargs)
+            await response.aread()
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            failures[str(response.status_code)] = failures.get(str(response.status_code), 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    ordered = sorted(latencies)
+    return {
+        "requests": total,
+        "throughput_rps": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 2),
+        "failures": failures,
+    }
+
+
+def seed(fake) -> None:
+    fake.load("Article", (article(i) for i in range(SEED_ARTICLES)))
+    fake.load("ArticleSaved", (article(i) for i in range(SEED_ARTICLES // 4)))
+    fake.load("News", (news(i) for i in range(SEED_NEWS)))
+    fake.load("SavedNews", (news(i) for i in range(SEED_NEWS // 4)))
+    fake.load("Organization", (organization(i) for i in range(SEED_ORGANIZATIONS)))
+    fake.load("OrganizationSaved", (organization(i) for i in range(SEED_ORGANIZATIONS // 4)))
+    fake.load("Request", ({"requestText": f"Request {i}"} for i in range(SEED_REQUESTS)))
+
+
+async def run(args) -> dict:
+    os.environ["WEAVIATE_FAKE"] = "true"
+    os.environ["WEAVIATE_FAKE_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["WEAVIATE_FAKE_JITTER_MS"] = str(args.jitter_ms)
+    from src.main import app
+    from src.organizations.facet_index import facet_index
+    from src.weaviate_client import client, schema_bootstrap
+
+    stub_upstreams(args.upstream_latency_ms / 1000)
+    await schema_bootstrap.run()
+    fake = client.connect()
+    seed(fake)
+    await facet_index.ensure_built()
+
+    scenarios = [scenario for scenario in SCENARIOS
+                 if not args.only or any(part in scenario.name for part in args.only)]
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as http:
+        for scenario in scenarios:
+            results[scenario.name] = await run_scenario(http, fake, scenario, args.requests, args.concurrency)
+            print(f"{scenario.name:<28} {results[scenario.name]['throughput_rps']:>9.1f} rps "
+                  f"p50 {results[scenario.name]['p50_ms']:>8.2f} ms  p95 {results[scenario.name]['p95_ms']:>8.2f} ms  "
+                  f"p99 {results[scenario.name]['p99_ms']:>8.2f} ms  failures {results[scenario.name]['failures']}",
+                  file=sys.stderr)
+    return {
+        "config": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "weaviate_latency_ms": args.latency_ms,
+            "weaviate_jitter_ms": args.jitter_ms,
+            "upstream_latency_ms": args.upstream_latency_ms,
+            "python": platform.python_version(),
+        },
+        "scenarios": results,
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> List[str]:
+    """
+    Return the regressions of `current` against `baseline`, empty if there are none.
+
+    Differences of less than `min_delta_ms` in latency are noise for the sub-millisecond endpoints,
+    so they are never reported, and neither is a lower throughput without a higher p50 latency.
+    """
+    regressions = []
+    for name, result in current["scenarios"].items():
+        reference = baseline["scenarios"].get(name)
+        if reference is None:
+            continue
+        if result["throughput_rps"] < reference["throughput_rps"] * (1 - tolerance) \
+                and result["p50_ms"] - reference["p50_ms"] >= min_delta_ms:
+            regressions.append(f"{name}: throughput {result['throughput_rps']} rps, "
+                               f"baseline {reference['throughput_rps']} rps")
+        if result["p95_ms"] > reference["p95_ms"] * (1 + tolerance) \
+                and result["p95_ms"] - reference["p95_ms"] >= min_delta_ms:
+            regressions.append(f"{name}: p95 {result['p95_ms']} ms, baseline {reference['p95_ms']} ms")
+        if sum(result["failures"].values()) > sum(reference["failures"].values()):
+            regressions.append(f"{name}: failures {result['failures']}, baseline {reference['failures']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=5)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--upstream-latency-ms", type=float, default=20)
+    parser.add_argument("--only", nargs="+", help="Run the scenarios whose name contains one of these strings")
+    parser.add_argument("--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Baseline JSON file to compare the results against")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--min-delta-ms", type=float, default=2)
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+            file.write("\n")
+    else:
+        print(json.dumps(results, indent=2))
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(results, json.load(file), args.tolerance, args.min_delta_ms)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Benchmark of the CPU time spent sending a collection snapshot from the list endpoints.
+
+Three ways of answering a request for the whole collection are compared:
+- "response_model": the endpoint returns the parsed objects and FastAPI validates them against
+  the response model, converts them with jsonable_encoder and renders a JSONResponse, like the
+  news and organization list endpoints used to;
+- "dump_json": the endpoint serializes the parsed objects with pydantic's serializer on every
+  request, like the article list endpoint used to;
+- "snapshot": the endpoint sends the body serialized once when the snapshot was loaded.
+The load itself, which now also serializes the snapshot, is timed separately. The snapshot body is
+checked to be the same JSON as the response model output before anything is measured.
+
+Usage:
+    python -m benchmarks.bench_snapshot_response [--items 100 1000 5000] [--repeat 20]
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+from typing import Callable, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+from pydantic import TypeAdapter
+
+from src.cache import Snapshot
+from src.knowledge_base.models import ArticleGet, Content
+from src.news.models import NewsGet
+from src.organizations.models import OrganizationGet
+
+TOPICS = ["zakat", "nisab", "gold", "silver", "livestock", "charity", "ramadan", "fitr", "sadaqah", "waqf"]
+
+
+def build_articles(count: int) -> List[ArticleGet]:
+    ops = [{"insert": f"Paragraph {j} about {TOPICS[j % len(TOPICS)]}.\n", "attributes": {"bold": j % 2 == 0}}
+           for j in range(20)]
+    return [ArticleGet(id=f"article-{i}", tags=TOPICS[i % 3:i % 3 + 3], title=f"Article {i}",
+                       text=f"Article {i} about {TOPICS[i % len(TOPICS)]}. " * 20,
+                       content=Content.model_validate({"ops": ops}))
+            for i in range(count)]
+
+
+def build_news(count: int) -> List[NewsGet]:
+    return [NewsGet(id=f"news-{i}", name=f"News {i}", body=f"News {i} about {TOPICS[i % len(TOPICS)]}. " * 30,
+                    source_link=f"https://example.com/news/{i}", tags=TOPICS[i % 4:i % 4 + 2])
+            for i in range(count)]
+
+
+def build_organizations(count: int) -> List[OrganizationGet]:
+    return [OrganizationGet(id=f"organization-{i}", name=f"Organization {i}", link=f"https://example.com/{i}",
+                            description=f"Organization {i} collecting {TOPICS[i % len(TOPICS)]}. " * 10,
+                            categories=TOPICS[i % 5:i % 5 + 2], countries=["KZ", "RU", "UZ"][:i % 3 + 1])
+            for i in range(count)]
+
+
+COLLECTIONS = {
+    "articles": (ArticleGet, build_articles),
+    "news": (NewsGet, build_news),
+    "organizations": (OrganizationGet, build_organizations),
+}
+
+
+async def response_model_body(field, objects: List) -> bytes:
+    content = await serialize_response(field=field, response_content=objects)
+    return JSONResponse(content).body
+
+
+def median_ms(run: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, nargs="+", default=[100, 1000, 5000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    print(f"{'collection':<14}{'items':>7}{'response_model ms':>20}{'dump_json ms':>15}{'snapshot ms':>14}"
+          f"{'load ms':>10}")
+    for name, (model, build) in COLLECTIONS.items():
+        field = create_response_field(name="Response", type_=List[model])
+        adapter = TypeAdapter(List[model])
+        for count in args.items:
+            objects = build(count)
+            snapshot = Snapshot(objects)
+            expected = loop.run_until_complete(response_model_body(field, objects))
+            if json.loads(expected) != json.loads(snapshot.response().body):
+                raise SystemExit(f"The snapshot body of {name} differs from the response model output")
+
+            response_model_ms = median_ms(lambda: loop.run_until_complete(response_model_body(field, objects)),
+                                          args.repeat)
+            dump_json_ms = median_ms(lambda: adapter.dump_json(objects), args.repeat)
+            snapshot_ms = median_ms(snapshot.response, args.repeat)
+            load_ms = median_ms(lambda: Snapshot(objects), args.repeat)
+            print(f"{name:<14}{count:>7}{response_model_ms:>20.3f}{dump_json_ms:>15.3f}{snapshot_ms:>14.3f}"
+                  f"{load_ms:>10.3f}")
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
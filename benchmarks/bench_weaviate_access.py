@@ -0,0 +1,89 @@
+"""
+Benchmark of the Weaviate access layer under concurrent load.
+
+Weaviate is replaced by a stub whose calls block for a fixed time, like a real HTTP round trip.
+The same handler is served twice: "before" calls the blocking client directly inside the
+async handler (what the routers used to do) and "after" goes through AsyncWeaviateClient.
+All requests are issued at once and latency is measured from the moment a request is issued,
+so it includes the time spent waiting for a stalled event loop. For each mode the script prints
+throughput and p50/p99 latency.
+
+Usage:
+    python -m benchmarks.bench_weaviate_access [--requests 400] [--concurrency 50] [--latency-ms 20]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from fastapi import FastAPI
+
+from src.weaviate_client import AsyncWeaviateClient
+
+
+class BlockingQuery:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def do(self):
+        time.sleep(self.latency)
+        return {"data": {"Get": {"Article": []}}}
+
+
+def build_app(latency: float, concurrency: int) -> FastAPI:
+    app = FastAPI()
+    async_client = AsyncWeaviateClient(sync_client=None, concurrency=concurrency, timeout=30)
+
+    @app.get("/before")
+    async def before():
+        return BlockingQuery(latency).do()
+
+    @app.get("/after")
+    async def after():
+        return await async_client.do(BlockingQuery(latency))
+
+    return app
+
+
+def percentiles(latencies: list) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000,
+    }
+
+
+async def run_mode(app: FastAPI, path: str, total: int, concurrency: int) -> dict:
+    latencies = []
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        async def one():
+            async with semaphore:
+                await http.get(path)
+            latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+
+    return {"throughput_rps": total / elapsed, **percentiles(latencies)}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    app = build_app(args.latency_ms / 1000, args.concurrency)
+    for mode in ("before", "after"):
+        result = await run_mode(app, f"/{mode}", args.requests, args.concurrency)
+        print(f"{mode:>6}: {result['throughput_rps']:8.1f} req/s  "
+              f"p50 {result['p50_ms']:8.1f} ms  p99 {result['p99_ms']:8.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,287 @@
+"""
+Bulk import of the editorial collections and moves between the saved and published collections,
+with the batch API of Weaviate.
+
+The body of an import is NDJSON, one object per line in the format of the export (the `?stream=ndjson`
+list endpoints): the properties of the object and optionally its `id`. Objects without an ID get one
+derived from their class and properties, so importing the same file twice does not duplicate it.
+
+The body is read whole before the import starts, since a streaming response consumes the messages
+of the request to detect disconnections. The lines are then written in windows of
+`batch_size * workers` objects, sent by `workers` concurrent batch requests. After every window a
+progress line is streamed back with the errors of the objects that were rejected and the checkpoint,
+the number of lines fully processed.
+An interrupted import is resumed by sending the same file again with `resume_from` set to the last
+checkpoint received.
+
+A move (publish or unpublish) reads the objects with one query, copies them to the other collection
+with one batch create that keeps their IDs, then removes them from their collection with one batch
+delete. The copy is made first, so a failure never loses an object, and a retried move completes an
+interrupted one: objects already copied are overwritten under the same ID.
+"""
+from typing import Annotated, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple, Type
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+from weaviate.util import generate_uuid5
+from fastapi import HTTPException, Query, Request
+from dotenv import load_dotenv
+import uuid
+import asyncio
+import orjson
+import os
+
+from src.cache import mark_collection_changed
+from src.change_feed import record_deletions
+from src.metrics import timed
+from src.weaviate_client import client, async_client, weaviate_duration, weaviate_errors, write_batch
+
+load_dotenv('.env')
+
+IMPORT_BATCH_SIZE: int = int(os.getenv("IMPORT_BATCH_SIZE", "100"))
+IMPORT_WORKERS: int = int(os.getenv("IMPORT_WORKERS", "2"))
+MAX_IMPORT_BATCH_SIZE = 1000
+MAX_IMPORT_WORKERS = 8
+MAX_MOVE_SIZE = 1000
+
+BatchSizeQuery = Annotated[int, Query(ge=1, le=MAX_IMPORT_BATCH_SIZE,
+                                      description="Number of objects sent in one batch request.")]
+WorkersQuery = Annotated[int, Query(ge=1, le=MAX_IMPORT_WORKERS,
+                                    description="Number of batch requests sent concurrently.")]
+ResumeFromQuery = Annotated[int, Query(ge=0, description="Checkpoint of an interrupted import to resume from.")]
+
+
+class MoveRequest(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=MAX_MOVE_SIZE)
+
+
+class MoveResult(BaseModel):
+    moved: List[str] = []
+    already_moved: List[str] = []
+    not_found: List[str] = []
+    failed: Dict[str, str] = {}
+
+
+ToProperties = Callable[[BaseModel], Dict]
+# Returns the reason each object of a window cannot be imported, or None for valid objects
+ValidateWindow = Callable[[List[BaseModel]], Awaitable[List[Optional[str]]]]
+OnImported = Callable[[List[Tuple[str, BaseModel]]], None]
+
+
+async def import_collection(request: Request, class_name: str, model: Type[BaseModel],
+                            to_properties: ToProperties = BaseModel.model_dump,
+                            validate: Optional[ValidateWindow] = None, on_imported: Optional[OnImported] = None,
+                            batch_size: int = IMPORT_BATCH_SIZE, workers: int = IMPORT_WORKERS,
+                            resume_from: int = 0) -> StreamingResponse:
+    """
+    Import the NDJSON body of a request into a collection, streaming the progress back as NDJSON.
+
+    Parameters:
+    - request (Request): The request whose body holds one object per line.
+    - class_name (str): The collection to import into.
+    - model (Type[BaseModel]): The model every line is validated with.
+    - to_properties (ToProperties): Converts a validated object into the properties stored in Weaviate.
+    - validate (ValidateWindow, optional): Additional checks run on every window, e.g. of the links.
+    - on_imported (OnImported, optional): Called with the ID and object of every object written.
+    - batch_size (int): The number of objects sent in one batch request.
+    - workers (int): The number of batch requests sent concurrently.
+    - resume_from (int): The number of lines to skip, the checkpoint of an interrupted import.
+
+    Returns:
+    - StreamingResponse: One progress line per window, then a summary line with `done` set.
+    """
+    window_size = batch_size * workers
+    lines = (await request.body()).split(b"\n")
+
+    async def import_window(window: List[Tuple[int, bytes]]) -> Tuple[int, List[Dict]]:
+        errors = []
+        parsed: List[Tuple[int, str, BaseModel]] = []
+        for line_number, line in window:
+            try:
+                data = orjson.loads(line)
+                item = model.model_validate(data)
+                if data.get("id"):
+                    object_id = str(uuid.UUID(data["id"]))
+                else:
+                    object_id = generate_uuid5(to_properties(item), class_name)
+                parsed.append((line_number, object_id, item))
+            except ValidationError as error:
+                errors.append({"line": line_number, "error": "; ".join(
+                    f"{'.'.join(map(str, detail['loc']))}: {detail['msg']}" for detail in error.errors())})
+            except (orjson.JSONDecodeError, AttributeError, TypeError, ValueError) as error:
+                errors.append({"line": line_number, "error": str(error)})
+        if validate is not None and parsed:
+            reasons = await validate([item for _, _, item in parsed])
+            errors.extend({"line": line_number, "id": object_id, "error": reason}
+                          for (line_number, object_id, _), reason in zip(parsed, reasons) if reason is not None)
+            parsed = [entry for entry, reason in zip(parsed, reasons) if reason is None]
+        if not parsed:
+            return 0, sorted(errors, key=lambda error: error["line"])
+
+        objects = [(object_id, to_properties(item)) for _, object_id, item in parsed]
+        with timed(weaviate_duration, weaviate_errors, "batch_create"):
+            rejected = await asyncio.to_thread(write_batch, class_name, objects, batch_size, workers)
+        mark_collection_changed(class_name)
+        errors.extend({"line": line_number, "id": object_id, "error": rejected[object_id]}
+                      for line_number, object_id, _ in parsed if object_id in rejected)
+        imported = [(object_id, item) for _, object_id, item in parsed if object_id not in rejected]
+        if on_imported is not None and imported:
+            on_imported(imported)
+        return len(imported), sorted(errors, key=lambda error: error["line"])
+
+    async def body() -> AsyncIterator[bytes]:
+        checkpoint = resume_from
+        imported_total = failed_total = 0
+        window: List[Tuple[int, bytes]] = []
+        line_number = 0
+
+        async def flush(last_line: int) -> bytes:
+            nonlocal checkpoint, imported_total, failed_total, window
+            imported, errors = await import_window(window)
+            checkpoint = last_line
+            imported_total += imported
+            failed_total += len(errors)
+            window = []
+            return orjson.dumps({"checkpoint": checkpoint, "imported": imported, "errors": errors}) + b"\n"
+
+        try:
+            for line in lines:
+                line_number += 1
+                if line_number <= resume_from:
+                    continue
+                if line.strip():
+                    window.append((line_number, line))
+                if len(window) == window_size:
+                    yield await flush(line_number)
+            if window:
+                yield await flush(line_number)
+        except Exception as error:
+            # The current window may be partially written, resuming from the checkpoint rewrites it
+            # with the same IDs
+            yield orjson.dumps({"checkpoint": checkpoint, "error": f"{type(error).__name__}: {error}"}) + b"\n"
+            return
+        yield orjson.dumps({"done": True, "checkpoint": max(line_number, resume_from),
+                            "imported": imported_total, "failed": failed_total}) + b"\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+def _id_filter(object_ids: Sequence[str]) -> Dict:
+    return {"path": ["id"], "operator": "ContainsAny", "valueTextArray": list(object_ids)}
+
+
+async def _get_by_ids(class_name: str, object_ids: Sequence[str], properties: Sequence[str]) -> Dict[str, Dict]:
+    query = (
+        client.query.get(class_name, list(properties))
+        .with_additional(["id"])
+        .with_where(_id_filter(object_ids))
+        .with_limit(len(object_ids))
+    )
+    result = await async_client.do(query)
+    return {item["_additional"]["id"]: item for item in result["data"]["Get"][class_name]}
+
+
+def _delete_batch(class_name: str, object_ids: Sequence[str]) -> Dict[str, str]:
+    """
+    Delete objects by ID with one batch request. Blocking.
+
+    Returns:
+    - Dict[str, str]: The error of every object that could not be deleted, by ID.
+    """
+    result = client.batch.delete_objects(class_name=class_name, where=_id_filter(object_ids), output="verbose")
+    return {
+        deleted["id"]: "; ".join(error["message"] for error in ((deleted.get("errors") or {}).get("error") or []))
+        for deleted in result["results"].get("objects") or []
+        if deleted.get("status") == "FAILED"
+    }
+
+
+async def _roll_back_copies(source: str, target: str, object_ids: Sequence[str], properties: Sequence[str]) -> None:
+    # Only the copies whose original is still in the source collection are removed, so every object is
+    # left in exactly one collection whether or not the failed delete was applied
+    remaining = await _get_by_ids(source, object_ids, properties)
+    if remaining:
+        await record_deletions(target, list(remaining))
+        await async_client.run(_delete_batch, target, list(remaining), operation="batch_delete")
+        mark_collection_changed(target)
+
+
+async def move_objects(object_ids: Sequence[str], source: str, target: str, properties: Sequence[str],
+                       batch_size: int = IMPORT_BATCH_SIZE) -> Tuple[MoveResult, List[Dict]]:
+    """
+    Move objects from a collection to another, keeping their IDs.
+
+    Moving an object that is already in the target collection only is a no-op, so a move can be
+    retried safely.
+
+    Parameters:
+    - object_ids (Sequence[str]): The IDs of the objects to move.
+    - source (str): The collection the objects are moved from.
+    - target (str): The collection the objects are moved to.
+    - properties (Sequence[str]): The properties of the objects.
+    - batch_size (int): The number of objects sent in one batch request.
+
+    Returns:
+    - MoveResult: The IDs moved, already moved, not found and failed with their error.
+    - List[Dict]: The objects now in the target collection, as returned by a query.
+
+    Raises:
+    - HTTPException: If the objects could not be removed from the source collection. The copies are
+      then removed from the target collection.
+    """
+    result = MoveResult()
+    valid_ids = []
+    for object_id in dict.fromkeys(object_ids):
+        try:
+            valid_ids.append(str(uuid.UUID(object_id)))
+        except ValueError:
+            result.not_found.append(object_id)
+    if not valid_ids:
+        return result, []
+
+    in_source, in_target = await asyncio.gather(_get_by_ids(source, valid_ids, properties),
+                                                _get_by_ids(target, valid_ids, properties))
+    for object_id in valid_ids:
+        if object_id not in in_source:
+            (result.already_moved if object_id in in_target else result.not_found).append(object_id)
+    # An object in both collections was copied by an interrupted move, copying it again completes the move
+    objects = [(object_id, {name: item.get(name) for name in properties}) for object_id, item in in_source.items()]
+    if objects:
+        with timed(weaviate_duration, weaviate_errors, "batch_create"):
+            result.failed = await asyncio.to_thread(write_batch, target, objects, batch_size, 1)
+        copied = [object_id for object_id, _ in objects if object_id not in result.failed]
+        if copied:
+            mark_collection_changed(target)
+            try:
+                await record_deletions(source, copied)
+                not_deleted = await async_client.run(_delete_batch, source, copied, operation="batch_delete")
+            except Exception:
+                try:
+                    await _roll_back_copies(source, target, copied, properties)
+                except Exception:
+                    raise HTTPException(status_code=502, detail="The move was interrupted, retry it to complete it")
+                raise HTTPException(status_code=502, detail="The move failed and was rolled back")
+            mark_collection_changed(source)
+            result.failed.update(not_deleted)
+            result.moved = [object_id for object_id in copied if object_id not in not_deleted]
+
+    moved = [in_source[object_id] for object_id in result.moved] + \
+            [in_target[object_id] for object_id in result.already_moved]
+    return result, moved
+
+
+async def move_object(object_id: str, source: str, target: str, properties: Sequence[str]) -> Dict:
+    """
+    Move one object from a collection to another, keeping its ID.
+
+    Returns:
+    - Dict: The object now in the target collection, as returned by a query.
+
+    Raises:
+    - HTTPException: If the object does not exist or could not be moved.
+    """
+    result, moved = await move_objects([object_id], source, target, properties)
+    if result.not_found:
+        raise HTTPException(status_code=404, detail="The object was not found")
+    if result.failed:
+        raise HTTPException(status_code=502, detail=next(iter(result.failed.values())))
+    return moved[0]
@@ -0,0 +1,283 @@
+"""
+In-process caches shared by the routers.
+
+Every collection has a write generation that the editor endpoints bump through
+`mark_collection_changed`. Caches holding data derived from a collection drop it when the
+generation changes, and expire it after a TTL so writes made by other workers are picked up.
+Whole collections are kept by `snapshot_cache` and the results of searches by `search_cache`.
+"""
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+from collections import OrderedDict
+from dotenv import load_dotenv
+from fastapi import Response
+import asyncio
+import time
+import os
+
+from src.etag import make_etag
+from src.metrics import Gauge
+from src.pagination import dump_items
+
+load_dotenv('.env')
+
+SNAPSHOT_CACHE_TTL: float = float(os.getenv("SNAPSHOT_CACHE_TTL", "30"))
+SEARCH_CACHE_SIZE: int = int(os.getenv("SEARCH_CACHE_SIZE", "1024"))
+SEARCH_CACHE_TTL: float = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+
+_generations: Dict[str, int] = {}
+_invalidation_listeners: List[Callable[[str], None]] = []
+
+# All caches created in the process by name, used to report their counters
+caches: Dict[str, "TTLCache"] = {}
+
+
+def get_collection_generation(collection_name: str) -> int:
+    """
+    Return the current write generation of a collection.
+    """
+    return _generations.get(collection_name, 0)
+
+
+def mark_collection_changed(*collection_names: str) -> None:
+    """
+    Bump the write generation of the collections and notify the caches that depend on them.
+
+    Parameters:
+    - collection_names (str): The names of the collections that were written to.
+    """
+    for collection_name in collection_names:
+        _generations[collection_name] = _generations.get(collection_name, 0) + 1
+        for listener in _invalidation_listeners:
+            listener(collection_name)
+
+
+def on_collection_changed(listener: Callable[[str], None]) -> None:
+    """
+    Register a function called with the collection name every time a collection changes.
+    """
+    _invalidation_listeners.append(listener)
+
+
+class TTLCache:
+    """
+    LRU cache with an optional maximum size, an optional TTL and hit/miss counters.
+    """
+
+    def __init__(self, name: str, maxsize: Optional[int] = None, ttl: Optional[float] = None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        caches[name] = self
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._lookup(key)
+        if entry is None:
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Return a live entry without touching the counters or the LRU order.
+        """
+        entry = self._lookup(key)
+        return default if entry is None else entry[0]
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """
+        Return the live entries without touching the counters or the LRU order.
+        """
+        entries = []
+        for key in list(self._data):
+            entry = self._lookup(key)
+            if entry is not None:
+                entries.append((key, entry[0]))
+        return entries
+
+    def _lookup(self, key: Hashable) -> Optional[tuple]:
+        entry = self._data.get(key)
+        if entry is not None and self.ttl is not None and time.monotonic() - entry[1] > self.ttl:
+            del self._data[key]
+            return None
+        return entry
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (value, time.monotonic())
+        self._data.move_to_end(key)
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / requests if requests else 0.0,
+            "size": len(self._data),
+        }
+
+
+class Snapshot:
+    """
+    The parsed objects of a collection, their JSON serialization and its ETag.
+
+    The objects are serialized once when the snapshot is loaded, and the list endpoints send these
+    bytes as they are instead of validating and serializing every object through the response
+    model on each request.
+    """
+
+    def __init__(self, objects: List):
+        self.objects = objects
+        self.body = dump_items(objects)
+        self.etag = make_etag(self.body)
+        self._by_id: Optional[Dict[str, Any]] = None
+
+    def response(self, headers: Optional[Dict[str, str]] = None) -> Response:
+        return Response(content=self.body, media_type="application/json", headers=headers)
+
+    def get(self, object_id: str) -> Optional[Any]:
+        """
+        Return the object of the snapshot with an ID, or None if there is none.
+        """
+        if self._by_id is None:
+            self._by_id = {item.id: item for item in self.objects}
+        return self._by_id.get(object_id)
+
+
+class SnapshotCache:
+    """
+    Keeps the parsed content of whole collections in memory.
+
+    A snapshot is loaded on the first request, served until the collection changes or the TTL
+    expires, and loaded only once when several requests miss at the same time.
+    """
+
+    def __init__(self, ttl: float):
+        self._snapshots = TTLCache("collection_snapshots", ttl=ttl)
+        self._locks: Dict[str, asyncio.Lock] = {}
+        on_collection_changed(self._snapshots.pop)
+
+    async def get(self, collection_name: str, loader: Callable[[], Awaitable[List]]) -> List:
+        """
+        Return the parsed objects of a collection, loading them with `loader` if needed.
+
+        Parameters:
+        - collection_name (str): The name of the collection.
+        - loader (Callable): Coroutine function returning the parsed content of the collection.
+
+        Returns:
+        - List: The parsed objects of the collection.
+        """
+        return (await self.get_snapshot(collection_name, loader)).objects
+
+    async def get_snapshot(self, collection_name: str, loader: Callable[[], Awaitable[List]]) -> Snapshot:
+        """
+        Return the snapshot of a collection with its ETag, loading it with `loader` if needed.
+        """
+        snapshot = self._snapshots.get(collection_name)
+        if snapshot is not None:
+            return snapshot
+        lock = self._locks.setdefault(collection_name, asyncio.Lock())
+        async with lock:
+            # Another request may have loaded the snapshot while this one was waiting
+            snapshot = self._snapshots.peek(collection_name)
+            if snapshot is not None:
+                return snapshot
+            generation = get_collection_generation(collection_name)
+            snapshot = Snapshot(await loader())
+            # Do not keep a snapshot that a concurrent write has already made stale
+            if generation == get_collection_generation(collection_name):
+                self._snapshots.set(collection_name, snapshot)
+            return snapshot
+
+
+class SearchResultCache:
+    """
+    Keeps the results of search queries in memory.
+
+    Results are keyed on the collection, its write generation, the normalized query, the limit and
+    the filters, so a write to the collection makes its cached results unreachable at once. They are
+    then dropped to free the memory, and the cache holds at most `maxsize` results.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._results = TTLCache("search_results", maxsize=maxsize, ttl=ttl)
+        on_collection_changed(self._drop_collection)
+
+    def _drop_collection(self, collection_name: str) -> None:
+        for key, _ in self._results.items():
+            if key[0] == collection_name:
+                self._results.pop(key)
+
+    async def get(self, collection_name: str, query: str, limit: Optional[int], filters: Hashable,
+                  loader: Callable[[], Awaitable[List]]) -> List:
+        """
+        Return the cached results of a search, running it with `loader` if needed.
+
+        Parameters:
+        - collection_name (str): The name of the searched collection.
+        - query (str): The search string.
+        - limit (int, optional): The maximum number of results.
+        - filters (Hashable): Any other parameter of the search.
+        - loader (Callable): Coroutine function running the search.
+
+        Returns:
+        - List: The results of the search.
+        """
+        generation = get_collection_generation(collection_name)
+        key = (collection_name, generation, normalize_query(query), limit, filters)
+        results = self._results.get(key)
+        if results is not None:
+            return results
+        results = await loader()
+        # Do not keep results that a concurrent write has already made stale
+        if generation == get_collection_generation(collection_name):
+            self._results.set(key, results)
+        return results
+
+
+def normalize_query(query: str) -> str:
+    """
+    Lowercase a search string and collapse its whitespace.
+    """
+    return " ".join(query.lower().split())
+
+
+snapshot_cache = SnapshotCache(SNAPSHOT_CACHE_TTL)
+search_cache = SearchResultCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Return the hit/miss counters of every cache in the process.
+    """
+    return {name: cache.stats() for name, cache in caches.items()}
+
+
+def _collect_cache_stat(stat: str) -> Callable[[], Dict[Tuple[str], Any]]:
+    return lambda: {(name,): cache.stats()[stat] for name, cache in list(caches.items())}
+
+
+Gauge("cache_hits_total", "Cache lookups that found a live entry.", _collect_cache_stat("hits"), ["cache"],
+      kind="counter")
+Gauge("cache_misses_total", "Cache lookups that found no live entry.", _collect_cache_stat("misses"), ["cache"],
+      kind="counter")
+Gauge("cache_hit_ratio", "Share of the cache lookups that found a live entry.", _collect_cache_stat("hit_ratio"),
+      ["cache"])
+Gauge("cache_entries", "Entries held by the cache, including expired ones not evicted yet.",
+      _collect_cache_stat("size"), ["cache"])
@@ -46,4 +46,17 @@ SILVER_PURITY_MULTIPLIERS = {
     '875/884': 0.84,
     '900/925': 0.9,
     '999': 1.0,
-}
\ No newline at end of file
+}
+
+# Weight of one measurement unit of jewelry in grams, other units are considered to be grams
+MEASUREMENT_UNITS_IN_GRAMS = {
+    'kg': 1000,
+    'oz': 28.34,
+}
+
+# Fields of ZakatOnProperty holding amounts of money, the last one is subtracted from the savings
+PROPERTY_ITEM_FIELDS = (
+    'cash', 'cash_on_bank_cards', 'purchased_product_for_resaling', 'unfinished_product',
+    'produced_product_for_resaling', 'purchased_not_for_resaling', 'used_after_nisab', 'rent_money',
+    'stocks_for_resaling', 'income_from_stocks', 'taxes_value',
+)
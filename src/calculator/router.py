@@ -1,18 +1,19 @@
-from src.calculator.constants import CURRENCIES
-from src.calculator.utility.handling_gold import handle_gold
-from src.calculator.utility.handling_silver import handle_silver
-from src.calculator.utility.nisab_api_client import fetch_silver_value, convert_currency, fetch_gold_value
-from src.calculator.utility.nisab_on_livestock_calculation import (calculate_goats, calculate_sheep,
-                                                                   calculate_buffaloes,
-                                                                   calculate_cows, calculate_camels, calculate_horses)
-from src.calculator.schemas import ZakatOnProperty, ZakatOnLivestock, ZakatUshrResponse, ZakatUshrRequest, ZakatUshrItem, ZakatOnPropertyCalculated, ZakatOnLiveStockResponse
+from src.calculator.utility.nisab_api_client import fetch_silver_value, rate_cache, silver_gram_price
+from src.calculator.utility.property_valuation import value_property, value_properties, required_currencies
+from src.calculator.utility.nisab_on_livestock_calculation import calculate_herds, calculate_horses, LIVESTOCK_TABLES
+from src.calculator.schemas import ZakatOnProperty, ZakatOnLivestock, ZakatUshrResponse, ZakatUshrRequest, ZakatUshrItem, ZakatOnPropertyCalculated, ZakatOnLiveStockResponse, ZakatOnPropertyBatchItem
+from fastapi.responses import StreamingResponse
 from fastapi import APIRouter, HTTPException
+from typing import Iterator, List
 
 router = APIRouter(
     prefix="/calculator",
     tags=["Zakat Calculator"],
 )
 
+# Number of properties of a batch computed and sent back together
+BATCH_CHUNK_SIZE = 500
+
 @router.post("/zakat-property", response_model=ZakatOnPropertyCalculated, summary="Calculate Zakat on Property")
 async def calculate_zakat_on_property(property: ZakatOnProperty):
     """
@@ -27,69 +28,92 @@ async def calculate_zakat_on_property(property: ZakatOnProperty):
     Raises:
     - HTTPException: If no assets were added.
     """
-    savings_value = 0
-
-    async def handle_conversion(item, default_currency):
-        if item.currency_code not in CURRENCIES:
-            item.currency_code = default_currency
-        value = await convert_currency(property.currency, item.currency_code, item.value)
-        return value
-
-    for item in property.cash or []:
-        savings_value += await handle_conversion(item, property.currency)
-
-    for item in property.cash_on_bank_cards or []:
-        savings_value += await handle_conversion(item, property.currency)
+    savings_value = await value_property(property)
 
-    for item in property.silver_jewelry or []:
-        savings_value += await handle_silver(item, fetch_silver_value, property.currency)
-
-    for item in property.gold_jewelry or []:
-        savings_value += await handle_gold(item,  fetch_gold_value, property.currency)
-
-    for item in property.purchased_product_for_resaling or []:
-        savings_value += await handle_conversion(item, property.currency)
+    silver_price = await fetch_silver_value(property.currency)
+    calculated_value = evaluate_nisab(savings_value, silver_price, property.currency)
+    return calculated_value
 
-    for item in property.unfinished_product or []:
-        savings_value += await handle_conversion(item, property.currency)
 
-    for item in property.produced_product_for_resaling or []:
-        savings_value += await handle_conversion(item, property.currency)
+@router.post("/zakat-property/batch", summary="Calculate Zakat on Property for a batch of properties",
+             response_description="One ZakatOnPropertyBatchItem per line (NDJSON), in the order of the request")
+async def calculate_zakat_on_property_batch(properties: List[ZakatOnProperty]):
+    """
+    Calculate the Zakat due on many properties at once, e.g. all the households of a portfolio.
 
-    for item in property.purchased_not_for_resaling or []:
-        savings_value += await handle_conversion(item, property.currency)
+    The rates needed by all the properties are fetched once, the savings are computed for a chunk of
+    properties at a time, and the results are streamed back as NDJSON as soon as each chunk is ready.
+    A property without assets, or in a currency without an exchange rate, yields an item with an
+    error instead of failing the whole batch.
 
-    for item in property.used_after_nisab or []:
-        savings_value += await handle_conversion(item, property.currency)
+    Parameters:
+    - properties (List[ZakatOnProperty]): The details of the properties.
 
-    for item in property.rent_money or []:
-        savings_value += await handle_conversion(item, property.currency)
+    Returns:
+    - StreamingResponse: One ZakatOnPropertyBatchItem per line.
 
-    for item in property.stocks_for_resaling or []:
-        savings_value += await handle_conversion(item, property.currency)
+    Raises:
+    - HTTPException: If the rates service could not be reached or has no gold and silver prices.
+    """
+    property_currencies = [required_currencies(property) for property in properties]
+    # One upstream call for the metals and every currency; a currency without a rate only fails
+    # the properties that need it
+    rates = await rate_cache.get_rates(set().union(*property_currencies) | {"XAU", "XAG"}, missing_ok=True)
+    if "XAU" not in rates or "XAG" not in rates:
+        raise HTTPException(status_code=502, detail="No gold and silver prices")
+
+    def results() -> Iterator[str]:
+        for start in range(0, len(properties), BATCH_CHUNK_SIZE):
+            end = start + BATCH_CHUNK_SIZE
+            chunk = properties[start:end]
+            unavailable = [sorted(currencies - rates.keys()) for currencies in property_currencies[start:end]]
+            savings = iter(value_properties([property for property, missing in zip(chunk, unavailable) if not missing],
+                                            rates))
+            lines = []
+            for index, (property, missing) in enumerate(zip(chunk, unavailable), start):
+                try:
+                    if missing:
+                        raise HTTPException(status_code=502, detail=f"No exchange rate for {', '.join(missing)}")
+                    result = evaluate_nisab(next(savings), silver_gram_price(rates, property.currency),
+                                            property.currency)
+                    item = ZakatOnPropertyBatchItem(index=index, result=result)
+                except HTTPException as e:
+                    item = ZakatOnPropertyBatchItem(index=index, error=e.detail)
+                lines.append(item.model_dump_json())
+            yield "\n".join(lines) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+def evaluate_nisab(savings_value: float, silver_gram_value: float, currency: str) -> ZakatOnPropertyCalculated:
+    """
+    Compute the Zakat due on the savings, which is zero while the savings do not exceed the Nisab.
 
-    for item in property.income_from_stocks or []:
-        savings_value += await handle_conversion(item, property.currency)
+    Parameters:
+    - savings_value (float): The value of the savings in the currency.
+    - silver_gram_value (float): The price of one gram of silver in the currency.
+    - currency (str): The currency of the calculation.
 
-    for item in property.taxes_value or []:
-        savings_value -= await handle_conversion(item, property.currency)
+    Returns:
+    - ZakatOnPropertyCalculated: The calculated Zakat amount and Nisab status.
 
+    Raises:
+    - HTTPException: If no assets were added.
+    """
     zakat_value = savings_value * 0.025
     if zakat_value == 0:
         raise HTTPException(status_code=400, detail="No assets were added")
 
-    silver_price = await fetch_silver_value(property.currency)
-    nisab_value = int(silver_price * 612.35)
-    nisab_value_bool = savings_value > nisab_value # check >= or > 
+    nisab_value = int(silver_gram_value * 612.35)
+    nisab_value_bool = savings_value > nisab_value # check >= or >
     if nisab_value_bool == False:
         zakat_value = 0
 
-    calculated_value = ZakatOnPropertyCalculated(
+    return ZakatOnPropertyCalculated(
         zakat_value=zakat_value,
         nisab_value=nisab_value_bool,
-        currency=property.currency
+        currency=currency
     )
-    return calculated_value
 
 
 @router.post("/zakat-livestock", response_model=ZakatOnLiveStockResponse, summary="Calculate Zakat on Livestock")
@@ -103,41 +127,48 @@ async def calculate_zakat_on_livestock(livestock: ZakatOnLivestock):
     Returns:
     - ZakatOnLiveStockResponse: The calculated Zakat on livestock and Nisab status.
     """
-    calculated_animals_list = []
+    return calculate_livestock([livestock])[0]
 
-    calculated_livestock = ZakatOnLiveStockResponse(
-        animals=calculated_animals_list,
-        value_for_horses=0,
-        nisab_status=False
-    )
 
-    if livestock.camels and livestock.camels >= 5:
-        calculated_animals_list += calculate_camels(livestock.camels)
-        calculated_livestock.nisab_status = True
+@router.post("/zakat-livestock/batch", response_model=List[ZakatOnLiveStockResponse],
+             summary="Calculate Zakat on Livestock for a batch of herds")
+async def calculate_zakat_on_livestock_batch(livestock: List[ZakatOnLivestock]):
+    """
+    Calculate the Zakat due on many herds at once, evaluating each kind of animal in one pass.
 
-    if livestock.cows and livestock.cows >= 30:
-        calculated_animals_list += calculate_cows(livestock.cows)
-        calculated_livestock.nisab_status = True
+    Parameters:
+    - livestock (List[ZakatOnLivestock]): The details of the herds.
 
-    if livestock.buffaloes and livestock.buffaloes >= 30:
-        calculated_animals_list += calculate_buffaloes(livestock.buffaloes)
-        calculated_livestock.nisab_status = True
+    Returns:
+    - List[ZakatOnLiveStockResponse]: The calculated Zakat of each herd, in the order of the request.
+    """
+    return calculate_livestock(livestock)
 
-    if livestock.sheep and livestock.sheep >= 40:
-        calculated_animals_list += calculate_sheep(livestock.sheep)
-        calculated_livestock.nisab_status = True
 
-    if livestock.goats and livestock.goats >= 40:
-        calculated_animals_list += calculate_goats(livestock.goats)
-        calculated_livestock.nisab_status = True
+def calculate_livestock(livestock: List[ZakatOnLivestock]) -> List[ZakatOnLiveStockResponse]:
+    """
+    Calculate the animals due, the value due for horses and the Nisab status of every herd.
 
-    if livestock.horses_value and livestock.isFemale_horses and livestock.isForSale_horses:
-        calculated_livestock.value_for_horses = int(calculate_horses(livestock.horses_value))
-        if livestock.horses_value > 0:
-            calculated_livestock.nisab_status = True
+    Parameters:
+    - livestock (List[ZakatOnLivestock]): The details of the herds.
 
-    calculated_livestock.animals = calculated_animals_list
-    return calculated_livestock
+    Returns:
+    - List[ZakatOnLiveStockResponse]: The calculated Zakat of each herd.
+    """
+    herds = {kind: [getattr(herd, kind) for herd in livestock] for kind in LIVESTOCK_TABLES}
+    calculated = []
+    for herd, calculated_animals_list in zip(livestock, calculate_herds(herds)):
+        calculated_livestock = ZakatOnLiveStockResponse(
+            animals=calculated_animals_list,
+            value_for_horses=0,
+            nisab_status=bool(calculated_animals_list)
+        )
+        if herd.horses_value and herd.isFemale_horses and herd.isForSale_horses:
+            calculated_livestock.value_for_horses = int(calculate_horses(herd.horses_value))
+            if herd.horses_value > 0:
+                calculated_livestock.nisab_status = True
+        calculated.append(calculated_livestock)
+    return calculated
 
 
 @router.post("/zakat-ushr", response_model=ZakatUshrResponse, summary="Calculate Zakat Ushr")
@@ -44,6 +44,15 @@ class ZakatOnPropertyCalculated(BaseModel):
     currency: str = "RUB"
 
 
+class ZakatOnPropertyBatchItem(BaseModel):
+    """
+    Result of one property of a batch, either the calculation or the reason it failed
+    """
+    index: int
+    result: Optional[ZakatOnPropertyCalculated] = None
+    error: Optional[str] = None
+
+
 class ZakatOnLivestock(BaseModel):
     camels: Optional[int]
     cows: Optional[int]
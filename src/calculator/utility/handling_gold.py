@@ -1,17 +1,16 @@
-from src.calculator.constants import GOLD_PURITY_MULTIPLIERS
-
 """
 This file handle different measurements for gold
 """
+from src.calculator.constants import GOLD_PURITY_MULTIPLIERS, MEASUREMENT_UNITS_IN_GRAMS
 
 
-async def handle_gold(item, fetch_value_function, currency):
-    if item.measurement_unit == 'kg':
-        item.value *= 1000
-    elif item.measurement_unit == 'oz':
-        item.value *= 28.34
+def gold_value(item, gram_price: float) -> float:
+    """
+    Value a gold jewelry item from the price of one gram of pure gold. A missing weight counts as nothing.
+    """
+    grams = (item.value or 0) * MEASUREMENT_UNITS_IN_GRAMS.get(item.measurement_unit, 1)
 
     # Adjust the value based on the purity
     purity_factor = GOLD_PURITY_MULTIPLIERS.get(item.qarat, 1.0)
-    value_in_currency = item.value * await fetch_value_function(currency) * purity_factor
+    value_in_currency = grams * gram_price * purity_factor
     return value_in_currency
@@ -1,39 +1,154 @@
-from metalpriceapi.client import Client
-from dotenv import load_dotenv
-import os
-
 """
 This file is utility files that is used to proceed with Zakat on Property calculation
 It receives a current rates of currencies and gold/silver
+
+All rates are kept in a cache relative to one base currency. The currencies missing from the
+cache are fetched from metalpriceapi in a single call, and concurrent requests that miss the
+same rates wait for the call in progress instead of making their own.
 """
+from typing import Callable, Dict, Iterable, List
+from metalpriceapi.client import Client
+from fastapi import HTTPException
+from dotenv import load_dotenv
+import asyncio
+import os
+
+from src.cache import TTLCache
+from src.metrics import track_upstream
 
 load_dotenv('.env')
 
 API_KEY: str = os.getenv("METAL_PRICE_API_KEY")
+RATES_CACHE_TTL: float = float(os.getenv("RATES_CACHE_TTL", "600"))
+RATES_TIMEOUT: float = float(os.getenv("RATES_TIMEOUT", "10"))
 
+RATES_BASE = "USD"
 
-async def fetch_silver_value(currency: str):
-    client = Client(API_KEY)
-    response = client.fetchLive(base='XAG', currencies=[currency])
-    ounce_value = response['rates'][currency]
+
+def fetch_live_rates(currencies: List[str]) -> Dict[str, float]:
+    """
+    Fetch the live rates of the currencies relative to RATES_BASE with one metalpriceapi call.
+
+    Parameters:
+    - currencies (List[str]): The currency codes to fetch.
+
+    Returns:
+    - Dict[str, float]: The number of units of each currency for one unit of RATES_BASE.
+    """
+    response = _metal_price_client.fetchLive(base=RATES_BASE, currencies=currencies)
+    if not response.get("rates"):
+        raise HTTPException(status_code=502, detail="Could not fetch the exchange rates")
+    return response["rates"]
+
+
+class RateCache:
+    """
+    TTL cache of the exchange rates relative to RATES_BASE.
+    """
+
+    def __init__(self, fetch_rates: Callable[[List[str]], Dict[str, float]], ttl: float, timeout: float):
+        self.fetch_rates = fetch_rates
+        self.timeout = timeout
+        self._rates = TTLCache("exchange_rates", ttl=ttl)
+        self._lock = asyncio.Lock()
+
+    async def get_rates(self, currencies: Iterable[str], missing_ok: bool = False) -> Dict[str, float]:
+        """
+        Return the rates of the currencies, fetching all the missing ones in one upstream call.
+
+        Parameters:
+        - currencies (Iterable[str]): The currency codes needed.
+        - missing_ok (bool): Leave out the currencies the service has no rate for instead of failing.
+
+        Returns:
+        - Dict[str, float]: The number of units of each currency for one unit of RATES_BASE.
+
+        Raises:
+        - HTTPException: If the service could not be reached, or has no rate for a currency and
+          `missing_ok` is False.
+        """
+        rates = {RATES_BASE: 1.0}
+        missing = set()
+        for currency in set(currencies) - {RATES_BASE}:
+            rate = self._rates.get(currency)
+            if rate is None:
+                missing.add(currency)
+            else:
+                rates[currency] = rate
+        if not missing:
+            return rates
+
+        async with self._lock:
+            # The rates may have been fetched by another request while this one was waiting
+            for currency in list(missing):
+                rate = self._rates.peek(currency)
+                if rate is not None:
+                    rates[currency] = rate
+                    missing.discard(currency)
+            if missing:
+                try:
+                    with track_upstream("metalpriceapi"):
+                        fetched = await asyncio.wait_for(asyncio.to_thread(self.fetch_rates, sorted(missing)),
+                                                         self.timeout)
+                except asyncio.TimeoutError:
+                    raise HTTPException(status_code=504, detail="The exchange rates service did not respond in time")
+                for currency in missing:
+                    if currency not in fetched:
+                        if missing_ok:
+                            continue
+                        raise HTTPException(status_code=502, detail=f"No exchange rate for {currency}")
+                    self._rates.set(currency, fetched[currency])
+                    rates[currency] = fetched[currency]
+        return rates
+
+    def clear(self) -> None:
+        self._rates.clear()
+
+
+_metal_price_client = Client(API_KEY)
+rate_cache = RateCache(fetch_live_rates, RATES_CACHE_TTL, RATES_TIMEOUT)
+
+
+async def prefetch_rates(currencies: Iterable[str]) -> Dict[str, float]:
+    """
+    Load the rates of all the currencies a calculation needs, plus gold and silver, in one call.
+    """
+    return await rate_cache.get_rates(set(currencies) | {"XAU", "XAG"})
+
+
+def conversion_rate(rates: Dict[str, float], to_cur: str, from_cur: str) -> float:
+    """
+    Number of units of `to_cur` for one unit of `from_cur`.
+    """
+    return rates[to_cur] / rates[from_cur]
+
+
+def silver_gram_price(rates: Dict[str, float], currency: str) -> float:
+    ounce_value = rates[currency] / rates["XAG"]
     gramm_value = ounce_value / 28.35
     return gramm_value
 
 
-async def fetch_gold_value(currency: str):
-    client = Client(API_KEY)
-    response = client.fetchLive(base='XAU', currencies=[currency])
-    ounce_value = response['rates'][currency]
+def gold_gram_price(rates: Dict[str, float], currency: str) -> float:
+    ounce_value = rates[currency] / rates["XAU"]
     gramm_value = ounce_value / 31.1035
     return gramm_value
 
 
+async def fetch_silver_value(currency: str):
+    rates = await rate_cache.get_rates([currency, "XAG"])
+    return silver_gram_price(rates, currency)
+
+
+async def fetch_gold_value(currency: str):
+    rates = await rate_cache.get_rates([currency, "XAU"])
+    return gold_gram_price(rates, currency)
+
+
 async def convert_currency(to_cur: str, from_cur: str, value: float):
-    client = Client(API_KEY)
     if from_cur != to_cur:
-        response = client.fetchLive(base=to_cur, currencies=[from_cur])
-        response_value = response['rates'][from_cur]
-        new_val = value / response_value
+        rates = await rate_cache.get_rates([to_cur, from_cur])
+        new_val = value * conversion_rate(rates, to_cur, from_cur)
         return new_val
     else:
-        return value
\ No newline at end of file
+        return value
@@ -1,128 +1,193 @@
-from src.calculator.schemas import Animal
-from typing import List
-
 """
-This files handles a lot "if-else" in order to calculate Zakat on Livestock
-The only purpose is to calculate Zakat.
+This file calculates Zakat on Livestock from bracket tables.
 
+Every kind of animal has a table of brackets sorted by their lowest count, each bracket with the
+animals due for it. A count is matched to its bracket with a binary search, and the Animal models
+of every bracket are built once when the module is loaded. Counts past the last bracket follow an
+explicit rule for each kind of animal, and their results are cached as well.
 """
+from src.calculator.schemas import Animal
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+from functools import lru_cache
+from bisect import bisect_right
 
-def calculate_camels(camels: int) -> List[Animal]:
-    calculated_animals = []
-    if 5 < camels <= 9:
-        calculated_animals.append(Animal(type="Sheep", quantity=1, age=1))
-    elif 9 < camels <= 14:
-        calculated_animals.append(Animal(type="Sheep", quantity=2))
-    elif 14 < camels <= 19:
-        calculated_animals.append(Animal(type="Sheep", quantity=3))
-    elif 19 < camels <= 24:
-        calculated_animals.append(Animal(type="Sheep", quantity=4))
-    elif 24 < camels <= 35:
-        calculated_animals.append(Animal(type="Camel", quantity=1, age=1))
-    elif 35 < camels <= 45:
-        calculated_animals.append(Animal(type="Camel", quantity=1, age=2))
-    elif 45 < camels <= 60:
-        calculated_animals.append(Animal(type="Camel", quantity=1, age=4))
-    elif 60 < camels <= 75:
-        calculated_animals.append(Animal(type="Camel", quantity=1, age=5))
-    elif 75 < camels <= 90:
-        calculated_animals.append(Animal(type="Camel", quantity=2, age=1))
-    elif 90 < camels <= 120:
-        calculated_animals.append(Animal(type="Camel", quantity=2, age=4))
-    elif 120 < camels <= 129:
-        calculated_animals.append(Animal(type="Camel", quantity=1, age=4))
-        calculated_animals.append(Animal(type="Sheep", quantity=1))
-    elif 130 < camels <= 134:
-        calculated_animals.append(Animal(type="Camel", quantity=2, age=4))
-        calculated_animals.append(Animal(type="Sheep", quantity=2))
-    elif 134 < camels <= 139:
-        calculated_animals.append(Animal(type="Camel", quantity=2, age=4))
-        calculated_animals.append(Animal(type="Sheep", quantity=3))
-    elif 139 < camels <= 144:
-        calculated_animals.append(Animal(type="Camel", quantity=2, age=4))
-        calculated_animals.append(Animal(type="Sheep", quantity=4))
-    elif 144 < camels <= 149:
-        calculated_animals.append(Animal(type="Camel", quantity=2, age=4))
-        calculated_animals.append(Animal(type="Camel", quantity=1, age=1))
-    elif 149 < camels <= 154:
-        calculated_animals.append(Animal(type="Camel", quantity=3, age=4))
-    elif 154 < camels <= 159:
-        calculated_animals.append(Animal(type="Camel", quantity=3, age=4))
-        calculated_animals.append(Animal(type="Sheep", quantity=1))
-    else:
-        calculated_animals.append(Animal(type="Camels", quantity=6, age=1))
-    return calculated_animals
+# (type, quantity, age) of the animals due
+Due = Tuple[Tuple[str, int, int], ...]
 
+CAMEL_BRACKETS: List[Tuple[int, Due]] = [
+    (5, (("Sheep", 1, 1),)),
+    (10, (("Sheep", 2, 0),)),
+    (15, (("Sheep", 3, 0),)),
+    (20, (("Sheep", 4, 0),)),
+    (25, (("Camel", 1, 1),)),
+    (36, (("Camel", 1, 2),)),
+    (46, (("Camel", 1, 4),)),
+    (61, (("Camel", 1, 5),)),
+    (76, (("Camel", 2, 1),)),
+    (91, (("Camel", 2, 4),)),
+    (121, (("Camel", 1, 4), ("Sheep", 1, 0))),
+    (130, (("Camel", 2, 4), ("Sheep", 2, 0))),
+    (135, (("Camel", 2, 4), ("Sheep", 3, 0))),
+    (140, (("Camel", 2, 4), ("Sheep", 4, 0))),
+    (145, (("Camel", 2, 4), ("Camel", 1, 1))),
+    (150, (("Camel", 3, 4),)),
+    (155, (("Camel", 3, 4), ("Sheep", 1, 0))),
+]
+CAMEL_TABLE_END = 160
 
-def calculate_cows(cows: int) -> list[Animal]:
-    calculated_animals = []
-    if 30 <= cows < 40:
-        calculated_animals.append(Animal(type="Cow", quantity=1, age=1))
-    elif 40 <= cows < 60:
-        calculated_animals.append(Animal(type="Cow", quantity=1, age=2))
-    elif 60 <= cows < 70:
-        calculated_animals.append(Animal(type="Cow", quantity=2, age=1))
-    elif 70 <= cows < 80:
-        calculated_animals.append(Animal(type="Cow", quantity=1, age=1))
-        calculated_animals.append(Animal(type="Cow", quantity=1, age=2))
-    elif 80 <= cows < 90:
-        calculated_animals.append(Animal(type="Cow", quantity=2, age=2))
-    elif 90 <= cows < 100:
-        calculated_animals.append(Animal(type="Cow", quantity=3, age=1))
-    elif 100 <= cows < 110:
-        calculated_animals.append(Animal(type="Cow", quantity=2, age=1))
-        calculated_animals.append(Animal(type="Cow", quantity=1, age=2))
+CATTLE_TABLE_END = 110
 
-    return calculated_animals
+FLOCK_TABLE_END = 400
 
 
-def calculate_buffaloes(buffaloes: int) -> list[Animal]:
-    calculated_animals = []
-    if 30 <= buffaloes < 40:
-        calculated_animals.append(Animal(type="Buffaloe", quantity=1, age=1))
-    elif 40 <= buffaloes < 60:
-        calculated_animals.append(Animal(type="Buffaloe", quantity=1, age=2))
-    elif 60 <= buffaloes < 70:
-        calculated_animals.append(Animal(type="Buffaloe", quantity=2, age=1))
-    elif 70 <= buffaloes < 80:
-        calculated_animals.append(Animal(type="Buffaloe", quantity=1, age=1))
-        calculated_animals.append(Animal(type="Buffaloe", quantity=1, age=2))
-    elif 80 <= buffaloes < 90:
-        calculated_animals.append(Animal(type="Buffaloe", quantity=2, age=2))
-    elif 90 <= buffaloes < 100:
-        calculated_animals.append(Animal(type="Buffaloe", quantity=3, age=1))
-    elif 100 <= buffaloes < 110:
-        calculated_animals.append(Animal(type="Buffaloe", quantity=2, age=1))
-        calculated_animals.append(Animal(type="Buffaloe", quantity=1, age=2))
-    return calculated_animals
+def cattle_brackets(animal_type: str) -> List[Tuple[int, Due]]:
+    """
+    Brackets of cows and buffaloes: one animal of age 1 for every 30 and one of age 2 for every 40.
+    """
+    return [(count, cattle_due(animal_type, count)) for count in range(30, CATTLE_TABLE_END, 10)]
 
 
-def calculate_sheep(sheep: int):
-    calculated_animals = []
-    if 40 <= sheep < 121:
-        calculated_animals.append(Animal(type="Sheep", quantity=1))
-    elif 121 <= sheep < 201:
-        calculated_animals.append(Animal(type="Sheep", quantity=2))
-    elif 201 <= sheep < 399:
-        calculated_animals.append(Animal(type="Sheep", quantity=3))
-    elif 300 <= sheep < 599:
-        calculated_animals.append(Animal(type="Sheep", quantity=4))
+def flock_brackets(animal_type: str) -> List[Tuple[int, Due]]:
+    """
+    Brackets of sheep and goats.
+    """
+    return [
+        (40, ((animal_type, 1, 0),)),
+        (121, ((animal_type, 2, 0),)),
+        (201, ((animal_type, 3, 0),)),
+    ]
 
-    return calculated_animals
 
+def cattle_due(animal_type: str, count: int) -> Due:
+    """
+    Cover as much of the herd as possible with groups of 30 and 40, preferring groups of 40.
+    """
+    best = (0, 0)
+    for forties in range(count // 40, -1, -1):
+        thirties = (count - forties * 40) // 30
+        if forties * 40 + thirties * 30 > best[0] * 40 + best[1] * 30:
+            best = (forties, thirties)
+    forties, thirties = best
+    due = []
+    if thirties:
+        due.append((animal_type, thirties, 1))
+    if forties:
+        due.append((animal_type, forties, 2))
+    return tuple(due)
+
+
+def camels_past_table(camels: int) -> Due:
+    """
+    Past the table, one camel of age 4 is due for every 50 camels, and the remainder is taxed
+    like the start of the table.
+    """
+    hiqqas, remainder = divmod(camels, 50)
+    if remainder >= 46:
+        return (("Camel", hiqqas + 1, 4),)
+    due = [("Camel", hiqqas, 4)]
+    if remainder >= 36:
+        due.append(("Camel", 1, 2))
+    elif remainder >= 25:
+        due.append(("Camel", 1, 1))
+    elif remainder >= 5:
+        due.append(("Sheep", remainder // 5, 0))
+    return tuple(due)
+
+
+def cattle_past_table(animal_type: str) -> Callable[[int], Due]:
+    return lambda count: cattle_due(animal_type, count)
+
+
+def flock_past_table(animal_type: str) -> Callable[[int], Due]:
+    """
+    Past the table, one animal is due for every 100.
+    """
+    return lambda count: ((animal_type, count // 100, 0),)
+
+
+def build_animals(due: Due) -> Tuple[Animal, ...]:
+    return tuple(Animal(type=animal_type, quantity=quantity, age=age) for animal_type, quantity, age in due)
+
+
+class BracketTable:
+    """
+    Interval index of the brackets of one kind of animal.
+    """
+
+    def __init__(self, brackets: List[Tuple[int, Due]], table_end: int, past_table: Callable[[int], Due]):
+        self.lower_bounds = [lower_bound for lower_bound, _ in brackets]
+        self.results = [build_animals(due) for _, due in brackets]
+        self.table_end = table_end
+        self.past_table = lru_cache(maxsize=1024)(lambda count: build_animals(past_table(count)))
 
-def calculate_goats(goats: int):
-    calculated_animals = []
-    if 40 <= goats < 121:
-        calculated_animals.append(Animal(type="Goat", quantity=1))
-    elif 121 <= goats < 201:
-        calculated_animals.append(Animal(type="Goat", quantity=2))
-    elif 201 <= goats < 399:
-        calculated_animals.append(Animal(type="Goat", quantity=3))
-    elif 300 <= goats < 599:
-        calculated_animals.append(Animal(type="Goat", quantity=4))
+    def lookup(self, count: Optional[int]) -> Tuple[Animal, ...]:
+        """
+        Return the animals due for a herd of `count` animals.
+        """
+        if not count or count < self.lower_bounds[0]:
+            return ()
+        if count >= self.table_end:
+            return self.past_table(count)
+        return self.results[bisect_right(self.lower_bounds, count) - 1]
+
+    def lookup_many(self, counts: Sequence[Optional[int]]) -> List[Tuple[Animal, ...]]:
+        """
+        Return the animals due for each herd, looking up every distinct count once.
+        """
+        results: Dict[Optional[int], Tuple[Animal, ...]] = {}
+        for count in counts:
+            if count not in results:
+                results[count] = self.lookup(count)
+        return [results[count] for count in counts]
+
+
+LIVESTOCK_TABLES: Dict[str, BracketTable] = {
+    "camels": BracketTable(CAMEL_BRACKETS, CAMEL_TABLE_END, camels_past_table),
+    "cows": BracketTable(cattle_brackets("Cow"), CATTLE_TABLE_END, cattle_past_table("Cow")),
+    "buffaloes": BracketTable(cattle_brackets("Buffaloe"), CATTLE_TABLE_END, cattle_past_table("Buffaloe")),
+    "sheep": BracketTable(flock_brackets("Sheep"), FLOCK_TABLE_END, flock_past_table("Sheep")),
+    "goats": BracketTable(flock_brackets("Goat"), FLOCK_TABLE_END, flock_past_table("Goat")),
+}
+
+
+def calculate_herds(herds: Dict[str, Sequence[Optional[int]]]) -> List[List[Animal]]:
+    """
+    Calculate the animals due for many herds in one pass over each kind of animal.
+
+    Parameters:
+    - herds (Dict[str, Sequence[Optional[int]]]): For each kind of animal of LIVESTOCK_TABLES,
+      the number of animals of every herd. All the sequences have the same length.
+
+    Returns:
+    - List[List[Animal]]: The animals due for each herd.
+    """
+    size = max((len(counts) for counts in herds.values()), default=0)
+    calculated_animals: List[List[Animal]] = [[] for _ in range(size)]
+    for kind, counts in herds.items():
+        for animals, due in zip(calculated_animals, LIVESTOCK_TABLES[kind].lookup_many(counts)):
+            animals.extend(due)
     return calculated_animals
 
 
+def calculate_camels(camels: int) -> List[Animal]:
+    return list(LIVESTOCK_TABLES["camels"].lookup(camels))
+
+
+def calculate_cows(cows: int) -> List[Animal]:
+    return list(LIVESTOCK_TABLES["cows"].lookup(cows))
+
+
+def calculate_buffaloes(buffaloes: int) -> List[Animal]:
+    return list(LIVESTOCK_TABLES["buffaloes"].lookup(buffaloes))
+
+
+def calculate_sheep(sheep: int) -> List[Animal]:
+    return list(LIVESTOCK_TABLES["sheep"].lookup(sheep))
+
+
+def calculate_goats(goats: int) -> List[Animal]:
+    return list(LIVESTOCK_TABLES["goats"].lookup(goats))
+
+
 def calculate_horses(horses_value: int) -> float:
     return horses_value * 0.025
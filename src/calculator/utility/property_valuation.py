@@ -0,0 +1,98 @@
+"""
+This file values every line item of a Zakat on Property request in the currency of the request.
+
+The rates a property needs are loaded once, then its line items are valued by the pure functions
+below. A batch of properties is valued by the same functions from rates loaded beforehand, so a
+property gets the same savings whether it is sent alone or in a batch.
+"""
+from typing import Dict, List, Set
+
+from src.calculator.constants import CURRENCIES, PROPERTY_ITEM_FIELDS
+from src.calculator.schemas import ZakatOnProperty
+from src.calculator.utility.handling_gold import gold_value
+from src.calculator.utility.handling_silver import silver_value
+from src.calculator.utility.nisab_api_client import prefetch_rates, conversion_rate, silver_gram_price, \
+    gold_gram_price
+
+
+def required_currencies(property: ZakatOnProperty) -> Set[str]:
+    """
+    Collect the currency codes needed to convert every item of the property.
+
+    Parameters:
+    - property (ZakatOnProperty): The details of the property.
+
+    Returns:
+    - Set[str]: The currency of the property and the valid currency codes of its items.
+    """
+    currencies = {property.currency}
+    for field in PROPERTY_ITEM_FIELDS:
+        for item in getattr(property, field) or []:
+            if item.currency_code in CURRENCIES:
+                currencies.add(item.currency_code)
+    return currencies
+
+
+def convert_item(item, currency: str, rates: Dict[str, float]) -> float:
+    """
+    Convert an item to the currency of the property. An item in an unknown currency is taken to be in the
+    currency of the property, and a missing value counts as nothing.
+    """
+    item_currency = item.currency_code if item.currency_code in CURRENCIES else currency
+    value = item.value or 0
+    if item_currency == currency:
+        return value
+    return value * conversion_rate(rates, currency, item_currency)
+
+
+def line_item_values(property: ZakatOnProperty, rates: Dict[str, float]) -> List[float]:
+    """
+    Value every line item of the property, negative for the taxes.
+
+    Parameters:
+    - property (ZakatOnProperty): The details of the property.
+    - rates (Dict[str, float]): The rates of every currency the property needs, plus XAU and XAG.
+
+    Returns:
+    - List[float]: The signed value of each line item, in the currency of the property.
+    """
+    values = []
+    for field in PROPERTY_ITEM_FIELDS:
+        sign = -1 if field == 'taxes_value' else 1
+        for item in getattr(property, field) or []:
+            values.append(sign * convert_item(item, property.currency, rates))
+    if property.silver_jewelry:
+        gram_price = silver_gram_price(rates, property.currency)
+        values += [silver_value(item, gram_price) for item in property.silver_jewelry]
+    if property.gold_jewelry:
+        gram_price = gold_gram_price(rates, property.currency)
+        values += [gold_value(item, gram_price) for item in property.gold_jewelry]
+    return values
+
+
+async def value_property(property: ZakatOnProperty) -> float:
+    """
+    Compute the savings of the property: its assets minus its taxes, in the currency of the property.
+
+    Parameters:
+    - property (ZakatOnProperty): The details of the property.
+
+    Returns:
+    - float: The value of the savings.
+    """
+    rates = await prefetch_rates(required_currencies(property))
+    return sum(line_item_values(property, rates))
+
+
+def value_properties(properties: List[ZakatOnProperty], rates: Dict[str, float]) -> List[float]:
+    """
+    Compute the savings of many properties at once from already loaded rates.
+
+    Parameters:
+    - properties (List[ZakatOnProperty]): The details of the properties.
+    - rates (Dict[str, float]): The rates of every currency the properties need, plus XAU and XAG.
+
+    Returns:
+    - List[float]: The value of the savings of each property, in its own currency.
+    """
+    return [sum(line_item_values(property, rates)) for property in properties]
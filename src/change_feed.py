@@ -0,0 +1,213 @@
+"""
+Change feed of the published collections, read by the sync endpoints of the mobile app.
+
+Every write sets the UPDATED_AT property of the object (see `stamp` in src/weaviate_client.py) and
+every deletion from a published collection leaves a Tombstone. A client keeps the watermark returned
+by its last sync and receives the objects written since then and the IDs of the objects deleted
+since then, instead of the whole collection.
+
+Timestamps are taken by the app before the write reaches Weaviate, so a write may become visible
+after a sync that started later. The watermark returned is therefore SYNC_WATERMARK_LAG seconds
+before the start of the sync, longer than any write may take, and the next sync sends the recent
+changes again. Objects are upserted by ID on the client, so a change sent twice is harmless.
+
+A tombstone is written before the object is deleted, so a failed write never loses a deletion. A
+tombstone whose object still exists, because the deletion failed or the object was published again
+with the same ID, is not sent. Tombstones are kept for TOMBSTONE_RETENTION_DAYS, a client whose
+watermark is older has to sync from scratch.
+"""
+from typing import Dict, List, Sequence, Tuple
+from weaviate.util import generate_uuid5
+from fastapi import HTTPException
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+
+from src.weaviate_client import UPDATED_AT, async_client, call_timeout, client, now_ms, write_batch
+
+load_dotenv('.env')
+
+logger = logging.getLogger(__name__)
+
+SYNC_WATERMARK_LAG: float = float(os.getenv("SYNC_WATERMARK_LAG", str(call_timeout)))
+SYNC_PAGE_SIZE: int = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+MAX_SYNC_PAGE_SIZE = 1000
+TOMBSTONE_RETENTION_DAYS: float = float(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+TOMBSTONE_PRUNE_INTERVAL: float = float(os.getenv("TOMBSTONE_PRUNE_INTERVAL", "3600"))
+# Tombstones sent by one sync, larger than the biggest bulk move so one batch never spans two pages
+MAX_SYNC_TOMBSTONES = 10000
+
+TOMBSTONE_CLASS = "Tombstone"
+# The collections the mobile app syncs, the only ones whose deletions leave tombstones
+SYNCED_COLLECTIONS = ("Article", "News", "Organization")
+
+Watermark = Tuple[int, int]
+
+
+def parse_watermark(token: str) -> Watermark:
+    """
+    Parse a watermark returned by a previous sync.
+
+    Parameters:
+    - token (str): The watermark, '<milliseconds>.<skip>'.
+
+    Returns:
+    - Watermark: The time of the watermark and the number of objects written at exactly that time
+      already sent.
+
+    Raises:
+    - HTTPException: If the watermark is malformed, or too old for the deletions since then to be known.
+    """
+    try:
+        timestamp, _, skip = token.partition(".")
+        watermark = int(timestamp), int(skip or 0)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid watermark")
+    if watermark[0] < 0 or watermark[1] < 0:
+        raise HTTPException(status_code=400, detail="Invalid watermark")
+    if watermark[0] < now_ms() - TOMBSTONE_RETENTION_DAYS * 86400 * 1000:
+        raise HTTPException(status_code=410, detail="The watermark is too old, sync again without it")
+    return watermark
+
+
+def format_watermark(watermark: Watermark) -> str:
+    return f"{watermark[0]}.{watermark[1]}"
+
+
+def safe_watermark(staleness: float = 0) -> str:
+    """
+    Return the watermark of a full sync made from data at most `staleness` seconds old.
+    """
+    return format_watermark((max(now_ms() - int((SYNC_WATERMARK_LAG + staleness) * 1000), 0), 0))
+
+
+async def record_deletions(collection_name: str, object_ids: Sequence[str]) -> None:
+    """
+    Write the tombstones of objects about to be deleted from a collection. Nothing is written for
+    the collections that are not synced.
+
+    Parameters:
+    - collection_name (str): The collection the objects are deleted from.
+    - object_ids (Sequence[str]): The IDs of the objects.
+
+    Raises:
+    - HTTPException: If the tombstones could not be written. The objects must then not be deleted.
+    """
+    if collection_name not in SYNCED_COLLECTIONS or not object_ids:
+        return
+    # One tombstone per object and collection, a second deletion of the same object replaces it.
+    # The batch write sets the time of the deletion.
+    tombstones = [(generate_uuid5(f"{collection_name}/{object_id}"),
+                   {"collection": collection_name, "objectId": object_id})
+                  for object_id in object_ids]
+    errors = await async_client.run(write_batch, TOMBSTONE_CLASS, tombstones, len(tombstones), 1,
+                                    operation="batch_create")
+    if errors:
+        raise HTTPException(status_code=502, detail="Could not record the deletion")
+
+
+async def _existing_ids(collection_name: str, object_ids: Sequence[str]) -> set:
+    if not object_ids:
+        return set()
+    query = (
+        client.query.get(collection_name, [UPDATED_AT])
+        .with_additional(["id"])
+        .with_where({"path": ["id"], "operator": "ContainsAny", "valueTextArray": list(object_ids)})
+        .with_limit(len(object_ids))
+    )
+    result = await async_client.do(query)
+    return {item["_additional"]["id"] for item in result["data"]["Get"][collection_name]}
+
+
+async def read_changes(collection_name: str, properties: Sequence[str], additional: Sequence[str],
+                       watermark: Watermark, limit: int) -> Tuple[List[Dict], List[str], str, bool]:
+    """
+    Read the changes of a collection since a watermark.
+
+    The objects are read in the order of their last write, at most `limit` of them. When there are
+    more, the returned watermark is the time of the last object read, and the objects written at
+    exactly that time already read are skipped by the next call. Otherwise it is the safe time
+    SYNC_WATERMARK_LAG seconds ago, even if the watermark passed in was later.
+
+    Parameters:
+    - collection_name (str): The synced collection.
+    - properties (Sequence[str]): The properties of the objects to return.
+    - additional (Sequence[str]): The additional properties of the objects to return.
+    - watermark (Watermark): The watermark returned by the previous sync.
+    - limit (int): The maximum number of objects to return.
+
+    Returns:
+    - List[Dict]: The objects written since the watermark, as returned by a query.
+    - List[str]: The IDs of the objects deleted since the watermark.
+    - str: The watermark to pass to the next sync.
+    - bool: Whether there are more changes to read right away.
+    """
+    since, skip = watermark
+    safe_time = now_ms() - int(SYNC_WATERMARK_LAG * 1000)
+    objects_query = (
+        client.query.get(collection_name, list(dict.fromkeys([*properties, UPDATED_AT])))
+        .with_additional(list(additional))
+        .with_where({"path": [UPDATED_AT], "operator": "GreaterThanEqual", "valueInt": since})
+        .with_sort({"path": [UPDATED_AT], "order": "asc"})
+        .with_offset(skip)
+        .with_limit(limit + 1)
+    )
+    tombstones_query = (
+        client.query.get(TOMBSTONE_CLASS, ["objectId", UPDATED_AT])
+        .with_where({
+            "operator": "And",
+            "operands": [
+                {"path": ["collection"], "operator": "Equal", "valueText": collection_name},
+                {"path": [UPDATED_AT], "operator": "GreaterThanEqual", "valueInt": since},
+            ]
+        })
+        .with_sort({"path": [UPDATED_AT], "order": "asc"})
+        .with_limit(MAX_SYNC_TOMBSTONES + 1)
+    )
+    objects_result, tombstones_result = await asyncio.gather(async_client.do(objects_query),
+                                                             async_client.do(tombstones_query))
+    objects = objects_result["data"]["Get"][collection_name]
+    tombstones = tombstones_result["data"]["Get"][TOMBSTONE_CLASS]
+
+    # A truncated page ends at the last change read, the last page at the safe time
+    boundaries = []
+    if len(objects) > limit:
+        objects = objects[:limit]
+        boundaries.append(objects[-1][UPDATED_AT])
+    if len(tombstones) > MAX_SYNC_TOMBSTONES:
+        tombstones = tombstones[:MAX_SYNC_TOMBSTONES]
+        boundaries.append(tombstones[-1][UPDATED_AT])
+    has_more = bool(boundaries)
+    next_since = min(boundaries) if boundaries else safe_time
+    # The objects written at exactly the new watermark that were sent are skipped by the next sync
+    next_skip = sum(1 for item in objects if item[UPDATED_AT] == next_since)
+    if next_since == since:
+        next_skip += skip
+
+    deleted_ids = list(dict.fromkeys(tombstone["objectId"] for tombstone in tombstones))
+    existing = await _existing_ids(collection_name, deleted_ids)
+    deleted_ids = [object_id for object_id in deleted_ids if object_id not in existing]
+    return objects, deleted_ids, format_watermark((next_since, next_skip)), has_more
+
+
+def _delete_expired_tombstones() -> int:
+    cutoff = now_ms() - int(TOMBSTONE_RETENTION_DAYS * 86400 * 1000)
+    result = client.batch.delete_objects(
+        class_name=TOMBSTONE_CLASS,
+        where={"path": [UPDATED_AT], "operator": "LessThan", "valueInt": cutoff}
+    )
+    return result["results"]["successful"]
+
+
+async def prune_tombstones(interval: float = TOMBSTONE_PRUNE_INTERVAL) -> None:
+    """
+    Delete the tombstones older than TOMBSTONE_RETENTION_DAYS every `interval` seconds, until cancelled.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            deleted = await async_client.run(_delete_expired_tombstones, operation="batch_delete")
+            logger.info("Deleted %d expired tombstones", deleted)
+        except Exception as error:
+            logger.warning("Could not delete the expired tombstones: %s", error)
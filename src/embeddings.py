@@ -0,0 +1,144 @@
+"""
+Client of the Jina AI embeddings API.
+
+The texts are embedded with the same model the 'text2vec-jinaai' module of Weaviate uses, so the
+vectors can be compared with each other and with the vectors stored in Weaviate. The vectors of
+query strings are cached, since the same searches and questions come back often. The cache can be
+saved to EMBEDDING_CACHE_FILE on shutdown and loaded from it on startup, so a restarted worker does
+not have to embed the popular queries again.
+"""
+from typing import List, Optional, Sequence
+from fastapi import HTTPException
+from dotenv import load_dotenv
+import operator
+import orjson
+import httpx
+import math
+import os
+
+from src.cache import TTLCache
+from src.metrics import track_upstream
+
+load_dotenv('.env')
+
+JINA_API_KEY: str = os.getenv("JINA_AI_API_KEY")
+EMBEDDINGS_URL: str = os.getenv("JINA_EMBEDDINGS_URL", "https://api.jina.ai/v1/embeddings")
+EMBEDDINGS_MODEL: str = os.getenv("JINA_EMBEDDINGS_MODEL", "jina-embeddings-v2-base-en")
+EMBEDDINGS_TIMEOUT: float = float(os.getenv("EMBEDDINGS_TIMEOUT", "10"))
+EMBEDDING_CACHE_SIZE: int = int(os.getenv("EMBEDDING_CACHE_SIZE", "1024"))
+EMBEDDING_CACHE_FILE: Optional[str] = os.getenv("EMBEDDING_CACHE_FILE")
+
+_http_client = httpx.AsyncClient(timeout=EMBEDDINGS_TIMEOUT)
+
+# The vector of a text never changes for a given model, so the entries only leave by LRU eviction
+_query_embeddings = TTLCache("query_embeddings", maxsize=EMBEDDING_CACHE_SIZE)
+
+
+async def embed(texts: Sequence[str]) -> List[List[float]]:
+    """
+    Embed the texts with one call to the embeddings API.
+
+    Parameters:
+    - texts (Sequence[str]): The texts to embed.
+
+    Returns:
+    - List[List[float]]: The vector of each text, in the same order.
+
+    Raises:
+    - HTTPException: If the embeddings API failed or did not respond in time.
+    """
+    try:
+        with track_upstream("jina_embeddings"):
+            response = await _http_client.post(
+                EMBEDDINGS_URL,
+                headers={"Authorization": f"Bearer {JINA_API_KEY}"},
+                json={"model": EMBEDDINGS_MODEL, "input": list(texts)}
+            )
+            response.raise_for_status()
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="The embeddings service did not respond in time")
+    except httpx.HTTPError:
+        raise HTTPException(status_code=502, detail="Could not compute the embeddings")
+    data = sorted(response.json()["data"], key=lambda item: item["index"])
+    return [item["embedding"] for item in data]
+
+
+async def embed_query(text: str) -> List[float]:
+    """
+    Embed a query string, reusing the cached vector if the same string was embedded before.
+
+    Parameters:
+    - text (str): The query string.
+
+    Returns:
+    - List[float]: The vector of the query.
+    """
+    vector = _query_embeddings.get(text)
+    if vector is None:
+        vector = (await embed([text]))[0]
+        _query_embeddings.set(text, vector)
+    return vector
+
+
+def load_embedding_cache(path: Optional[str] = EMBEDDING_CACHE_FILE) -> int:
+    """
+    Warm the query vector cache from a file written by `save_embedding_cache`.
+
+    The file is ignored if it is missing, unreadable or was written for another model.
+
+    Parameters:
+    - path (str, optional): The file to read. Nothing is loaded if None.
+
+    Returns:
+    - int: The number of vectors loaded.
+    """
+    if not path or not os.path.exists(path):
+        return 0
+    try:
+        with open(path, "rb") as file:
+            saved = orjson.loads(file.read())
+    except (OSError, orjson.JSONDecodeError):
+        return 0
+    if saved.get("model") != EMBEDDINGS_MODEL:
+        return 0
+    # The entries are saved from the least to the most recently used, so the LRU order is kept
+    entries = saved.get("entries", [])[-EMBEDDING_CACHE_SIZE:]
+    for text, vector in entries:
+        _query_embeddings.set(text, vector)
+    return len(entries)
+
+
+def save_embedding_cache(path: Optional[str] = EMBEDDING_CACHE_FILE) -> int:
+    """
+    Write the query vector cache to a file, replacing it atomically. A failure to write is ignored,
+    the cache is only an optimization.
+
+    Parameters:
+    - path (str, optional): The file to write. Nothing is saved if None.
+
+    Returns:
+    - int: The number of vectors saved.
+    """
+    if not path:
+        return 0
+    entries = _query_embeddings.items()
+    temporary_path = f"{path}.tmp"
+    try:
+        with open(temporary_path, "wb") as file:
+            file.write(orjson.dumps({"model": EMBEDDINGS_MODEL, "entries": entries}))
+        os.replace(temporary_path, path)
+    except OSError:
+        return 0
+    return len(entries)
+
+
+def normalize_vector(vector: Sequence[float]) -> List[float]:
+    """
+    Scale a vector to unit length, so that the cosine similarity of two vectors is their dot product.
+    """
+    norm = math.sqrt(sum(value * value for value in vector))
+    return [value / norm for value in vector] if norm else list(vector)
+
+
+def dot(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum(map(operator.mul, a, b))
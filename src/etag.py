@@ -0,0 +1,66 @@
+"""
+Strong ETags and conditional GET for the read endpoints.
+
+The ETags are hashes of the content sent, so every worker gives the same ETag to the same content
+and a change made through another worker changes it too, which the per-worker write generations
+could not guarantee. The ETag of a collection is the hash of the body of its snapshot, computed once
+when the snapshot is loaded, so a request whose If-None-Match matches the snapshot in memory gets a
+304 without any query, parsing or serialization.
+"""
+from typing import Annotated, Any, Dict, Optional, Union
+from fastapi import Header, Response
+from fastapi.responses import ORJSONResponse
+import hashlib
+import orjson
+
+ETAG_HEADER = "ETag"
+
+IfNoneMatchHeader = Annotated[Optional[str], Header(description="ETags of the versions the client already has.")]
+
+
+def make_etag(*parts: Union[str, bytes]) -> str:
+    """
+    Return a strong ETag hashing the parts in order.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode() if isinstance(part, str) else part)
+        digest.update(b"\x00")
+    return f'"{digest.hexdigest()}"'
+
+
+def object_etag(data_object: Dict) -> str:
+    """
+    Return the ETag of an object returned by `get_by_id`, hashing its ID and properties.
+    """
+    return make_etag(data_object["id"], orjson.dumps(data_object["properties"], option=orjson.OPT_SORT_KEYS))
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against the current ETag, with the weak comparison RFC 9110 requires.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={ETAG_HEADER: etag})
+
+
+def etag_headers(etag: str, headers: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    return {**(headers or {}), ETAG_HEADER: etag}
+
+
+def conditional_json(content: Any, if_none_match: Optional[str]) -> Response:
+    """
+    Send small JSON content with the ETag of its serialization, or a 304 if the client already has it.
+    """
+    body = orjson.dumps(content)
+    etag = make_etag(body)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return Response(content=body, media_type=ORJSONResponse.media_type, headers=etag_headers(etag))
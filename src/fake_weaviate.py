@@ -0,0 +1,446 @@
+"""
+In-process stand-in for the Weaviate client, used to run and measure the API without a database.
+
+It implements the part of the weaviate.Client surface the app uses: `query.get(...).with_*().do()`,
+`data_object`, `schema` and `batch`. Objects live in memory, bm25 and hybrid searches rank them by the
+query terms they contain, and vectors are hashed bags of words, see `fake_vector`. Every call that
+would be an HTTP round trip sleeps for `latency` seconds plus up to `jitter` seconds, so that the
+blocking behaviour of the real client is kept. The client is selected with WEAVIATE_FAKE, see
+`src/weaviate_client.py`.
+"""
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+import threading
+import hashlib
+import random
+import math
+import copy
+import time
+import uuid
+
+FAKE_VECTOR_DIMENSIONS = 64
+FAKE_ANSWER = "This is a generated answer.\n\nIt is the same for every question."
+
+Where = Dict[str, Any]
+
+
+def fake_vector(text: str, dimensions: int = FAKE_VECTOR_DIMENSIONS) -> List[float]:
+    """
+    Return a deterministic unit vector of a text, close for texts sharing words.
+
+    Parameters:
+    - text (str): The text to embed.
+    - dimensions (int, optional): The length of the vector.
+
+    Returns:
+    - List[float]: The vector of the text.
+    """
+    vector = [0.0] * dimensions
+    for word in _terms(text):
+        digest = hashlib.blake2b(word.encode(), digest_size=4).digest()
+        vector[int.from_bytes(digest[:3], "little") % dimensions] += 1.0 if digest[3] & 1 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector))
+    if norm == 0:
+        return [1.0] + [0.0] * (dimensions - 1)
+    return [value / norm for value in vector]
+
+
+def _terms(text: Any) -> List[str]:
+    if isinstance(text, list):
+        return [term for item in text for term in _terms(item)]
+    if not isinstance(text, str):
+        return []
+    return "".join(character if character.isalnum() else " " for character in text.lower()).split()
+
+
+def _filter_value(where: Where) -> Any:
+    for key, value in where.items():
+        if key.startswith("value"):
+            return value
+    raise ValueError(f"No value in the filter {where}")
+
+
+def _matches(object_id: str, properties: Dict, where: Optional[Where]) -> bool:
+    if where is None:
+        return True
+    operator = where["operator"]
+    if operator == "And":
+        return all(_matches(object_id, properties, operand) for operand in where["operands"])
+    if operator == "Or":
+        return any(_matches(object_id, properties, operand) for operand in where["operands"])
+    path = where["path"][0]
+    actual = object_id if path == "id" else properties.get(path)
+    expected = _filter_value(where)
+    actual_values = actual if isinstance(actual, list) else [actual]
+    expected_values = expected if isinstance(expected, list) else [expected]
+    if operator == "ContainsAny":
+        return any(value in actual_values for value in expected_values)
+    if operator == "ContainsAll":
+        return all(value in actual_values for value in expected_values)
+    if operator == "Equal":
+        return actual == expected
+    if operator == "NotEqual":
+        return actual != expected
+    if actual is None:
+        return False
+    if operator == "GreaterThan":
+        return actual > expected
+    if operator == "GreaterThanEqual":
+        return actual >= expected
+    if operator == "LessThan":
+        return actual < expected
+    if operator == "LessThanEqual":
+        return actual <= expected
+    raise ValueError(f"Unsupported filter operator {operator}")
+
+
+class FakeStore:
+    """
+    The objects of every class, with their creation and last update times in milliseconds.
+    """
+
+    def __init__(self):
+        self.classes: Dict[str, Dict[str, Dict]] = {}
+        self.lock = threading.RLock()
+
+    def put(self, class_name: str, object_id: str, properties: Dict) -> None:
+        now = int(time.time() * 1000)
+        with self.lock:
+            objects = self.classes.setdefault(class_name, {})
+            created = objects[object_id]["created"] if object_id in objects else now
+            objects[object_id] = {
+                "properties": copy.deepcopy(properties),
+                "created": created,
+                "updated": now,
+                "vector": fake_vector(" ".join(str(value) for value in properties.values())),
+            }
+
+    def get(self, class_name: str, object_id: str) -> Optional[Dict]:
+        with self.lock:
+            return self.classes.get(class_name, {}).get(object_id)
+
+    def delete(self, class_name: str, object_id: str) -> bool:
+        with self.lock:
+            return self.classes.get(class_name, {}).pop(object_id, None) is not None
+
+    def items(self, class_name: str) -> List[Tuple[str, Dict]]:
+        with self.lock:
+            return sorted(self.classes.get(class_name, {}).items())
+
+
+class FakeQuery:
+    """
+    A query built with `client.query.get`, executed in memory by `do`.
+    """
+
+    def __init__(self, fake: "FakeWeaviateClient", class_name: str, properties: Sequence[str]):
+        self._fake = fake
+        self._class_name = class_name
+        self._properties = list(properties)
+        self._additional: List[str] = []
+        self._where: Optional[Where] = None
+        self._limit: Optional[int] = None
+        self._offset = 0
+        self._after: Optional[str] = None
+        self._search: Optional[str] = None
+        self._search_properties: Optional[List[str]] = None
+        self._vector: Optional[List[float]] = None
+        self._alpha = 0.0
+        self._generate: Optional[str] = None
+        self._sort: List[Dict] = []
+
+    def with_additional(self, properties: Union[str, List[str]]) -> "FakeQuery":
+        self._additional += [properties] if isinstance(properties, str) else list(properties)
+        return self
+
+    def with_where(self, where: Where) -> "FakeQuery":
+        self._where = where
+        return self
+
+    def with_limit(self, limit: int) -> "FakeQuery":
+        self._limit = limit
+        return self
+
+    def with_offset(self, offset: int) -> "FakeQuery":
+        self._offset = offset
+        return self
+
+    def with_after(self, after: str) -> "FakeQuery":
+        self._after = after
+        return self
+
+    def with_sort(self, content: Union[Dict, List[Dict]]) -> "FakeQuery":
+        self._sort += [content] if isinstance(content, dict) else list(content)
+        return self
+
+    def with_bm25(self, query: str, properties: Optional[List[str]] = None) -> "FakeQuery":
+        self._search = query
+        self._search_properties = properties
+        return self
+
+    def with_hybrid(self, query: str, alpha: Optional[float] = None, vector: Optional[List[float]] = None,
+                    properties: Optional[List[str]] = None, fusion_type: Any = None) -> "FakeQuery":
+        self._search = query
+        self._search_properties = properties
+        self._vector = vector or fake_vector(query)
+        self._alpha = 0.75 if alpha is None else alpha
+        return self
+
+    def with_generate(self, single_prompt: Optional[str] = None, grouped_task: Optional[str] = None,
+                      grouped_properties: Optional[List[str]] = None) -> "FakeQuery":
+        self._generate = single_prompt or grouped_task
+        return self
+
+    def _score(self, entry: Dict) -> float:
+        properties = self._search_properties or list(entry["properties"])
+        terms = set(_terms(self._search))
+        keyword_score = 0.0
+        for weighted in properties:
+            name, _, boost = weighted.partition("^")
+            keyword_score += float(boost or 1) * sum(term in terms for term in _terms(entry["properties"].get(name)))
+        if self._vector is None:
+            return keyword_score
+        similarity = sum(left * right for left, right in zip(self._vector, entry["vector"]))
+        return (1 - self._alpha) * keyword_score + self._alpha * similarity
+
+    def _distance(self, entry: Dict) -> float:
+        # Cosine distance, the metric Weaviate uses by default
+        vector = entry["vector"]
+        norms = math.sqrt(sum(value * value for value in self._vector) * sum(value * value for value in vector))
+        return 1 - sum(left * right for left, right in zip(self._vector, vector)) / norms if norms else 1.0
+
+    def _render(self, object_id: str, entry: Dict, score: Optional[float]) -> Dict:
+        item = {name: copy.deepcopy(entry["properties"].get(name)) for name in self._properties}
+        additional = {}
+        for name in self._additional:
+            if name == "id":
+                additional["id"] = object_id
+            elif name == "lastUpdateTimeUnix":
+                # GraphQL returns the times as strings
+                additional[name] = str(entry["updated"])
+            elif name == "creationTimeUnix":
+                additional[name] = str(entry["created"])
+            elif name == "vector":
+                additional[name] = list(entry["vector"])
+            elif name == "score":
+                additional[name] = str(score or 0.0)
+            elif name == "distance" and self._vector is not None:
+                additional[name] = self._distance(entry)
+        if self._generate is not None:
+            additional["generate"] = {"singleResult": FAKE_ANSWER, "error": None}
+        item["_additional"] = additional
+        return item
+
+    def do(self) -> Dict:
+        self._fake.wait()
+        entries = [(object_id, entry) for object_id, entry in self._fake.store.items(self._class_name)
+                   if _matches(object_id, entry["properties"], self._where)]
+        if self._after is not None:
+            entries = [(object_id, entry) for object_id, entry in entries if object_id > self._after]
+        scores: Dict[str, float] = {}
+        if self._search is not None:
+            scores = {object_id: self._score(entry) for object_id, entry in entries}
+            entries = [(object_id, entry) for object_id, entry in entries
+                       if self._vector is not None or scores[object_id] > 0]
+            entries.sort(key=lambda pair: -scores[pair[0]])
+        # Stable sorts from the last key to the first, objects without the property come first
+        for sort in reversed(self._sort):
+            name = sort["path"][0]
+            entries.sort(key=lambda pair: (pair[1]["properties"].get(name) is not None,
+                                           pair[1]["properties"].get(name)),
+                         reverse=sort.get("order") == "desc")
+        entries = entries[self._offset:]
+        if self._limit is not None:
+            entries = entries[:self._limit]
+        items = [self._render(object_id, entry, scores.get(object_id)) for object_id, entry in entries]
+        return {"data": {"Get": {self._class_name: items}}}
+
+
+class FakeQueryBuilder:
+    def __init__(self, fake: "FakeWeaviateClient"):
+        self._fake = fake
+
+    def get(self, class_name: str, properties: Optional[Sequence[str]] = None) -> FakeQuery:
+        return FakeQuery(self._fake, class_name, properties or [])
+
+
+class FakeDataObject:
+    def __init__(self, fake: "FakeWeaviateClient"):
+        self._fake = fake
+
+    def get_by_id(self, uuid: str, class_name: Optional[str] = None, with_vector: bool = False) -> Optional[Dict]:
+        self._fake.wait()
+        entry = self._fake.store.get(class_name, uuid)
+        if entry is None:
+            return None
+        data_object = {
+            "class": class_name,
+            "id": uuid,
+            "properties": copy.deepcopy(entry["properties"]),
+            "creationTimeUnix": entry["created"],
+            "lastUpdateTimeUnix": entry["updated"],
+        }
+        if with_vector:
+            data_object["vector"] = list(entry["vector"])
+        return data_object
+
+    def create(self, data_object: Dict, class_name: str, uuid: Optional[str] = None, **kwargs) -> str:
+        self._fake.wait()
+        object_id = str(uuid or _new_uuid())
+        self._fake.store.put(class_name, object_id, data_object)
+        return object_id
+
+    def replace(self, data_object: Dict, class_name: str, uuid: str, **kwargs) -> None:
+        self._fake.wait()
+        self._fake.store.put(class_name, str(uuid), data_object)
+
+    def update(self, data_object: Dict, class_name: str, uuid: str, **kwargs) -> None:
+        self._fake.wait()
+        entry = self._fake.store.get(class_name, str(uuid))
+        properties = dict(entry["properties"]) if entry is not None else {}
+        properties.update(data_object)
+        self._fake.store.put(class_name, str(uuid), properties)
+
+    def delete(self, uuid: str, class_name: Optional[str] = None, **kwargs) -> None:
+        self._fake.wait()
+        self._fake.store.delete(class_name, str(uuid))
+
+    def exists(self, uuid: str, class_name: Optional[str] = None, **kwargs) -> bool:
+        self._fake.wait()
+        return self._fake.store.get(class_name, str(uuid)) is not None
+
+
+class FakeSchemaProperty:
+    def __init__(self, schema: "FakeSchema"):
+        self._schema = schema
+
+    def create(self, schema_class_name: str, schema_property: Dict) -> None:
+        self._schema._fake.wait()
+        self._schema._classes[schema_class_name].setdefault("properties", []).append(copy.deepcopy(schema_property))
+
+
+class FakeSchema:
+    def __init__(self, fake: "FakeWeaviateClient"):
+        self._fake = fake
+        self._classes: Dict[str, Dict] = {}
+        self.property = FakeSchemaProperty(self)
+
+    def get(self, class_name: Optional[str] = None) -> Dict:
+        self._fake.wait()
+        if class_name is not None:
+            return copy.deepcopy(self._classes[class_name])
+        return {"classes": copy.deepcopy(list(self._classes.values()))}
+
+    def exists(self, class_name: str) -> bool:
+        self._fake.wait()
+        return class_name in self._classes
+
+    def create_class(self, schema_class: Dict) -> None:
+        self._fake.wait()
+        self._classes[schema_class["class"]] = copy.deepcopy(schema_class)
+
+
+class FakeBatch:
+    """
+    The batch API: objects added inside the `with` block are written when it exits, one request per
+    `batch_size` objects, and the results of every request are passed to the callback.
+    """
+
+    def __init__(self, fake: "FakeWeaviateClient"):
+        self._fake = fake
+        self._objects: List[Tuple[str, str, Dict]] = []
+        self._batch_size = 100
+        self._callback: Optional[Callable[[List[Dict]], None]] = None
+
+    def configure(self, batch_size: Optional[int] = 100, callback: Optional[Callable] = None, **kwargs) -> "FakeBatch":
+        self._batch_size = batch_size or 100
+        self._callback = callback
+        return self
+
+    def __enter__(self) -> "FakeBatch":
+        return self
+
+    def add_data_object(self, data_object: Dict, class_name: str, uuid: Optional[str] = None, **kwargs) -> str:
+        object_id = str(uuid or _new_uuid())
+        self._objects.append((class_name, object_id, data_object))
+        return object_id
+
+    def flush(self) -> None:
+        objects, self._objects = self._objects, []
+        for start in range(0, len(objects), self._batch_size):
+            self._fake.wait()
+            results = []
+            for class_name, object_id, data_object in objects[start:start + self._batch_size]:
+                self._fake.store.put(class_name, object_id, data_object)
+                results.append({"id": object_id, "class": class_name, "result": {}})
+            if self._callback is not None:
+                self._callback(results)
+
+    def __exit__(self, *exception_info) -> None:
+        self.flush()
+
+    def delete_objects(self, class_name: str, where: Where, output: str = "minimal", dry_run: bool = False) -> Dict:
+        self._fake.wait()
+        matching = [object_id for object_id, entry in self._fake.store.items(class_name)
+                    if _matches(object_id, entry["properties"], where)]
+        if not dry_run:
+            for object_id in matching:
+                self._fake.store.delete(class_name, object_id)
+        results = {"matches": len(matching), "successful": len(matching), "failed": 0, "limit": 10000}
+        if output == "verbose":
+            status = "DRYRUN" if dry_run else "SUCCESS"
+            results["objects"] = [{"id": object_id, "status": status, "errors": None} for object_id in matching]
+        return {"dryRun": dry_run, "output": output, "results": results}
+
+
+class FakeWeaviateClient:
+    """
+    In-memory replacement of weaviate.Client with injected latency.
+
+    Parameters:
+    - latency (float, optional): Seconds every call blocks for, like an HTTP round trip.
+    - jitter (float, optional): Maximum random seconds added to the latency of a call.
+    - seed (int, optional): Seed of the jitter, for reproducible runs.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._random = random.Random(seed)
+        self.store = FakeStore()
+        self.query = FakeQueryBuilder(self)
+        self.data_object = FakeDataObject(self)
+        self.schema = FakeSchema(self)
+        self.batch = FakeBatch(self)
+
+    def wait(self) -> None:
+        self.calls += 1
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def is_ready(self) -> bool:
+        return True
+
+    def load(self, class_name: str, objects: Iterable[Dict]) -> List[str]:
+        """
+        Store objects directly, without latency. Used to seed the fake.
+
+        Parameters:
+        - class_name (str): The class of the objects.
+        - objects (Iterable[Dict]): The properties of every object, with an optional 'id'.
+
+        Returns:
+        - List[str]: The IDs of the objects.
+        """
+        object_ids = []
+        for properties in objects:
+            properties = dict(properties)
+            object_id = str(properties.pop("id", None) or _new_uuid())
+            self.store.put(class_name, object_id, properties)
+            object_ids.append(object_id)
+        return object_ids
+
+
+def _new_uuid() -> str:
+    return str(uuid.uuid4())
@@ -0,0 +1,59 @@
+"""
+Client of the Mistral AI chat completions API, used to stream generated answers token by token.
+
+Weaviate's generative module returns the answer only once it is complete, so streamed answers are
+generated with the same model directly from Mistral.
+"""
+from typing import AsyncIterator
+from fastapi import HTTPException
+from dotenv import load_dotenv
+import httpx
+import json
+import os
+
+from src.metrics import track_upstream
+from src.schemas import class_article
+
+load_dotenv('.env')
+
+MISTRAL_API_KEY: str = os.getenv("MISTRAL_AI_API_KEY")
+MISTRAL_URL: str = os.getenv("MISTRAL_CHAT_URL", "https://api.mistral.ai/v1/chat/completions")
+MISTRAL_MODEL: str = os.getenv("MISTRAL_MODEL", class_article["moduleConfig"]["generative-mistral"]["model"])
+GENERATION_TIMEOUT: float = float(os.getenv("GENERATION_TIMEOUT", "60"))
+
+_http_client = httpx.AsyncClient(timeout=GENERATION_TIMEOUT)
+
+
+async def stream_completion(prompt: str) -> AsyncIterator[str]:
+    """
+    Generate an answer to the prompt and yield its text as it is produced.
+
+    Parameters:
+    - prompt (str): The prompt sent as a single user message.
+
+    Raises:
+    - HTTPException: If the generation failed or did not respond in time.
+    """
+    try:
+        with track_upstream("mistral"):
+            async with _http_client.stream(
+                "POST",
+                MISTRAL_URL,
+                headers={"Authorization": f"Bearer {MISTRAL_API_KEY}", "Accept": "text/event-stream"},
+                json={"model": MISTRAL_MODEL, "messages": [{"role": "user", "content": prompt}], "stream": True}
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        return
+                    for choice in json.loads(data)["choices"]:
+                        text = choice["delta"].get("content")
+                        if text:
+                            yield text
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="The generation service did not respond in time")
+    except httpx.HTTPError:
+        raise HTTPException(status_code=502, detail="Could not generate the answer")
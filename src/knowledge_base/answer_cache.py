@@ -0,0 +1,142 @@
+"""
+Cache of the answers generated by /knowledge-base/ask-question.
+
+An answer is first looked up by the normalized question. If no answer is found, the question is
+embedded and compared with the questions already answered, and the answer of the most similar one
+is reused when the similarity reaches ANSWER_SIMILARITY_THRESHOLD. The answers are based on the
+articles, so the whole cache is dropped when the 'Article' collection changes.
+"""
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from fastapi import HTTPException
+from dotenv import load_dotenv
+import functools
+import asyncio
+import re
+import os
+
+from src.cache import TTLCache, get_collection_generation, on_collection_changed
+from src.embeddings import embed_query, normalize_vector, dot
+
+load_dotenv('.env')
+
+ANSWER_CACHE_SIZE: int = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL: float = float(os.getenv("ANSWER_CACHE_TTL", "86400"))
+ANSWER_SIMILARITY_THRESHOLD: float = float(os.getenv("ANSWER_SIMILARITY_THRESHOLD", "0.92"))
+
+
+def normalize_question(question: str) -> str:
+    """
+    Lowercase the question and keep only its words, so that "What is Nisab?" and "what is nisab"
+    share an entry.
+    """
+    return " ".join(re.findall(r"\w+", question.lower()))
+
+
+class AnswerCache:
+    """
+    LRU/TTL cache of answers with an exact tier and a semantic tier.
+    """
+
+    def __init__(self, collection_name: str, maxsize: int, ttl: float, similarity_threshold: float,
+                 embed_question: Callable[[str], Awaitable[List[float]]]):
+        self.collection_name = collection_name
+        self.similarity_threshold = similarity_threshold
+        self.embed_question = embed_question
+        self.semantic_hits = 0
+        # Normalized question -> (answer, unit vector of the question or None)
+        self._answers = TTLCache("answers", maxsize=maxsize, ttl=ttl)
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        on_collection_changed(self._on_collection_changed)
+
+    def _on_collection_changed(self, collection_name: str) -> None:
+        if collection_name == self.collection_name:
+            self._answers.clear()
+
+    def _find_similar(self, vector: List[float]) -> Optional[str]:
+        best_answer, best_similarity = None, self.similarity_threshold
+        for _, (answer, other_vector) in self._answers.items():
+            if other_vector is None:
+                continue
+            similarity = dot(vector, other_vector)
+            if similarity >= best_similarity:
+                best_answer, best_similarity = answer, similarity
+        return best_answer
+
+    async def lookup(self, question: str) -> Tuple[Optional[str], Optional[List[float]]]:
+        """
+        Look up the answer to the question, then to a similar question.
+
+        Parameters:
+        - question (str): The question as asked by the user.
+
+        Returns:
+        - Tuple[Optional[str], Optional[List[float]]]: The cached answer or None, and the unit vector of
+          the question when it had to be embedded, to be passed to `store`.
+        """
+        key = normalize_question(question)
+        entry = self._answers.get(key)
+        if entry is not None:
+            return entry[0], entry[1]
+        return await self._lookup_similar(key)
+
+    async def _lookup_similar(self, key: str) -> Tuple[Optional[str], Optional[List[float]]]:
+        try:
+            vector = normalize_vector(await self.embed_question(key))
+        except HTTPException:
+            # Without an embedding only the exact tier is used
+            return None, None
+        answer = self._find_similar(vector)
+        if answer is not None:
+            self.semantic_hits += 1
+        return answer, vector
+
+    def store(self, question: str, answer: str, vector: Optional[List[float]], generation: int) -> None:
+        """
+        Keep the answer to the question, unless the articles changed since `generation`.
+        """
+        if generation == get_collection_generation(self.collection_name):
+            self._answers.set(normalize_question(question), (answer, vector))
+
+    async def get_answer(self, question: str, generate: Callable[[], Awaitable[str]]) -> str:
+        """
+        Return the cached answer to the question or to a similar one, generating it if needed.
+
+        Concurrent requests for the same question wait for a single generation. The generation runs
+        in its own task, so a request that is cancelled, e.g. because its client disconnected, stops
+        waiting without cancelling it for the others.
+
+        Parameters:
+        - question (str): The question as asked by the user.
+        - generate (Callable): Coroutine function generating the answer.
+
+        Returns:
+        - str: The answer to the question.
+        """
+        key = normalize_question(question)
+        entry = self._answers.get(key)
+        if entry is not None:
+            return entry[0]
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate(key, question, generate))
+            self._in_flight[key] = task
+            task.add_done_callback(functools.partial(self._generation_done, key))
+        return await asyncio.shield(task)
+
+    async def _generate(self, key: str, question: str, generate: Callable[[], Awaitable[str]]) -> str:
+        generation = get_collection_generation(self.collection_name)
+        answer, vector = await self._lookup_similar(key)
+        if answer is None:
+            answer = await generate()
+        self.store(question, answer, vector, generation)
+        return answer
+
+    def _generation_done(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Every request may have stopped waiting, do not let asyncio report the exception
+        if not task.cancelled():
+            task.exception()
+
+answer_cache = AnswerCache("Article", ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL, ANSWER_SIMILARITY_THRESHOLD,
+                           embed_query)
@@ -0,0 +1,94 @@
+"""
+Parsed content of the articles, cached per object and version.
+
+The 'content' property of an article is a JSON string. It is parsed into a Content model once per
+object ID and `lastUpdateTimeUnix`, then the same model is reused by every read of that version.
+The articles are sent with pydantic's serializer directly, so the Content trees are not validated
+and rebuilt again by the response model on every request.
+"""
+from typing import Any, Dict, List, Optional
+from pydantic import TypeAdapter
+from fastapi import Response
+from dotenv import load_dotenv
+import orjson
+import os
+
+from src.cache import TTLCache
+from src.knowledge_base.models import ArticleGet, Content
+
+load_dotenv('.env')
+
+CONTENT_CACHE_SIZE: int = int(os.getenv("CONTENT_CACHE_SIZE", "4096"))
+
+_articles_adapter = TypeAdapter(List[ArticleGet])
+
+
+class ContentCache:
+    """
+    LRU cache of parsed Content models keyed on (object ID, last update time).
+    """
+
+    def __init__(self, maxsize: int):
+        self._contents = TTLCache("article_content", maxsize=maxsize)
+
+    def get(self, object_id: str, version: Optional[Any], raw_content: Optional[str]) -> Content:
+        """
+        Return the parsed content of a version of an object, parsing it on the first read.
+
+        Parameters:
+        - object_id (str): The ID of the object.
+        - version (Any, optional): The last update time of the object. Without it nothing is cached.
+        - raw_content (str, optional): The 'content' property as stored.
+
+        Returns:
+        - Content: The parsed content.
+        """
+        # GraphQL returns the update time as a string and the REST API as a number
+        key = (object_id, str(version))
+        content = self._contents.get(key) if version is not None else None
+        if content is None:
+            content = Content.model_validate(orjson.loads(raw_content) if raw_content is not None else {})
+            if version is not None:
+                self._contents.set(key, content)
+        return content
+
+
+content_cache = ContentCache(CONTENT_CACHE_SIZE)
+
+
+def article_from_object(item: Dict) -> ArticleGet:
+    """
+    Build an ArticleGet from an object returned by a query with the 'id' and 'lastUpdateTimeUnix' additional
+    properties.
+    """
+    additional = item["_additional"]
+    return ArticleGet(
+        id=additional["id"],
+        tags=item["tags"],
+        title=item["title"],
+        text=item["text"],
+        content=content_cache.get(additional["id"], additional.get("lastUpdateTimeUnix"), item.get("content"))
+    )
+
+
+def article_from_data_object(article_object: Dict) -> ArticleGet:
+    """
+    Build an ArticleGet from an object returned by `get_by_id`.
+    """
+    properties = article_object["properties"]
+    return ArticleGet(
+        id=article_object["id"],
+        tags=properties["tags"],
+        title=properties["title"],
+        text=properties["text"],
+        content=content_cache.get(article_object["id"], article_object.get("lastUpdateTimeUnix"),
+                                  properties.get("content"))
+    )
+
+
+def article_response(article: ArticleGet, headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(content=article.model_dump_json(), media_type="application/json", headers=headers)
+
+
+def articles_response(articles: List[ArticleGet], headers: Optional[Dict[str, str]] = None) -> Response:
+    return Response(content=_articles_adapter.dump_json(articles), media_type="application/json", headers=headers)
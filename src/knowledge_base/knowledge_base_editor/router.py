@@ -1,8 +1,15 @@
-from src.knowledge_base.knowledge_base_user.router import get_article
-from src.knowledge_base.models import ArticleGet, ArticleAdd, Content, UserRequestGet
-from typing import List, Dict
-from src.weaviate_client import client
-from fastapi import APIRouter
+from src.knowledge_base.content_cache import article_from_data_object, article_from_object
+from src.knowledge_base.models import ArticleGet, ArticleAdd, UserRequestGet
+from typing import Annotated, List, Dict, Optional
+from src.cache import mark_collection_changed
+from src.change_feed import record_deletions
+from src.pagination import MAX_PAGE_SIZE, StreamFormat, get_page, iterate_batches, stream_collection
+from src.bulk import BatchSizeQuery, WorkersQuery, ResumeFromQuery, IMPORT_BATCH_SIZE, IMPORT_WORKERS, \
+    MoveRequest, MoveResult, import_collection, move_object, move_objects
+from src.knowledge_base.knowledge_base_user.router import ARTICLE_PROPERTIES, parse_articles, \
+    get_batch_with_cursor as get_articles_batch
+from src.weaviate_client import client, async_client
+from fastapi import APIRouter, Query, Request, Response
 import json
 
 router = APIRouter(
@@ -10,6 +17,19 @@ router = APIRouter(
     tags=["Knowledge Base Editor"]
 )
 
+
+def article_properties(article: ArticleAdd) -> Dict:
+    """
+    Convert an article into the properties stored in Weaviate, with the content as a JSON string.
+    """
+    return {
+        "tags": article.tags,
+        "title": article.title,
+        "text": article.text,
+        "content": json.dumps(article.content.dict())
+    }
+
+
 @router.post("/create-article/", response_model=ArticleGet, summary="Create a new article")
 async def create_article(article: ArticleAdd):
     """
@@ -21,18 +41,12 @@ async def create_article(article: ArticleAdd):
     Returns:
     - ArticleGet: The created article with its ID.
     """
-    content_dict = article.content.dict()
-    content_json = json.dumps(content_dict)
-    article_object = {
-        "tags": article.tags,
-        "title": article.title,
-        "text": article.text,
-        "content": content_json
-    }
-    result = client.data_object.create(
+    article_object = article_properties(article)
+    result = await async_client.create(
         data_object=article_object,
         class_name="Article"
     )
+    mark_collection_changed("Article")
     object_id = result
 
     return ArticleGet(
@@ -55,22 +69,20 @@ async def delete_article(article_id: str):
     Returns:
     - ArticleGet: The deleted article's details.
     """
-    article_object = client.data_object.get_by_id(
+    article_object = await async_client.get_by_id(
         article_id,
         class_name="Article"
     )
 
-    content_extract = article_object["properties"]
-    content = json.loads(content_extract["content"]) if 'content' in content_extract else {}
-    parsed_content = Content.parse_obj(content)
+    article = article_from_data_object(article_object)
 
-    client.data_object.delete(
+    await record_deletions("Article", [article_id])
+    await async_client.delete(
         article_id,
         class_name="Article",
     )
-    return ArticleGet(id=article_object["id"], tags=article_object["properties"]["tags"],
-                      text=article_object["properties"]["text"], title=article_object["properties"]["title"],
-                      content=parsed_content)
+    mark_collection_changed("Article")
+    return article
 
 
 @router.put("/edit-article/{article_id}", response_model=ArticleGet, summary="Edit an existing article")
@@ -85,21 +97,14 @@ async def edit_article(article: ArticleAdd, article_id: str):
     Returns:
     - ArticleGet: The updated article's details.
     """
-    content_dict = article.content.dict()
-    content_json = json.dumps(content_dict)
-
-    article_object = {
-        "tags": article.tags,
-        "title": article.title,
-        "text": article.text,
-        "content": content_json
-    }
+    article_object = article_properties(article)
 
-    client.data_object.replace(
+    await async_client.replace(
         uuid=article_id,
         class_name="Article",
         data_object=article_object
     )
+    mark_collection_changed("Article")
 
     return ArticleGet(
         id=article_id,
@@ -110,7 +115,7 @@ async def edit_article(article: ArticleAdd, article_id: str):
     )
 
 
-def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
+async def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
     """
     Retrieve a batch of objects from the collection with optional cursor for pagination.
 
@@ -131,9 +136,9 @@ def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = N
         .with_limit(batch_size)
     )
     if cursor is not None:
-        result = query.with_after(cursor).do()
+        result = await async_client.do(query.with_after(cursor))
     else:
-        result = query.do()
+        result = await async_client.do(query)
     return result["data"]["Get"][collection_name]
 
 
@@ -158,23 +163,34 @@ def parse_requests(data: List[Dict]) -> List[UserRequestGet]:
 
 
 @router.get("/get-requests", response_model=List[UserRequestGet], summary="Get a list of all user requests")
-async def get_requests():
+async def get_requests(response: Response,
+                      limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+                      cursor: Optional[str] = None,
+                      stream: Optional[StreamFormat] = None):
     """
     Retrieve a list of all user requests.
 
     This endpoint fetches all the user requests in the collection, handling pagination internally.
 
+    Passing `limit` and/or `cursor` returns a single page read directly from the database instead;
+    the cursor of the next page is returned in the X-Next-Cursor header. Passing `stream` streams
+    the whole collection page by page as NDJSON or as a JSON array.
+
+    Parameters:
+    - limit (int, optional): The size of the page.
+    - cursor (str, optional): The ID of the last user request of the previous page.
+    - stream (StreamFormat, optional): Stream the collection as 'ndjson' or 'json'.
+
     Returns:
     - List[UserRequestGet]: A list of all user requests.
     """
-    cursor = None
+    if stream is not None:
+        return stream_collection("Request", get_batch_with_cursor, parse_requests, stream, cursor)
+    if limit is not None or cursor is not None:
+        return await get_page("Request", get_batch_with_cursor, parse_requests, response, limit, cursor)
     requests_unformatted = []
-    while True:
-        next_batch = get_batch_with_cursor("Request", 100, cursor)
-        if len(next_batch) == 0:
-            break
-        requests_unformatted.extend(next_batch)
-        cursor = next_batch[-1]["_additional"]["id"]
+    async for batch in iterate_batches("Request", get_batch_with_cursor):
+        requests_unformatted.extend(batch)
     requests_output = parse_requests(requests_unformatted)
     return requests_output
 
@@ -190,7 +206,7 @@ async def get_request(request_id: str):
     Returns:
     - UserRequestGet: The details of the specified user request.
     """
-    request_object = client.data_object.get_by_id(
+    request_object = await async_client.get_by_id(
         request_id,
         class_name="Request"
     )
@@ -208,11 +224,11 @@ async def delete_request(request_id: str):
     Returns:
     - UserRequestGet: The deleted user request's details.
     """
-    request_object = client.data_object.get_by_id(
+    request_object = await async_client.get_by_id(
         request_id,
         class_name="Request"
     )
-    client.data_object.delete(
+    await async_client.delete(
         request_id,
         class_name="Request",
     )
@@ -223,47 +239,69 @@ async def unpublish_article(article_id: str):
     """
     Unpublish an article and move it to the saved articles collection.
 
+    The article keeps its ID. Retrying the request after a failure completes the move.
+
     Parameters:
     - article_id (str): The ID of the article to be unpublished.
 
     Returns:
     - ArticleGet: The details of the unpublished article now saved in the saved articles collection.
     """
-    # Retrieve the details of the article by its ID
-    article = await get_article(article_id)
+    article = await move_object(article_id, "Article", "ArticleSaved", ARTICLE_PROPERTIES)
+    return article_from_object(article)
 
-    # Convert the content of the article to JSON format
-    content_dict = article.content.dict()
-    content_json = json.dumps(content_dict)
 
-    # Create an object representation of the article
-    article_object = {
-        "tags": article.tags,
-        "title": article.title,
-        "text": article.text,
-        "content": content_json
-    }
+@router.post("/bulk-unpublish", response_model=MoveResult, summary="Unpublish articles in bulk")
+async def bulk_unpublish_articles(move: MoveRequest):
+    """
+    Unpublish several articles at once, keeping their IDs.
 
-    # Create the article in the saved articles collection
-    result = client.data_object.create(
-        data_object=article_object,
-        class_name="ArticleSaved"
-    )
+    The articles are copied with one batch request and removed from 'Article' with another.
+    Articles already in 'ArticleSaved' are reported as already moved, so the request can be retried.
 
-    # Get the ID of the newly created saved article
-    object_id = result
+    Parameters:
+    - move (MoveRequest): The IDs of the articles.
 
-    # Delete the article from the published articles collection
-    client.data_object.delete(
-        article_id,
-        class_name="Article",
-    )
+    Returns:
+    - MoveResult: The IDs moved, already moved, not found and failed with their error.
+    """
+    result, _ = await move_objects(move.ids, "Article", "ArticleSaved", ARTICLE_PROPERTIES)
+    return result
 
-    # Return the details of the unpublished article
-    return ArticleGet(
-        id=object_id,
-        tags=article.tags,
-        title=article.title,
-        text=article.text,
-        content=article.content
-    )
+
+@router.post("/import-articles", summary="Import articles in bulk")
+async def import_articles(request: Request,
+                          batch_size: BatchSizeQuery = IMPORT_BATCH_SIZE,
+                          workers: WorkersQuery = IMPORT_WORKERS,
+                          resume_from: ResumeFromQuery = 0):
+    """
+    Import articles from an NDJSON body, one article per line as returned by the export.
+
+    The articles are written with the batch API of the database. Articles with an `id` replace the
+    existing article with that ID, the others get an ID derived from their content.
+
+    Parameters:
+    - batch_size (int, optional): The number of articles sent in one batch request.
+    - workers (int, optional): The number of batch requests sent concurrently.
+    - resume_from (int, optional): The checkpoint of an interrupted import.
+
+    Returns:
+    - StreamingResponse: NDJSON progress lines with the checkpoint and the errors of the rejected
+      articles, then a summary line.
+    """
+    return await import_collection(request, "Article", ArticleAdd, article_properties,
+                                   batch_size=batch_size, workers=workers, resume_from=resume_from)
+
+
+@router.get("/export-articles", summary="Export all articles as NDJSON")
+async def export_articles(cursor: Optional[str] = None):
+    """
+    Stream every article as NDJSON, in the format accepted by the import.
+
+    Parameters:
+    - cursor (str, optional): The ID of the last article received, to resume an interrupted export.
+
+    Returns:
+    - StreamingResponse: One article per line.
+    """
+    return stream_collection("Article", get_articles_batch, parse_articles, StreamFormat.ndjson, cursor)
@@ -1,7 +1,13 @@
 from src.knowledge_base.models import ArticleGet, ArticleAdd, Content
-from src.weaviate_client import client
-from typing import List, Dict
-from fastapi import APIRouter
+from src.cache import snapshot_cache, mark_collection_changed
+from src.pagination import MAX_PAGE_SIZE, StreamFormat, get_page, iterate_batches, stream_collection
+from src.bulk import BatchSizeQuery, WorkersQuery, ResumeFromQuery, IMPORT_BATCH_SIZE, IMPORT_WORKERS, \
+    MoveRequest, MoveResult, import_collection, move_object, move_objects
+from src.knowledge_base.knowledge_base_editor.router import article_properties
+from src.knowledge_base.knowledge_base_user.router import ARTICLE_PROPERTIES
+from src.weaviate_client import client, async_client
+from typing import Annotated, List, Dict, Optional
+from fastapi import APIRouter, Query, Request, Response
 import json
 
 router = APIRouter(
@@ -10,7 +16,7 @@ router = APIRouter(
 )
 
 
-def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
+async def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
     """
     Retrieve a batch of objects from the collection with optional cursor for pagination.
 
@@ -31,9 +37,9 @@ def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = N
         .with_limit(batch_size)
     )
     if cursor is not None:
-        result = query.with_after(cursor).do()
+        result = await async_client.do(query.with_after(cursor))
     else:
-        result = query.do()
+        result = await async_client.do(query)
     return result["data"]["Get"][collection_name]
 
 
@@ -63,23 +69,45 @@ def parse_articles(data: List[Dict]) -> List[ArticleGet]:
 
 
 @router.get("/get-saved-articles", response_model=List[ArticleGet], summary="Get all saved articles")
-async def get_saved_articles():
+async def get_saved_articles(response: Response,
+                            limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+                            cursor: Optional[str] = None,
+                            stream: Optional[StreamFormat] = None):
     """
     Retrieve a list of all articles in the knowledge base.
 
-    This endpoint fetches all the articles in the collection, handling pagination internally.
+    The articles are served from an in-memory snapshot of the collection that is refreshed after edits.
+
+    Passing `limit` and/or `cursor` returns a single page read directly from the database instead;
+    the cursor of the next page is returned in the X-Next-Cursor header. Passing `stream` streams
+    the whole collection page by page as NDJSON or as a JSON array.
+
+    Parameters:
+    - limit (int, optional): The size of the page.
+    - cursor (str, optional): The ID of the last article of the previous page.
+    - stream (StreamFormat, optional): Stream the collection as 'ndjson' or 'json'.
 
     Returns:
     - List[ArticleGet]: A list of all articles.
     """
-    cursor = None
+    if stream is not None:
+        return stream_collection("ArticleSaved", get_batch_with_cursor, parse_articles, stream, cursor)
+    if limit is not None or cursor is not None:
+        return await get_page("ArticleSaved", get_batch_with_cursor, parse_articles, response, limit, cursor)
+    snapshot = await snapshot_cache.get_snapshot("ArticleSaved", load_saved_articles)
+    return snapshot.response()
+
+
+async def load_saved_articles() -> List[ArticleGet]:
+    """
+    Read every object of the 'ArticleSaved' collection, handling pagination internally.
+
+    Returns:
+    - List[ArticleGet]: The parsed articles of the collection.
+    """
     articles_unformatted = []
-    while True:
-        next_batch = get_batch_with_cursor("ArticleSaved", 100, cursor)
-        if len(next_batch) == 0:
-            break
-        articles_unformatted.extend(next_batch)
-        cursor = next_batch[-1]["_additional"]["id"]
+    async for batch in iterate_batches("ArticleSaved", get_batch_with_cursor):
+        articles_unformatted.extend(batch)
     articles_output = parse_articles(articles_unformatted)
     return articles_output
 
@@ -95,7 +123,7 @@ async def get_saved_article(article_id: str):
     Returns:
     - ArticleGet: The details of the specified article.
     """
-    article_object = client.data_object.get_by_id(
+    article_object = await async_client.get_by_id(
         article_id,
         class_name="ArticleSaved"
     )
@@ -118,18 +146,12 @@ async def create_saved_article(article: ArticleAdd):
     Returns:
     - ArticleGet: The created article with its ID.
     """
-    content_dict = article.content.dict()
-    content_json = json.dumps(content_dict)
-    article_object = {
-        "tags": article.tags,
-        "title": article.title,
-        "text": article.text,
-        "content": content_json
-    }
-    result = client.data_object.create(
+    article_object = article_properties(article)
+    result = await async_client.create(
         data_object=article_object,
         class_name="ArticleSaved"
     )
+    mark_collection_changed("ArticleSaved")
     object_id = result
 
     return ArticleGet(
@@ -153,7 +175,7 @@ async def delete_article(article_id: str):
     Returns:
     - ArticleGet: The deleted article's details.
     """
-    article_object = client.data_object.get_by_id(
+    article_object = await async_client.get_by_id(
         article_id,
         class_name="ArticleSaved"
     )
@@ -162,10 +184,11 @@ async def delete_article(article_id: str):
     content = json.loads(content_extract["content"]) if 'content' in content_extract else {}
     parsed_content = Content.parse_obj(content)
 
-    client.data_object.delete(
+    await async_client.delete(
         article_id,
         class_name="ArticleSaved",
     )
+    mark_collection_changed("ArticleSaved")
     return ArticleGet(id=article_object["id"], tags=article_object["properties"]["tags"],
                       text=article_object["properties"]["text"], title=article_object["properties"]["title"],
                       content=parsed_content)
@@ -183,21 +206,14 @@ async def edit_article(article: ArticleAdd, article_id: str):
     Returns:
     - ArticleGet: The updated article's details.
     """
-    content_dict = article.content.dict()
-    content_json = json.dumps(content_dict)
+    article_object = article_properties(article)
 
-    article_object = {
-        "tags": article.tags,
-        "title": article.title,
-        "text": article.text,
-        "content": content_json
-    }
-
-    client.data_object.replace(
+    await async_client.replace(
         uuid=article_id,
         class_name="ArticleSaved",
         data_object=article_object
     )
+    mark_collection_changed("ArticleSaved")
 
     return ArticleGet(
         id=article_id,
@@ -212,48 +228,69 @@ async def publish_article(saved_article_id: str):
     """
     Publish a saved article by moving it from the 'ArticleSaved' collection to the 'Article' collection.
 
+    The article keeps its ID. Retrying the request after a failure completes the move.
+
     Parameters:
     - saved_article_id (str): The ID of the saved article to be published.
 
     Returns:
     - ArticleGet: The details of the published article.
     """
-    # Retrieve the details of the saved article by its ID
-    article = await get_saved_article(saved_article_id)
-
-    # Convert the content of the article to JSON format
-    content_dict = article.content.dict()
-    content_json = json.dumps(content_dict)
-
-    # Create an object representation of the article
-    article_object = {
-        "tags": article.tags,
-        "title": article.title,
-        "text": article.text,
-        "content": content_json
-    }
-
-    # Create the article in the published articles collection
-    result = client.data_object.create(
-        data_object=article_object,
-        class_name="Article"
-    )
+    article = await move_object(saved_article_id, "ArticleSaved", "Article", ARTICLE_PROPERTIES)
+    return parse_articles([article])[0]
 
-    # Get the ID of the newly created published article
-    object_id = result
 
-    # Delete the article from the saved articles collection
-    client.data_object.delete(
-        saved_article_id,
-        class_name="ArticleSaved",
-    )
+@router.post("/bulk-publish", response_model=MoveResult, summary="Publish saved articles in bulk")
+async def bulk_publish_articles(move: MoveRequest):
+    """
+    Publish several articles at once, keeping their IDs.
+
+    The articles are copied with one batch request and removed from 'ArticleSaved' with another.
+    Articles already in 'Article' are reported as already moved, so the request can be retried.
+
+    Parameters:
+    - move (MoveRequest): The IDs of the articles.
+
+    Returns:
+    - MoveResult: The IDs moved, already moved, not found and failed with their error.
+    """
+    result, _ = await move_objects(move.ids, "ArticleSaved", "Article", ARTICLE_PROPERTIES)
+    return result
+
+
+@router.post("/import-saved-articles", summary="Import saved articles in bulk")
+async def import_saved_articles(request: Request,
+                                batch_size: BatchSizeQuery = IMPORT_BATCH_SIZE,
+                                workers: WorkersQuery = IMPORT_WORKERS,
+                                resume_from: ResumeFromQuery = 0):
+    """
+    Import saved articles from an NDJSON body, one article per line as returned by the export.
+
+    The articles are written with the batch API of the database. Articles with an `id` replace the
+    existing article with that ID, the others get an ID derived from their content.
+
+    Parameters:
+    - batch_size (int, optional): The number of articles sent in one batch request.
+    - workers (int, optional): The number of batch requests sent concurrently.
+    - resume_from (int, optional): The checkpoint of an interrupted import.
+
+    Returns:
+    - StreamingResponse: NDJSON progress lines with the checkpoint and the errors of the rejected
+      articles, then a summary line.
+    """
+    return await import_collection(request, "ArticleSaved", ArticleAdd, article_properties,
+                                   batch_size=batch_size, workers=workers, resume_from=resume_from)
 
-    # Return the details of the published article
-    return ArticleGet(
-        id=object_id,
-        tags=article.tags,
-        title=article.title,
-        text=article.text,
-        content=article.content
-    )
 
+@router.get("/export-saved-articles", summary="Export all saved articles as NDJSON")
+async def export_saved_articles(cursor: Optional[str] = None):
+    """
+    Stream every saved article as NDJSON, in the format accepted by the import.
+
+    Parameters:
+    - cursor (str, optional): The ID of the last article received, to resume an interrupted export.
+
+    Returns:
+    - StreamingResponse: One article per line.
+    """
+    return stream_collection("ArticleSaved", get_batch_with_cursor, parse_articles, StreamFormat.ndjson, cursor)
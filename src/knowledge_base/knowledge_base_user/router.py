@@ -1,16 +1,43 @@
-from src.knowledge_base.models import ArticleGet, Question, Content, SearchInput, UserRequestGet, UserRequestAdd
-from src.weaviate_client import client
+from src.knowledge_base.models import ArticleGet, Question, SearchInput, UserRequestGet, UserRequestAdd
+from src.knowledge_base.answer_cache import answer_cache
+from src.knowledge_base.content_cache import content_cache, article_from_object, article_from_data_object, \
+    article_response, articles_response
+from src.cache import snapshot_cache, search_cache, get_collection_generation, normalize_query
+from src.etag import IfNoneMatchHeader, etag_headers, etag_matches, make_etag, not_modified, object_etag
+from src.pagination import MAX_PAGE_SIZE, StreamFormat, get_page, iterate_batches, page_headers, stream_collection
+from src.projection import FIELDS_DESCRIPTION, parse_fields, project_models, project_objects, projected_response
+from src.weaviate_client import client, async_client
+from src.generation import stream_completion
+from src.embeddings import embed_query
+from src.metrics import LatencyMetric
+from fastapi.responses import StreamingResponse
 from fastapi import HTTPException
-from typing import List, Dict
-from fastapi import APIRouter
+from typing import Annotated, AsyncIterator, List, Dict, Optional, Sequence
+from fastapi import APIRouter, Query, Response
+import functools
+import time
 import json
+import re
 
 router = APIRouter(
     prefix="/knowledge-base",
     tags=["Knowledge Base User"]
 )
 
-def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+time_to_first_token = LatencyMetric("ask_question_time_to_first_token_seconds")
+
+# Maximum vector distance of the articles found by a search, the number of articles returned
+# when fewer are that close, and the number of candidates fetched to choose from
+SEARCH_MAX_DISTANCE = 0.26
+SEARCH_MIN_RESULTS = 3
+SEARCH_OVERFETCH = 25
+
+ARTICLE_PROPERTIES = ("tags", "title", "text", "content")
+
+async def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None,
+                                properties: Sequence[str] = ARTICLE_PROPERTIES) -> List[Dict]:
     """
     Retrieve a batch of objects from the collection with optional cursor for pagination.
 
@@ -18,6 +45,7 @@ def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = N
     - collection_name (str): The name of the collection to query.
     - batch_size (int): The number of items to retrieve in each batch.
     - cursor (str, optional): The cursor for pagination. If None, fetch from the start.
+    - properties (Sequence[str], optional): The properties to read. Defaults to all of them.
 
     Returns:
     - List[Dict]: A list of objects from the collection.
@@ -25,15 +53,15 @@ def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = N
     query = (
         client.query.get(
             collection_name,
-            ["tags", "title", "text", "content"]
+            list(properties)
         )
-        .with_additional(["id"])
+        .with_additional(["id", "lastUpdateTimeUnix"])
         .with_limit(batch_size)
     )
     if cursor is not None:
-        result = query.with_after(cursor).do()
+        result = await async_client.do(query.with_after(cursor))
     else:
-        result = query.do()
+        result = await async_client.do(query)
     return result["data"]["Get"][collection_name]
 
 def parse_articles(data: List[Dict]) -> List[ArticleGet]:
@@ -46,144 +74,254 @@ def parse_articles(data: List[Dict]) -> List[ArticleGet]:
     Returns:
     - List[ArticleGet]: A list of parsed ArticleGet models.
     """
-    articles = []
-    for item in data:
-        content = json.loads(item['content']) if 'content' in item else {}
-        parsed_content = Content.parse_obj(content)
-        article = ArticleGet(
-            id=item['_additional']['id'],
-            tags=item['tags'],
-            title=item['title'],
-            text=item['text'],
-            content=parsed_content
-        )
-        articles.append(article)
+    return [article_from_object(item) for item in data]
+
+def project_articles(data: List[Dict], fields: Sequence[str]) -> List[Dict]:
+    """
+    Keep the ID and the requested properties of a list of objects, with the content parsed.
+
+    Parameters:
+    - data (List[Dict]): The list of objects to project.
+    - fields (Sequence[str]): The properties to keep.
+
+    Returns:
+    - List[Dict]: The projected articles.
+    """
+    articles = project_objects(data, fields)
+    if "content" in fields:
+        for article, item in zip(articles, data):
+            additional = item["_additional"]
+            article["content"] = content_cache.get(additional["id"], additional.get("lastUpdateTimeUnix"),
+                                                   item["content"]).model_dump()
     return articles
 
 @router.get("/get-articles", response_model=List[ArticleGet], summary="Get all articles")
-async def get_articles():
+async def get_articles(response: Response,
+                      limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+                      cursor: Optional[str] = None,
+                      stream: Optional[StreamFormat] = None,
+                      fields: Annotated[Optional[str], Query(description=FIELDS_DESCRIPTION)] = None,
+                      if_none_match: IfNoneMatchHeader = None):
     """
     Retrieve a list of all articles in the knowledge base.
 
-    This endpoint fetches all the articles in the collection, handling pagination internally.
+    The articles are served from an in-memory snapshot of the collection that is refreshed after edits.
+    The snapshot is sent with an ETag, and a request whose If-None-Match matches it gets a 304.
+
+    Passing `limit` and/or `cursor` returns a single page read directly from the database instead;
+    the cursor of the next page is returned in the X-Next-Cursor header. Passing `stream` streams
+    the whole collection page by page as NDJSON or as a JSON array. Passing `fields` returns only
+    the ID and the requested properties of every article, e.g. `fields=title` for a list of titles.
+
+    Parameters:
+    - limit (int, optional): The size of the page.
+    - cursor (str, optional): The ID of the last article of the previous page.
+    - stream (StreamFormat, optional): Stream the collection as 'ndjson' or 'json'.
+    - fields (str, optional): The comma-separated properties to return.
+    - if_none_match (str, optional): The ETags of the snapshots the client already has.
 
     Returns:
     - List[ArticleGet]: A list of all articles.
     """
-    cursor = None
+    projection = parse_fields(fields, ArticleGet)
+    fetch_batch, parse = get_batch_with_cursor, parse_articles
+    if projection is not None:
+        fetch_batch = functools.partial(get_batch_with_cursor, properties=projection)
+        parse = functools.partial(project_articles, fields=projection)
+    if stream is not None:
+        return stream_collection("Article", fetch_batch, parse, stream, cursor)
+    if limit is not None or cursor is not None:
+        articles = await get_page("Article", fetch_batch, parse, response, limit, cursor)
+        if projection is not None:
+            return projected_response(articles, page_headers(response))
+        return articles_response(articles, page_headers(response))
+    snapshot = await snapshot_cache.get_snapshot("Article", load_articles)
+    etag = snapshot.etag if projection is None else make_etag(snapshot.etag, *projection)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    if projection is not None:
+        return projected_response(project_models(snapshot.objects, projection), etag_headers(etag))
+    return snapshot.response(etag_headers(etag))
+
+
+async def load_articles() -> List[ArticleGet]:
+    """
+    Read every object of the 'Article' collection, handling pagination internally.
+
+    Returns:
+    - List[ArticleGet]: The parsed articles of the collection.
+    """
     articles_unformatted = []
-    while True:
-        next_batch = get_batch_with_cursor("Article", 100, cursor)
-        if len(next_batch) == 0:
-            break
-        articles_unformatted.extend(next_batch)
-        cursor = next_batch[-1]["_additional"]["id"]
+    async for batch in iterate_batches("Article", get_batch_with_cursor):
+        articles_unformatted.extend(batch)
     articles_output = parse_articles(articles_unformatted)
     return articles_output
 
 @router.get("/get-article/{article_id}", response_model=ArticleGet, summary="Get a specific article by ID")
-async def get_article(article_id: str):
+async def get_article(article_id: str, if_none_match: IfNoneMatchHeader = None):
     """
     Retrieve details of a specific article by its ID.
 
+    The article is sent with an ETag of its stored properties, and a request whose If-None-Match
+    matches it gets a 304 without the content being parsed.
+
     Parameters:
     - article_id (str): The ID of the article to retrieve.
+    - if_none_match (str, optional): The ETags of the versions the client already has.
 
     Returns:
     - ArticleGet: The details of the specified article.
     """
-    article_object = client.data_object.get_by_id(
+    article_object = await async_client.get_by_id(
         article_id,
         class_name="Article"
     )
-    content_extract = article_object["properties"]
-    content = json.loads(content_extract["content"]) if 'content' in content_extract else {}
-    parsed_content = Content.parse_obj(content)
-    return ArticleGet(id=article_object["id"], tags=article_object["properties"]["tags"],
-                      text=article_object["properties"]["text"], title=article_object["properties"]["title"],
-                      content=parsed_content)
+    etag = object_etag(article_object)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    return article_response(article_from_data_object(article_object), etag_headers(etag))
 
 @router.post("/search-article/", response_model=List[ArticleGet], summary="Search for articles")
-async def search_article(text: SearchInput):
+async def search_article(text: SearchInput,
+                         fields: Annotated[Optional[str], Query(description=FIELDS_DESCRIPTION)] = None):
     """
     Search for articles in the knowledge base using a search string. The search is actually a vector similarity search.
 
+    The articles within SEARCH_MAX_DISTANCE of the search string are returned in the order of a hybrid search,
+    or the best SEARCH_MIN_RESULTS articles if fewer are that close. Both come from a single query that fetches
+    the distance of every candidate, and the results are cached until the articles change.
 
     Parameters:
     - text (SearchInput): The search input containing the search string.
+    - fields (str, optional): The comma-separated properties to return.
 
     Returns:
     - List[ArticleGet]: A list of articles matching the search criteria.
     """
-    max_distance = 0.26
+    projection = parse_fields(fields, ArticleGet)
     if text.searchString == "":
-        return await get_articles()
-    response = (
-        client.query
-        .get("Article", ["tags", "title", "text", "content"])
-        .with_hybrid(
-            query=text.searchString,
-            properties=["tags^3", "title^2", "text"],
-            alpha=0.5
-        )
-        .with_near_text({
-            "concepts" : [text.searchString],
-            "distance": max_distance
-        })
-        .with_additional("id")
-        .do()
-    )
-    articles = []
-    if len(response["data"]["Get"]["Article"]) < 3:
-        response = (
+        snapshot = await snapshot_cache.get_snapshot("Article", load_articles)
+        if projection is not None:
+            return projected_response(project_models(snapshot.objects, projection))
+        return snapshot.response()
+
+    async def run_search() -> List:
+        # The results are cached under the normalized search string, so they must be computed from it
+        query = normalize_query(text.searchString)
+        vector = await embed_query(query)
+        response = await async_client.do(
             client.query
-            .get("Article", ["tags", "title", "text", "content"])
+            .get("Article", list(projection or ARTICLE_PROPERTIES))
             .with_hybrid(
-                query=text.searchString,
+                query=query,
+                vector=vector,
                 properties=["tags^3", "title^2", "text"],
                 alpha=0.5
             )
-            .with_near_text({
-                "concepts": [text.searchString],
-            })
-            .with_limit(3)
-            .with_additional("id")
-            .do()
+            .with_limit(SEARCH_OVERFETCH)
+            .with_additional(["id", "lastUpdateTimeUnix", "distance"]),
+            operation="hybrid"
         )
-    for i in range(len(response["data"]["Get"]["Article"])):
-        content_extract = response["data"]["Get"]["Article"][i]
-        content = json.loads(content_extract["content"]) if 'content' in content_extract else {}
-        parsed_content = Content.parse_obj(content)
-        articles.append(ArticleGet(
-            id=response["data"]["Get"]["Article"][i]["_additional"]["id"],
-            tags=response["data"]["Get"]["Article"][i]["tags"],
-            title=response["data"]["Get"]["Article"][i]["title"],
-            text=response["data"]["Get"]["Article"][i]["text"],
-            content=parsed_content
-        ))
-    return articles
+        # Keep the ranking of the hybrid search, filtered by the vector distance to the search string
+        candidates = response["data"]["Get"]["Article"]
+        hits = [hit for hit in candidates if hit["_additional"]["distance"] <= SEARCH_MAX_DISTANCE]
+        if len(hits) < SEARCH_MIN_RESULTS:
+            hits = candidates[:SEARCH_MIN_RESULTS]
+        if projection is not None:
+            return project_articles(hits, projection)
+        return [article_from_object(hit) for hit in hits]
+
+    articles = await search_cache.get("Article", text.searchString, None, projection, run_search)
+    if projection is not None:
+        return projected_response(articles)
+    return articles_response(articles)
 
 @router.post("/ask-question/", summary="Ask a question")
 async def ask_question(question: Question):
     """
     Ask a question and get an answer based on the articles in the knowledge base.
 
+    Answers are cached, and reused for the same question or a very similar one until the articles change.
+
     Parameters:
     - question (Question): The question to ask.
 
     Returns:
     - str: The answer to the question.
     """
-    prompt = question.question + "? Use the title and text from the articles: {title} and {text}"
-    response = (
+    async def generate_answer() -> str:
+        prompt = question.question + "? Use the title and text from the articles: {title} and {text}"
+        response = await async_client.do(
+            client.query
+            .get("Article", ["tags", "title", "text"])
+            .with_generate(single_prompt=prompt)
+            .with_limit(1),
+            operation="generate"
+        )
+        result = response["data"]["Get"]["Article"][0]["_additional"]["generate"]["singleResult"]
+        return format_zakat_response(result)
+
+    return await answer_cache.get_answer(question.question, generate_answer)
+
+@router.post("/ask-question/stream", summary="Ask a question and stream the answer",
+             response_description="Server-Sent Events: 'message' events with the next piece of text, "
+                                  "then a 'done' event, or an 'error' event")
+async def ask_question_stream(question: Question):
+    """
+    Ask a question and receive the answer over Server-Sent Events as it is generated.
+
+    Every 'message' event carries the next piece of the answer in `text`, already cleaned up like the
+    answers of /ask-question/. A cached answer is sent as a single event.
+
+    Parameters:
+    - question (Question): The question to ask.
+
+    Returns:
+    - StreamingResponse: The stream of events.
+    """
+    started = time.monotonic()
+    generation = get_collection_generation("Article")
+    answer, vector = await answer_cache.lookup(question.question)
+    if answer is not None:
+        async def cached_events() -> AsyncIterator[str]:
+            time_to_first_token.observe(time.monotonic() - started)
+            yield sse_event({"text": answer})
+            yield sse_event({}, "done")
+        return StreamingResponse(cached_events(), media_type="text/event-stream", headers=SSE_HEADERS)
+
+    response = await async_client.do(
         client.query
-        .get("Article", ["tags", "title", "text"])
-        .with_generate(single_prompt=prompt)
+        .get("Article", ["title", "text"])
         .with_limit(1)
-    ).do()
-    result = response["data"]["Get"]["Article"][0]["_additional"]["generate"]["singleResult"]
-    formatted_result = format_zakat_response(result)
-    return formatted_result
+    )
+    if len(response["data"]["Get"]["Article"]) == 0:
+        raise HTTPException(status_code=404, detail="No articles to answer from")
+    article = response["data"]["Get"]["Article"][0]
+    prompt = (question.question + "? Use the title and text from the articles: {title} and {text}") \
+        .replace("{title}", article["title"] or "").replace("{text}", article["text"] or "")
+
+    async def events() -> AsyncIterator[str]:
+        formatter = ZakatResponseFormatter()
+        parts = []
+        try:
+            async for token in stream_completion(prompt):
+                text = formatter.feed(token)
+                if text:
+                    if not parts:
+                        time_to_first_token.observe(time.monotonic() - started)
+                    parts.append(text)
+                    yield sse_event({"text": text})
+        except HTTPException as e:
+            yield sse_event({"detail": e.detail}, "error")
+            return
+        text = formatter.flush()
+        if text:
+            parts.append(text)
+            yield sse_event({"text": text})
+        answer_cache.store(question.question, "".join(parts), vector, generation)
+        yield sse_event({}, "done")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 @router.post("/send-request", response_model=UserRequestGet, summary="Send a user request")
 async def send_request(request: UserRequestAdd):
@@ -199,7 +337,7 @@ async def send_request(request: UserRequestAdd):
     request_object = {
         "requestText": request.requestText
     }
-    result = client.data_object.create(
+    result = await async_client.create(
         data_object=request_object,
         class_name="Request"
     )
@@ -225,3 +363,64 @@ def format_zakat_response(response: str) -> str:
         return formatted_text
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error formatting response: {str(e)}")
+
+
+class ZakatResponseFormatter:
+    """
+    Incremental version of `format_zakat_response` for an answer that arrives piece by piece.
+
+    The lines are stripped and the empty ones dropped, like in `format_zakat_response`. Real line
+    breaks separate lines too, since the streamed answer contains them unescaped. Text is released
+    as soon as what follows cannot change it: only trailing whitespace and a trailing backslash
+    are held back.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._line_started = False
+        self._any_line = False
+
+    def _release(self, text: str, end_of_line: bool) -> str:
+        if not self._line_started:
+            text = text.lstrip()
+        if end_of_line:
+            text = text.rstrip()
+        released = ""
+        if text:
+            if not self._line_started:
+                released = "\n" if self._any_line else ""
+                self._line_started = self._any_line = True
+            released += text
+        if end_of_line:
+            self._line_started = False
+        return released
+
+    def feed(self, text: str) -> str:
+        """
+        Add the next piece of the answer and return the formatted text that can be sent.
+        """
+        lines = re.split(r"\\n|\n", self._pending + text)
+        released = [self._release(line, True) for line in lines[:-1]]
+        current = lines[-1]
+        releasable = current.rstrip()
+        if releasable.endswith("\\"):
+            releasable = releasable[:-1].rstrip()
+        released.append(self._release(releasable, False))
+        self._pending = current[len(releasable):]
+        return "".join(released)
+
+    def flush(self) -> str:
+        """
+        Return the formatted text left once the answer is complete.
+        """
+        released = self._release(self._pending, True)
+        self._pending = ""
+        return released
+
+
+def sse_event(data: Dict, event: Optional[str] = None) -> str:
+    """
+    Encode a Server-Sent Event with a JSON payload.
+    """
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data)}\n\n"
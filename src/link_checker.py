@@ -0,0 +1,142 @@
+"""
+Asynchronous check that the links submitted by the editors are accessible.
+
+A link is requested with HEAD and, if the site does not answer HEAD properly, with a GET whose
+body is never downloaded. Both have strict timeouts and redirects are followed. The results are
+cached, accessible links for LINK_CACHE_TTL and failures for the shorter LINK_FAILURE_CACHE_TTL,
+and concurrent checks of the same link share one request.
+"""
+from typing import Dict, Iterable, List, Optional
+from fastapi import HTTPException
+from dotenv import load_dotenv
+import asyncio
+import httpx
+import os
+
+from src.cache import TTLCache
+from src.metrics import track_upstream
+
+load_dotenv('.env')
+
+LINK_CHECK_TIMEOUT: float = float(os.getenv("LINK_CHECK_TIMEOUT", "5"))
+LINK_CHECK_CONCURRENCY: int = int(os.getenv("LINK_CHECK_CONCURRENCY", "10"))
+LINK_CACHE_SIZE: int = int(os.getenv("LINK_CACHE_SIZE", "4096"))
+LINK_CACHE_TTL: float = float(os.getenv("LINK_CACHE_TTL", "3600"))
+LINK_FAILURE_CACHE_TTL: float = float(os.getenv("LINK_FAILURE_CACHE_TTL", "60"))
+
+NOT_ACCESSIBLE = "The site on the link is not accessible"
+INVALID_LINK = "The provided link is invalid."
+
+_http_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(LINK_CHECK_TIMEOUT, connect=min(LINK_CHECK_TIMEOUT, 3)),
+    follow_redirects=True,
+    headers={"User-Agent": "ZakatBarakat-LinkChecker/1.0"}
+)
+
+
+class LinkChecker:
+    """
+    Checks links with at most `concurrency` requests in flight and caches the results.
+    """
+
+    def __init__(self, concurrency: int, maxsize: int, ttl: float, failure_ttl: float):
+        self._valid = TTLCache("valid_links", maxsize=maxsize, ttl=ttl)
+        self._invalid = TTLCache("invalid_links", maxsize=maxsize, ttl=failure_ttl)
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def _request(self, url: str) -> Optional[str]:
+        async with self._semaphore:
+            try:
+                with track_upstream("link_validation"):
+                    response = await _http_client.head(url)
+                    if response.status_code != 200:
+                        # Many sites reject or mishandle HEAD, only the headers of the GET are read
+                        async with _http_client.stream("GET", url) as response:
+                            pass
+            except (httpx.HTTPError, httpx.InvalidURL, ValueError):
+                return INVALID_LINK
+        return None if response.status_code == 200 else NOT_ACCESSIBLE
+
+    async def check(self, url: str) -> Optional[str]:
+        """
+        Check that a link is accessible.
+
+        Parameters:
+        - url (str): The link to check.
+
+        Returns:
+        - str, optional: None if the link is accessible, otherwise the reason it is not.
+        """
+        if self._valid.get(url) is not None:
+            return None
+        error = self._invalid.peek(url)
+        if error is not None:
+            return error
+        future = self._in_flight.get(url)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[url] = future
+        try:
+            error = await self._request(url)
+            if error is None:
+                self._valid.set(url, True)
+            else:
+                self._invalid.set(url, error)
+            future.set_result(error)
+            return error
+        except BaseException as exception:
+            future.set_exception(exception)
+            # Mark the exception as retrieved if no other request was waiting for it
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[url]
+
+    async def check_many(self, urls: Iterable[str]) -> Dict[str, Optional[str]]:
+        """
+        Check several links concurrently, each distinct link once.
+
+        Parameters:
+        - urls (Iterable[str]): The links to check.
+
+        Returns:
+        - Dict[str, Optional[str]]: The reason each link is not accessible, None for accessible links.
+        """
+        distinct = list(dict.fromkeys(urls))
+        errors = await asyncio.gather(*(self.check(url) for url in distinct))
+        return dict(zip(distinct, errors))
+
+
+link_checker = LinkChecker(LINK_CHECK_CONCURRENCY, LINK_CACHE_SIZE, LINK_CACHE_TTL, LINK_FAILURE_CACHE_TTL)
+
+
+async def validate_link(url: str) -> None:
+    """
+    Validate the provided URL to ensure it is accessible.
+
+    Parameters:
+    - url (str): The URL to validate.
+
+    Raises:
+    - HTTPException: If the URL is not accessible or is invalid.
+    """
+    error = await link_checker.check(url)
+    if error is not None:
+        raise HTTPException(status_code=422, detail=error)
+
+
+async def check_links(urls: List[str]) -> List[Optional[str]]:
+    """
+    Check the links of a batch concurrently.
+
+    Parameters:
+    - urls (List[str]): The links to check.
+
+    Returns:
+    - List[Optional[str]]: The reason each link is not accessible, None for accessible links, in order.
+    """
+    errors = await link_checker.check_many(urls)
+    return [errors[url] for url in urls]
+
@@ -9,11 +9,36 @@ from src.news.news_user.router import router as router_news_user
 from src.utility.router import router as router_utility
 from src.news.news_editor.router import router as router_news_editor
 from src.news.news_editor.router_saved_news import router as router_saved_news
+from src.sync.router import router as router_sync
+from src.change_feed import prune_tombstones
+from src.embeddings import load_embedding_cache, save_embedding_cache
+from src.metrics import MetricsMiddleware, monitor_event_loop_lag, render_prometheus
+from src.etag import ETAG_HEADER
+from src.pagination import NEXT_CURSOR_HEADER
+from src.weaviate_client import schema_bootstrap
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager, suppress
+from fastapi.responses import PlainTextResponse
 from fastapi import FastAPI
+import asyncio
 
 
-app = FastAPI(title="Zakat Barakat API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_embedding_cache()
+    # The schema is checked in the background, the app serves in degraded mode until it is ready
+    bootstrap = asyncio.create_task(schema_bootstrap.run())
+    loop_monitor = asyncio.create_task(monitor_event_loop_lag())
+    tombstone_pruning = asyncio.create_task(prune_tombstones())
+    yield
+    for task in (bootstrap, loop_monitor, tombstone_pruning):
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+    save_embedding_cache()
+
+
+app = FastAPI(title="Zakat Barakat API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,7 +46,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, ETAG_HEADER],
 )
+# Added last so it is the outermost middleware and times the whole request
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> PlainTextResponse:
+    """
+    Expose the metrics of this worker in the Prometheus text format.
+    """
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
 
 
 
@@ -36,4 +72,5 @@ app.include_router(router_news_user)
 app.include_router(router_news_editor)
 app.include_router(router_saved_news)
 app.include_router(router_utility)
+app.include_router(router_sync)
 
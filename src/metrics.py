@@ -0,0 +1,266 @@
+"""
+In-process metrics, exposed in the Prometheus text format on /metrics.
+
+Latency metrics keep their count and total, and the most recent observations to compute percentiles.
+Histograms and counters are kept per label values, and gauges are read from a callback when the
+metrics are scraped, so recording an observation on the request path is a dictionary lookup and a
+few additions. The HTTP requests are recorded by `MetricsMiddleware`.
+"""
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Sequence, Tuple
+from contextlib import contextmanager
+from collections import deque
+import bisect
+import asyncio
+import math
+import time
+
+# All metrics created in the process by name, used to report them
+metrics: Dict[str, "LatencyMetric"] = {}
+# All Prometheus collectors in the order they were created
+collectors: List[Any] = []
+
+# Bucket bounds in seconds, from a cache hit to a slow generation
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = Tuple[str, ...]
+
+
+class LatencyMetric:
+    """
+    Latency observations in seconds with percentiles over the last `window` observations.
+    """
+
+    def __init__(self, name: str, window: int = 1024):
+        self.name = name
+        self.count = 0
+        self.total = 0.0
+        self._recent: Deque[float] = deque(maxlen=window)
+        metrics[name] = self
+        collectors.append(self)
+
+    def observe(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self._recent.append(seconds)
+
+    def percentile(self, percent: float) -> float:
+        if not self._recent:
+            return 0.0
+        ordered = sorted(self._recent)
+        return ordered[min(len(ordered) - 1, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p99": self.percentile(99),
+        }
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} Latency in seconds, quantiles over the last observations."
+        yield f"# TYPE {self.name} summary"
+        for quantile in (0.5, 0.99):
+            yield f'{self.name}{{quantile="{quantile}"}} {format_value(self.percentile(quantile * 100))}'
+        yield f"{self.name}_sum {format_value(self.total)}"
+        yield f"{self.name}_count {self.count}"
+
+
+class Histogram:
+    """
+    Prometheus histogram of observations in seconds, per label values.
+    """
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        # Per label values: the count of every bucket (not cumulative), the sum and the count
+        self._series: Dict[Labels, List] = {}
+        collectors.append(self)
+
+    def observe(self, seconds: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series.setdefault(labels, [[0] * (len(self.buckets) + 1), 0.0, 0])
+        series[0][bisect.bisect_left(self.buckets, seconds)] += 1
+        series[1] += seconds
+        series[2] += 1
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} histogram"
+        for labels, (counts, total, count) in list(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == math.inf else format_value(bound)
+                yield f"{self.name}_bucket{format_labels(self.labelnames + ('le',), labels + (le,))} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}"
+            yield f"{self.name}_count{format_labels(self.labelnames, labels)} {count}"
+
+
+class Counter:
+    """
+    Prometheus counter per label values.
+    """
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Labels, float] = {}
+        collectors.append(self)
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} counter"
+        for labels, value in list(self._values.items()):
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}"
+
+
+class Gauge:
+    """
+    Prometheus gauge, or counter, whose values are read from `collect` when the metrics are scraped.
+
+    `collect` returns the value per label values, or a single number when there are no labels.
+    """
+
+    def __init__(self, name: str, description: str, collect: Callable[[], Any], labelnames: Sequence[str] = (),
+                 kind: str = "gauge"):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.kind = kind
+        self._collect = collect
+        collectors.append(self)
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.description}"
+        yield f"# TYPE {self.name} {self.kind}"
+        values = self._collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in values.items():
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}"
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for value in values)
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+def render_prometheus() -> str:
+    """
+    Render every metric of the process in the Prometheus text exposition format.
+    """
+    return "\n".join(line for collector in collectors for line in collector.render()) + "\n"
+
+
+def get_metrics_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Return the count, mean and percentiles of every latency metric in the process.
+    """
+    return {name: metric.stats() for name, metric in metrics.items()}
+
+
+upstream_duration = Histogram("upstream_request_duration_seconds",
+                              "Duration of the calls to external services.", ["upstream"])
+upstream_errors = Counter("upstream_request_errors_total", "Failed calls to external services.", ["upstream"])
+
+
+@contextmanager
+def timed(histogram: Histogram, errors: Counter, *labels: str) -> Iterator[None]:
+    """
+    Record the duration of the block in `histogram`, and count it in `errors` if it raises.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        errors.inc(*labels)
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - started, *labels)
+
+
+def track_upstream(upstream: str):
+    """
+    Record the duration of a call to an external service, and its failure if it raises.
+    """
+    return timed(upstream_duration, upstream_errors, upstream)
+
+
+http_duration = Histogram("http_request_duration_seconds", "Duration of the HTTP requests by route.",
+                          ["method", "route", "status"])
+http_errors = Counter("http_request_errors_total", "HTTP requests answered with a server error, by route.",
+                      ["method", "route"])
+_http_in_flight = 0
+Gauge("http_requests_in_flight", "HTTP requests being served.", lambda: _http_in_flight)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the duration and the status of every HTTP request by route template,
+    and the number of requests in flight. Streamed responses are timed until their last byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        global _http_in_flight
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        _http_in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _http_in_flight -= 1
+            # The router stores the matched route in the scope, unmatched paths share one label
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            http_duration.observe(time.perf_counter() - started, scope["method"], route_path, str(status))
+            if status >= 500:
+                http_errors.inc(scope["method"], route_path)
+
+
+loop_lag = Histogram("event_loop_lag_seconds", "Delay of the event loop in waking up a sleeping task.",
+                     buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5))
+_last_loop_lag = 0.0
+Gauge("event_loop_lag_last_seconds", "Last measured delay of the event loop.", lambda: _last_loop_lag)
+
+
+async def monitor_event_loop_lag(interval: float = 0.5) -> None:
+    """
+    Measure how late the event loop wakes up a task sleeping for `interval` seconds, until cancelled.
+    """
+    global _last_loop_lag
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        _last_loop_lag = max(time.perf_counter() - started - interval, 0.0)
+        loop_lag.observe(_last_loop_lag)
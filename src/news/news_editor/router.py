@@ -1,12 +1,18 @@
 from io import BytesIO
 
-import requests
 from PIL import Image
-from fastapi import APIRouter, HTTPException
+from typing import List, Optional
+from fastapi import APIRouter, HTTPException, Request
 
 from src.news.models import NewsGet, NewsAdd
-from src.news.news_user.router import get_news_article
-from src.weaviate_client import client
+from src.news.news_user.router import NEWS_PROPERTIES, get_batch_with_cursor, parse_news
+from src.pagination import StreamFormat, stream_collection
+from src.cache import mark_collection_changed
+from src.change_feed import record_deletions
+from src.weaviate_client import async_client
+from src.link_checker import validate_link, check_links
+from src.bulk import BatchSizeQuery, WorkersQuery, ResumeFromQuery, IMPORT_BATCH_SIZE, IMPORT_WORKERS, \
+    MoveRequest, MoveResult, import_collection, move_object, move_objects
 
 router = APIRouter(
     prefix="/news/edit",
@@ -37,12 +43,13 @@ async def create_news_article(news_article: NewsAdd):
     if len(news_article.tags) > 5:
         raise HTTPException(status_code=422, detail="No more than 5 tags allowed.")
 
-    validate_link(news_article.source_link)
+    await validate_link(news_article.source_link)
 
-    result = client.data_object.create(
+    result = await async_client.create(
         data_object=news_article_object,
         class_name="News"
     )
+    mark_collection_changed("News")
 
     object_id = result
 
@@ -66,14 +73,16 @@ async def delete_news_article(news_article_id: str):
     Returns:
     - NewsGet: The details of the deleted news article.
     """
-    news_article_object = client.data_object.get_by_id(
+    news_article_object = await async_client.get_by_id(
         news_article_id,
         class_name="News"
     )
-    client.data_object.delete(
+    await record_deletions("News", [news_article_id])
+    await async_client.delete(
         news_article_id,
         class_name="News",
     )
+    mark_collection_changed("News")
     return NewsGet(id=news_article_id, name=news_article_object["properties"]["name"],
                    body=news_article_object["properties"]["body"],
                    source_link=news_article_object["properties"]["source_link"],
@@ -105,13 +114,14 @@ async def edit_news_article(news_article: NewsAdd, news_article_id: str):
     if len(news_article.tags) > 5:
         raise HTTPException(status_code=422, detail="No more than 5 tags allowed.")
 
-    validate_link(news_article.source_link)
+    await validate_link(news_article.source_link)
 
-    result = client.data_object.replace(
+    result = await async_client.replace(
         uuid=news_article_id,
         class_name="News",
         data_object=news_article_object
     )
+    mark_collection_changed("News")
 
     return NewsGet(
         id=news_article_id,
@@ -126,61 +136,79 @@ async def unpublish_news(news_id: str):
     """
     Unpublish a news article and move it to the saved news collection.
 
+    The news article keeps its ID. Retrying the request after a failure completes the move.
+
     Parameters:
     - news_id (str): The ID of the news article to be unpublished.
 
     Returns:
     - NewsGet: The details of the unpublished news article now saved in the saved news collection.
     """
-    # Retrieve the details of the news article by its ID
-    news_article = await get_news_article(news_id)
+    news_article = await move_object(news_id, "News", "SavedNews", NEWS_PROPERTIES)
+    return parse_news([news_article])[0]
 
-    # Create an object representation of the news article
-    news_article_object = {
-        "name": news_article.name,
-        "body": news_article.body,
-        "source_link": news_article.source_link,
-        "tags": news_article.tags
-    }
 
-    # Create the news article in the saved news collection
-    result = client.data_object.create(
-        data_object=news_article_object,
-        class_name="SavedNews"
-    )
+@router.post("/bulk-unpublish", response_model=MoveResult, summary="Unpublish news articles in bulk")
+async def bulk_unpublish_news(move: MoveRequest):
+    """
+    Unpublish several news articles at once, keeping their IDs.
 
-    # Get the ID of the newly created saved news article
-    object_id = result
+    The news articles are copied with one batch request and removed from 'News' with another.
+    News articles already in 'SavedNews' are reported as already moved, so the request can be retried.
 
-    # Delete the news article from the published news collection
-    client.data_object.delete(
-        news_id,
-        class_name="News",
-    )
+    Parameters:
+    - move (MoveRequest): The IDs of the news articles.
 
-    # Return the details of the unpublished news article
-    return NewsGet(
-        id=object_id,
-        name=news_article.name,
-        body=news_article.body,
-        source_link=news_article.source_link,
-        tags=news_article.tags
-    )
+    Returns:
+    - MoveResult: The IDs moved, already moved, not found and failed with their error.
+    """
+    result, _ = await move_objects(move.ids, "News", "SavedNews", NEWS_PROPERTIES)
+    return result
+
+
+async def validate_news_window(news: List[NewsAdd]) -> List[Optional[str]]:
+    """
+    Check the tags and the links of the news articles of an import, the links concurrently.
+    """
+    link_errors = await check_links([news_article.source_link for news_article in news])
+    return ["No more than 5 tags allowed." if len(news_article.tags) > 5 else link_error
+            for news_article, link_error in zip(news, link_errors)]
 
 
-def validate_link(url: str):
+@router.post("/import-news", summary="Import news articles in bulk")
+async def import_news(request: Request,
+                     batch_size: BatchSizeQuery = IMPORT_BATCH_SIZE,
+                     workers: WorkersQuery = IMPORT_WORKERS,
+                     resume_from: ResumeFromQuery = 0):
     """
-    Validate the provided URL to ensure it is accessible.
+    Import news articles from an NDJSON body, one news article per line as returned by the export.
+
+    The news articles are written with the batch API of the database, after their tags and links are
+    checked, the links concurrently. News articles with an `id` replace the existing news article
+    with that ID, the others get an ID derived from their content.
 
     Parameters:
-    - url (str): The URL to validate.
+    - batch_size (int, optional): The number of news articles sent in one batch request.
+    - workers (int, optional): The number of batch requests sent concurrently.
+    - resume_from (int, optional): The checkpoint of an interrupted import.
 
-    Raises:
-    - HTTPException: If the URL is not accessible or is invalid.
-    """
-    try:
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise HTTPException(status_code=422, detail="The site on the link is not accessible")
-    except requests.RequestException as e:
-        raise HTTPException(status_code=422, detail="The provided link is invalid.")
\ No newline at end of file
+    Returns:
+    - StreamingResponse: NDJSON progress lines with the checkpoint and the errors of the rejected
+      news articles, then a summary line.
+    """
+    return await import_collection(request, "News", NewsAdd, validate=validate_news_window,
+                                   batch_size=batch_size, workers=workers, resume_from=resume_from)
+
+
+@router.get("/export-news", summary="Export all news articles as NDJSON")
+async def export_news(cursor: Optional[str] = None):
+    """
+    Stream every news article as NDJSON, in the format accepted by the import.
+
+    Parameters:
+    - cursor (str, optional): The ID of the last news article received, to resume an interrupted export.
+
+    Returns:
+    - StreamingResponse: One news article per line.
+    """
+    return stream_collection("News", get_batch_with_cursor, parse_news, StreamFormat.ndjson, cursor)
@@ -1,12 +1,18 @@
 from io import BytesIO
-from typing import List, Dict
+from typing import Annotated, List, Dict, Optional
 
-import requests
 from PIL import Image
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 
 from src.news.models import NewsGet, NewsAdd
-from src.weaviate_client import client
+from src.cache import snapshot_cache, mark_collection_changed
+from src.pagination import MAX_PAGE_SIZE, StreamFormat, get_page, iterate_batches, stream_collection
+from src.weaviate_client import client, async_client
+from src.link_checker import validate_link
+from src.news.news_editor.router import validate_news_window
+from src.news.news_user.router import NEWS_PROPERTIES
+from src.bulk import BatchSizeQuery, WorkersQuery, ResumeFromQuery, IMPORT_BATCH_SIZE, IMPORT_WORKERS, \
+    MoveRequest, MoveResult, import_collection, move_object, move_objects
 
 # Create a router for the API endpoints related to saved news articles
 router = APIRouter(
@@ -14,7 +20,7 @@ router = APIRouter(
     tags=["News Editor Saved News"]
 )
 
-def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
+async def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
     """
     Retrieve a batch of objects from the collection with optional cursor for pagination.
 
@@ -35,9 +41,9 @@ def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = N
         .with_limit(batch_size)
     )
     if cursor is not None:
-        result = query.with_after(cursor).do()
+        result = await async_client.do(query.with_after(cursor))
     else:
-        result = query.do()
+        result = await async_client.do(query)
     return result["data"]["Get"][collection_name]
 
 def parse_news(data: List[Dict]) -> List[NewsGet]:
@@ -63,24 +69,45 @@ def parse_news(data: List[Dict]) -> List[NewsGet]:
     return news
 
 @router.get("/get-saved-news", response_model=List[NewsGet], summary="Get all saved news articles")
-async def get_news():
+async def get_news(response: Response,
+                  limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+                  cursor: Optional[str] = None,
+                  stream: Optional[StreamFormat] = None):
     """
     Retrieve a list of all news articles.
 
-    This endpoint fetches all the news articles in the collection, handling pagination internally.
+    The news articles are served from an in-memory snapshot of the collection that is refreshed after edits.
+
+    Passing `limit` and/or `cursor` returns a single page read directly from the database instead;
+    the cursor of the next page is returned in the X-Next-Cursor header. Passing `stream` streams
+    the whole collection page by page as NDJSON or as a JSON array.
+
+    Parameters:
+    - limit (int, optional): The size of the page.
+    - cursor (str, optional): The ID of the last news article of the previous page.
+    - stream (StreamFormat, optional): Stream the collection as 'ndjson' or 'json'.
 
     Returns:
     - List[NewsGet]: A list of all news articles.
     """
-    cursor = None
-    news_unformatted = []
-    while True:
-        next_batch = get_batch_with_cursor("SavedNews", 100, cursor)
-        if len(next_batch) == 0:
-            break
-        news_unformatted.extend(next_batch)
-        cursor = next_batch[-1]["_additional"]["id"]
+    if stream is not None:
+        return stream_collection("SavedNews", get_batch_with_cursor, parse_news, stream, cursor)
+    if limit is not None or cursor is not None:
+        return await get_page("SavedNews", get_batch_with_cursor, parse_news, response, limit, cursor)
+    snapshot = await snapshot_cache.get_snapshot("SavedNews", load_saved_news)
+    return snapshot.response()
+
+
+async def load_saved_news() -> List[NewsGet]:
+    """
+    Read every object of the 'SavedNews' collection, handling pagination internally.
 
+    Returns:
+    - List[NewsGet]: The parsed news of the collection.
+    """
+    news_unformatted = []
+    async for batch in iterate_batches("SavedNews", get_batch_with_cursor):
+        news_unformatted.extend(batch)
     news_output = parse_news(news_unformatted)
     return news_output
 
@@ -95,7 +122,7 @@ async def get_news_article(news_id: str):
     Returns:
     - NewsGet: The details of the specified news article.
     """
-    news_article_object = client.data_object.get_by_id(
+    news_article_object = await async_client.get_by_id(
         news_id,
         class_name="SavedNews"
     )
@@ -128,12 +155,13 @@ async def create_saved_news_article(news_article: NewsAdd):
     if len(news_article.tags) > 5:
         raise HTTPException(status_code=422, detail="No more than 5 tags allowed.")
 
-    validate_link(news_article.source_link)
+    await validate_link(news_article.source_link)
 
-    result = client.data_object.create(
+    result = await async_client.create(
         data_object=news_article_object,
         class_name="SavedNews"
     )
+    mark_collection_changed("SavedNews")
 
     object_id = result
 
@@ -156,14 +184,15 @@ async def delete_news_article(news_article_id: str):
     Returns:
     - NewsGet: The details of the deleted news article.
     """
-    news_article_object = client.data_object.get_by_id(
+    news_article_object = await async_client.get_by_id(
         news_article_id,
         class_name="SavedNews"
     )
-    client.data_object.delete(
+    await async_client.delete(
         news_article_id,
         class_name="SavedNews",
     )
+    mark_collection_changed("SavedNews")
     return NewsGet(id=news_article_id, name=news_article_object["properties"]["name"],
                    body=news_article_object["properties"]["body"],
                    source_link=news_article_object["properties"]["source_link"],
@@ -194,13 +223,14 @@ async def edit_saved_news_article(news_article: NewsAdd, news_article_id: str):
     if len(news_article.tags) > 5:
         raise HTTPException(status_code=422, detail="No more than 5 tags allowed.")
 
-    validate_link(news_article.source_link)
+    await validate_link(news_article.source_link)
 
-    result = client.data_object.replace(
+    result = await async_client.replace(
         uuid=news_article_id,
         class_name="SavedNews",
         data_object=news_article_object
     )
+    mark_collection_changed("SavedNews")
 
     return NewsGet(
         id=news_article_id,
@@ -215,54 +245,70 @@ async def publish_news(saved_news_id: str):
     """
     Publish a saved news article by moving it from 'SavedNews' to 'News'.
 
+    The news article keeps its ID. Retrying the request after a failure completes the move.
+
     Parameters:
     - saved_news_id (str): The ID of the saved news article to be published.
 
     Returns:
     - NewsGet: The published news article's details.
     """
-    news_article = await get_news_article(saved_news_id)
+    news_article = await move_object(saved_news_id, "SavedNews", "News", NEWS_PROPERTIES)
+    return parse_news([news_article])[0]
 
-    news_article_object = {
-        "name": news_article.name,
-        "body": news_article.body,
-        "source_link": news_article.source_link,
-        "tags": news_article.tags
-    }
 
-    result = client.data_object.create(
-        data_object=news_article_object,
-        class_name="News"
-    )
+@router.post("/bulk-publish", response_model=MoveResult, summary="Publish saved news articles in bulk")
+async def bulk_publish_news(move: MoveRequest):
+    """
+    Publish several news articles at once, keeping their IDs.
 
-    object_id = result
+    The news articles are copied with one batch request and removed from 'SavedNews' with another.
+    News articles already in 'News' are reported as already moved, so the request can be retried.
 
-    client.data_object.delete(
-        saved_news_id,
-        class_name="SavedNews",
-    )
+    Parameters:
+    - move (MoveRequest): The IDs of the news articles.
+
+    Returns:
+    - MoveResult: The IDs moved, already moved, not found and failed with their error.
+    """
+    result, _ = await move_objects(move.ids, "SavedNews", "News", NEWS_PROPERTIES)
+    return result
 
-    return NewsGet(
-        id=object_id,
-        name=news_article.name,
-        body=news_article.body,
-        source_link=news_article.source_link,
-        tags=news_article.tags
-    )
 
-def validate_link(url: str):
+@router.post("/import-saved-news", summary="Import saved news articles in bulk")
+async def import_saved_news(request: Request,
+                           batch_size: BatchSizeQuery = IMPORT_BATCH_SIZE,
+                           workers: WorkersQuery = IMPORT_WORKERS,
+                           resume_from: ResumeFromQuery = 0):
     """
-    Validate the provided URL to ensure it is accessible.
+    Import news articles from an NDJSON body, one news article per line as returned by the export.
+
+    The news articles are written with the batch API of the database, after their tags and links are
+    checked, the links concurrently. News articles with an `id` replace the existing news article
+    with that ID, the others get an ID derived from their content.
 
     Parameters:
-    - url (str): The URL to validate.
+    - batch_size (int, optional): The number of news articles sent in one batch request.
+    - workers (int, optional): The number of batch requests sent concurrently.
+    - resume_from (int, optional): The checkpoint of an interrupted import.
 
-    Raises:
-    - HTTPException: If the URL is not accessible or is invalid.
+    Returns:
+    - StreamingResponse: NDJSON progress lines with the checkpoint and the errors of the rejected
+      news articles, then a summary line.
+    """
+    return await import_collection(request, "SavedNews", NewsAdd, validate=validate_news_window,
+                                   batch_size=batch_size, workers=workers, resume_from=resume_from)
+
+
+@router.get("/export-saved-news", summary="Export all saved news articles as NDJSON")
+async def export_saved_news(cursor: Optional[str] = None):
+    """
+    Stream every news article as NDJSON, in the format accepted by the import.
+
+    Parameters:
+    - cursor (str, optional): The ID of the last news article received, to resume an interrupted export.
+
+    Returns:
+    - StreamingResponse: One news article per line.
     """
-    try:
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise HTTPException(status_code=422, detail="The site on the link is not accessible")
-    except requests.RequestException as e:
-        raise HTTPException(status_code=422, detail="The provided link is invalid.")
+    return stream_collection("SavedNews", get_batch_with_cursor, parse_news, StreamFormat.ndjson, cursor)
@@ -1,7 +1,12 @@
-from typing import List, Dict
-from fastapi import APIRouter
+from typing import Annotated, List, Dict, Optional, Sequence
+from fastapi import APIRouter, Query, Response
 from src.news.models import NewsGet, SearchInput
-from src.weaviate_client import client
+from src.cache import snapshot_cache, search_cache
+from src.etag import ETAG_HEADER, IfNoneMatchHeader, etag_headers, etag_matches, make_etag, not_modified, object_etag
+from src.pagination import MAX_PAGE_SIZE, StreamFormat, get_page, iterate_batches, page_headers, stream_collection
+from src.projection import FIELDS_DESCRIPTION, parse_fields, project_models, project_objects, projected_response
+from src.weaviate_client import client, async_client
+import functools
 
 router = APIRouter(
     prefix="/news",
@@ -9,7 +14,11 @@ router = APIRouter(
 )
 
 
-def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
+NEWS_PROPERTIES = ("name", "body", "source_link", "tags")
+
+
+async def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None,
+                                properties: Sequence[str] = NEWS_PROPERTIES) -> List[Dict]:
     """
     Retrieve a batch of objects from the collection with optional cursor for pagination.
 
@@ -17,6 +26,7 @@ def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = N
     - collection_name (str): The name of the collection to query.
     - batch_size (int): The number of items to retrieve in each batch.
     - cursor (str, optional): The cursor for pagination. If None, fetch from the start.
+    - properties (Sequence[str], optional): The properties to read. Defaults to all of them.
 
     Returns:
     - List[Dict]: A list of objects from the collection.
@@ -24,15 +34,15 @@ def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = N
     query = (
         client.query.get(
             collection_name,
-            ["name", "body", "source_link", "tags"]
+            list(properties)
         )
         .with_additional(["id"])
         .with_limit(batch_size)
     )
     if cursor is not None:
-        result = query.with_after(cursor).do()
+        result = await async_client.do(query.with_after(cursor))
     else:
-        result = query.do()
+        result = await async_client.do(query)
     return result["data"]["Get"][collection_name]
 
 
@@ -60,43 +70,89 @@ def parse_news(data: List[Dict]) -> List[NewsGet]:
 
 
 @router.get("/get-news", response_model=List[NewsGet], summary="Get all news articles")
-async def get_news():
+async def get_news(response: Response,
+                  limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+                  cursor: Optional[str] = None,
+                  stream: Optional[StreamFormat] = None,
+                  fields: Annotated[Optional[str], Query(description=FIELDS_DESCRIPTION)] = None,
+                  if_none_match: IfNoneMatchHeader = None):
     """
     Retrieve a list of all news articles.
 
-    This endpoint fetches all the news articles in the collection, handling pagination internally.
+    The news articles are served from an in-memory snapshot of the collection that is refreshed after edits.
+    The snapshot is sent with an ETag, and a request whose If-None-Match matches it gets a 304.
+
+    Passing `limit` and/or `cursor` returns a single page read directly from the database instead;
+    the cursor of the next page is returned in the X-Next-Cursor header. Passing `stream` streams
+    the whole collection page by page as NDJSON or as a JSON array. Passing `fields` returns only
+    the ID and the requested properties of every news article.
+
+    Parameters:
+    - limit (int, optional): The size of the page.
+    - cursor (str, optional): The ID of the last news article of the previous page.
+    - stream (StreamFormat, optional): Stream the collection as 'ndjson' or 'json'.
+    - fields (str, optional): The comma-separated properties to return.
+    - if_none_match (str, optional): The ETags of the snapshots the client already has.
 
     Returns:
     - List[NewsGet]: A list of all news articles.
     """
-    cursor = None
-    news_unformatted = []
-    while True:
-        next_batch = get_batch_with_cursor("News", 100, cursor)
-        if len(next_batch) == 0:
-            break
-        news_unformatted.extend(next_batch)
-        cursor = next_batch[-1]["_additional"]["id"]
+    projection = parse_fields(fields, NewsGet)
+    fetch_batch, parse = get_batch_with_cursor, parse_news
+    if projection is not None:
+        fetch_batch = functools.partial(get_batch_with_cursor, properties=projection)
+        parse = functools.partial(project_objects, fields=projection)
+    if stream is not None:
+        return stream_collection("News", fetch_batch, parse, stream, cursor)
+    if limit is not None or cursor is not None:
+        news = await get_page("News", fetch_batch, parse, response, limit, cursor)
+        return news if projection is None else projected_response(news, page_headers(response))
+    snapshot = await snapshot_cache.get_snapshot("News", load_news)
+    etag = snapshot.etag if projection is None else make_etag(snapshot.etag, *projection)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    if projection is not None:
+        return projected_response(project_models(snapshot.objects, projection), etag_headers(etag))
+    return snapshot.response(etag_headers(etag))
+
+
+async def load_news() -> List[NewsGet]:
+    """
+    Read every object of the 'News' collection, handling pagination internally.
 
+    Returns:
+    - List[NewsGet]: The parsed news of the collection.
+    """
+    news_unformatted = []
+    async for batch in iterate_batches("News", get_batch_with_cursor):
+        news_unformatted.extend(batch)
     news_output = parse_news(news_unformatted)
     return news_output
 
 
 @router.get("/get-news/{news_id}", response_model=NewsGet, summary="Get a specific news article by ID")
-async def get_news_article(news_id: str):
+async def get_news_article(news_id: str, response: Response, if_none_match: IfNoneMatchHeader = None):
     """
     Retrieve details of a specific news article by its ID.
 
+    The news article is sent with an ETag of its stored properties, and a request whose
+    If-None-Match matches it gets a 304.
+
     Parameters:
     - news_id (str): The ID of the news article to retrieve.
+    - if_none_match (str, optional): The ETags of the versions the client already has.
 
     Returns:
     - NewsGet: The details of the specified news article.
     """
-    news_article_object = client.data_object.get_by_id(
+    news_article_object = await async_client.get_by_id(
         news_id,
         class_name="News"
     )
+    etag = object_etag(news_article_object)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers[ETAG_HEADER] = etag
     return NewsGet(id=news_article_object["id"], name=news_article_object["properties"]["name"],
                    body=news_article_object["properties"]["body"],
                    source_link=news_article_object["properties"]["source_link"],
@@ -104,27 +160,39 @@ async def get_news_article(news_id: str):
 
 
 @router.post("/search-news/", response_model=List[NewsGet], summary="Search for news articles")
-async def search_news(text: SearchInput):
+async def search_news(text: SearchInput,
+                      fields: Annotated[Optional[str], Query(description=FIELDS_DESCRIPTION)] = None):
+    projection = parse_fields(fields, NewsGet)
     if text.searchString == "":
-        return await get_news()
-    response = (
-        client.query
-        .get("News", ["name", "body","source_link", "tags"])
-        .with_bm25(
-            query=text.searchString
+        snapshot = await snapshot_cache.get_snapshot("News", load_news)
+        if projection is not None:
+            return projected_response(project_models(snapshot.objects, projection))
+        return snapshot.response()
+
+    async def run_search() -> List:
+        response = await async_client.do(
+            client.query
+            .get("News", list(projection or NEWS_PROPERTIES))
+            .with_bm25(
+                query=text.searchString
+            )
+            .with_limit(text.limitOfNews)
+            .with_additional("id"),
+            operation="bm25"
         )
-        .with_limit(text.limitOfNews)
-        .with_additional("id")
-        .do()
-    )
-
-    news_articles = []
-    for i in range(len(response["data"]["Get"]["News"])):
-        news_articles.append(NewsGet(
-            id=response["data"]["Get"]["News"][i]["_additional"]["id"],
-            name=response["data"]["Get"]["News"][i]["name"],
-            body=response["data"]["Get"]["News"][i]["body"],
-            source_link=response["data"]["Get"]["News"][i]["source_link"],
-            tags=response["data"]["Get"]["News"][i]["tags"]
-        ))
-    return news_articles
+        if projection is not None:
+            return project_objects(response["data"]["Get"]["News"], projection)
+
+        news_articles = []
+        for i in range(len(response["data"]["Get"]["News"])):
+            news_articles.append(NewsGet(
+                id=response["data"]["Get"]["News"][i]["_additional"]["id"],
+                name=response["data"]["Get"]["News"][i]["name"],
+                body=response["data"]["Get"]["News"][i]["body"],
+                source_link=response["data"]["Get"]["News"][i]["source_link"],
+                tags=response["data"]["Get"]["News"][i]["tags"]
+            ))
+        return news_articles
+
+    results = await search_cache.get("News", text.searchString, text.limitOfNews, projection, run_search)
+    return results if projection is None else projected_response(results)
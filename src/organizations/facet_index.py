@@ -0,0 +1,177 @@
+"""
+In-memory index of the categories and countries of the published organizations.
+
+The index counts the organizations per category and per country, and maps every category and
+country to the IDs of its organizations, so the organization search is answered without a query.
+It is built with a single scan of the 'Organization' collection and then kept up to date by the
+organization editor endpoints. It is rebuilt after FACET_INDEX_TTL seconds so that changes made
+by other workers are picked up.
+"""
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from collections import Counter
+from dotenv import load_dotenv
+import asyncio
+import time
+import os
+
+from src.pagination import iterate_batches
+from src.weaviate_client import client, async_client
+
+load_dotenv('.env')
+
+FACET_INDEX_TTL: float = float(os.getenv("FACET_INDEX_TTL", "300"))
+
+
+async def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
+    """
+    Retrieve a batch of categories and countries from the collection with optional cursor for pagination.
+
+    Parameters:
+    - collection_name (str): The name of the collection to query.
+    - batch_size (int): The number of items to retrieve in each batch.
+    - cursor (str, optional): The cursor for pagination. If None, fetch from the start.
+
+    Returns:
+    - List[Dict]: A list of objects from the collection.
+    """
+    query = (
+        client.query.get(
+            collection_name,
+            ["categories", "countries"]
+        )
+        .with_additional(["id"])
+        .with_limit(batch_size)
+    )
+    if cursor is not None:
+        result = await async_client.do(query.with_after(cursor))
+    else:
+        result = await async_client.do(query)
+    return result["data"]["Get"][collection_name]
+
+
+def _invert(organizations: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]], facet: int) -> Dict[str, Set[str]]:
+    members: Dict[str, Set[str]] = {}
+    for organization_id, entry in organizations.items():
+        for value in entry[facet]:
+            members.setdefault(value, set()).add(organization_id)
+    return members
+
+
+def _count_matches(members: Dict[str, Set[str]], values: Iterable[str]) -> Counter:
+    matches: Counter = Counter()
+    for value in set(values):
+        matches.update(members.get(value, ()))
+    return matches
+
+
+class FacetIndex:
+    """
+    Counts of organizations per category and per country, and the organizations of each of them.
+    """
+
+    def __init__(self, collection_name: str, ttl: float):
+        self.collection_name = collection_name
+        self.ttl = ttl
+        self.categories: Counter = Counter()
+        self.countries: Counter = Counter()
+        self._organizations: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {}
+        self._category_members: Dict[str, Set[str]] = {}
+        self._country_members: Dict[str, Set[str]] = {}
+        self._built_at: Optional[float] = None
+        self._changed_during_build = False
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return self._built_at is not None and time.monotonic() - self._built_at <= self.ttl
+
+    async def ensure_built(self) -> None:
+        """
+        Build the index with one scan of the collection if it is missing or expired.
+        """
+        if self._is_fresh():
+            return
+        async with self._lock:
+            if self._is_fresh():
+                return
+            self._changed_during_build = False
+            organizations = {}
+            async for batch in iterate_batches(self.collection_name, get_batch_with_cursor):
+                for item in batch:
+                    organizations[item["_additional"]["id"]] = (
+                        tuple(item["categories"] or ()),
+                        tuple(item["countries"] or ())
+                    )
+            self._organizations = organizations
+            self.categories = Counter(category for categories, _ in organizations.values() for category in categories)
+            self.countries = Counter(country for _, countries in organizations.values() for country in countries)
+            self._category_members = _invert(organizations, 0)
+            self._country_members = _invert(organizations, 1)
+            # A write that happened during the scan may be missing from it, so scan again next time
+            self._built_at = None if self._changed_during_build else time.monotonic()
+
+    def add(self, organization_id: str, categories: Iterable[str], countries: Iterable[str]) -> None:
+        """
+        Add an organization to the index, replacing its previous entry if any.
+        """
+        self.remove(organization_id)
+        entry = (tuple(categories), tuple(countries))
+        self._organizations[organization_id] = entry
+        self.categories.update(entry[0])
+        self.countries.update(entry[1])
+        for members, values in ((self._category_members, entry[0]), (self._country_members, entry[1])):
+            for value in values:
+                members.setdefault(value, set()).add(organization_id)
+
+    def remove(self, organization_id: str) -> None:
+        """
+        Remove an organization from the index.
+        """
+        self._changed_during_build = True
+        entry = self._organizations.pop(organization_id, None)
+        if entry is None:
+            return
+        self.categories.subtract(entry[0])
+        self.countries.subtract(entry[1])
+        # Drop facets that are not used by any organization anymore
+        for counter, values in ((self.categories, entry[0]), (self.countries, entry[1])):
+            for value in values:
+                if value in counter and counter[value] <= 0:
+                    del counter[value]
+        for members, values in ((self._category_members, entry[0]), (self._country_members, entry[1])):
+            for value in values:
+                organization_ids = members.get(value)
+                if organization_ids is not None:
+                    organization_ids.discard(organization_id)
+                    if not organization_ids:
+                        del members[value]
+
+    def rank(self, categories: Iterable[str], countries: Iterable[str]) -> List[Tuple[int, str]]:
+        """
+        Find the organizations in any of the categories and in any of the countries, the organizations
+        matching more of them first.
+
+        Like the filter the search used to send to Weaviate, an organization must match at least one
+        of the categories if categories are given, and at least one of the countries if countries are
+        given.
+
+        Parameters:
+        - categories (Iterable[str]): The requested categories, may be empty.
+        - countries (Iterable[str]): The requested countries, may be empty.
+
+        Returns:
+        - List[Tuple[int, str]]: The number of categories and countries matched and the ID of every
+          organization found, by decreasing number of matches, then by ID.
+        """
+        categories, countries = list(categories), list(countries)
+        category_matches = _count_matches(self._category_members, categories)
+        country_matches = _count_matches(self._country_members, countries)
+        if categories and countries:
+            organization_ids = category_matches.keys() & country_matches.keys()
+        else:
+            organization_ids = category_matches.keys() | country_matches.keys()
+        ranked = sorted((-(category_matches[organization_id] + country_matches[organization_id]), organization_id)
+                        for organization_id in organization_ids)
+        return [(-matches, organization_id) for matches, organization_id in ranked]
+
+
+facet_index = FacetIndex("Organization", FACET_INDEX_TTL)
@@ -1,16 +1,27 @@
-from typing import List, Dict
-from fastapi import APIRouter, HTTPException
+from typing import Annotated, List, Dict, Optional, Sequence, Tuple
+from fastapi import APIRouter, HTTPException, Query, Response
 from pydantic import validator
 
 from src.organizations.models import OrganizationGet, OrganizationSearch, SearchInput
-from src.weaviate_client import client
+from src.organizations.facet_index import facet_index
+from src.cache import snapshot_cache, search_cache
+from src.etag import ETAG_HEADER, IfNoneMatchHeader, etag_headers, etag_matches, make_etag, not_modified, object_etag
+from src.pagination import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, StreamFormat, get_page, iterate_batches, page_headers, \
+    stream_collection
+from src.projection import FIELDS_DESCRIPTION, parse_fields, project_models, project_objects, projected_response
+from src.weaviate_client import client, async_client
+import functools
+import bisect
 
 router = APIRouter(
     prefix="/organization",
     tags=["Organizations"]
 )
 
-def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
+ORGANIZATION_PROPERTIES = ("name", "link", "description", "categories", "countries")
+
+async def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None,
+                                properties: Sequence[str] = ORGANIZATION_PROPERTIES) -> List[Dict]:
     """
     Retrieve a batch of objects from the collection with optional cursor for pagination.
 
@@ -18,6 +29,7 @@ def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = N
     - collection_name (str): The name of the collection to query.
     - batch_size (int): The number of items to retrieve in each batch.
     - cursor (str, optional): The cursor for pagination. If None, fetch from the start.
+    - properties (Sequence[str], optional): The properties to read. Defaults to all of them.
 
     Returns:
     - List[Dict]: A list of objects from the collection.
@@ -25,15 +37,15 @@ def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = N
     query = (
         client.query.get(
             collection_name,
-            ["name", "link", "description", "categories", "countries"]
+            list(properties)
         )
         .with_additional(["id"])
         .with_limit(batch_size)
     )
     if cursor is not None:
-        result = query.with_after(cursor).do()
+        result = await async_client.do(query.with_after(cursor))
     else:
-        result = query.do()
+        result = await async_client.do(query)
     return result["data"]["Get"][collection_name]
 
 def parse_organizations(data: List[Dict]) -> List[OrganizationGet]:
@@ -60,130 +72,199 @@ def parse_organizations(data: List[Dict]) -> List[OrganizationGet]:
     return organizations
 
 @router.get("/get-organizations", response_model=List[OrganizationGet], summary="Get all organizations")
-async def get_organizations():
+async def get_organizations(response: Response,
+                           limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+                           cursor: Optional[str] = None,
+                           stream: Optional[StreamFormat] = None,
+                           fields: Annotated[Optional[str], Query(description=FIELDS_DESCRIPTION)] = None,
+                           if_none_match: IfNoneMatchHeader = None):
     """
     Retrieve a list of all organizations.
 
-    This endpoint fetches all the organizations in the collection, handling pagination internally.
+    The organizations are served from an in-memory snapshot of the collection that is refreshed after edits.
+    The snapshot is sent with an ETag, and a request whose If-None-Match matches it gets a 304.
+
+    Passing `limit` and/or `cursor` returns a single page read directly from the database instead;
+    the cursor of the next page is returned in the X-Next-Cursor header. Passing `stream` streams
+    the whole collection page by page as NDJSON or as a JSON array. Passing `fields` returns only
+    the ID and the requested properties of every organization.
+
+    Parameters:
+    - limit (int, optional): The size of the page.
+    - cursor (str, optional): The ID of the last organization of the previous page.
+    - stream (StreamFormat, optional): Stream the collection as 'ndjson' or 'json'.
+    - fields (str, optional): The comma-separated properties to return.
+    - if_none_match (str, optional): The ETags of the snapshots the client already has.
 
     Returns:
     - List[OrganizationGet]: A list of all organizations.
     """
-    cursor = None
-    organizations_unformatted = []
-    while True:
-        next_batch = get_batch_with_cursor("Organization", 100, cursor)
-        if len(next_batch) == 0:
-            break
-        organizations_unformatted.extend(next_batch)
-        cursor = next_batch[-1]["_additional"]["id"]
+    projection = parse_fields(fields, OrganizationGet)
+    fetch_batch, parse = get_batch_with_cursor, parse_organizations
+    if projection is not None:
+        fetch_batch = functools.partial(get_batch_with_cursor, properties=projection)
+        parse = functools.partial(project_objects, fields=projection)
+    if stream is not None:
+        return stream_collection("Organization", fetch_batch, parse, stream, cursor)
+    if limit is not None or cursor is not None:
+        organizations = await get_page("Organization", fetch_batch, parse, response, limit, cursor)
+        return organizations if projection is None else projected_response(organizations, page_headers(response))
+    snapshot = await snapshot_cache.get_snapshot("Organization", load_organizations)
+    etag = snapshot.etag if projection is None else make_etag(snapshot.etag, *projection)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    if projection is not None:
+        return projected_response(project_models(snapshot.objects, projection), etag_headers(etag))
+    return snapshot.response(etag_headers(etag))
+
+
+async def load_organizations() -> List[OrganizationGet]:
+    """
+    Read every object of the 'Organization' collection, handling pagination internally.
 
+    Returns:
+    - List[OrganizationGet]: The parsed organizations of the collection.
+    """
+    organizations_unformatted = []
+    async for batch in iterate_batches("Organization", get_batch_with_cursor):
+        organizations_unformatted.extend(batch)
     organizations_output = parse_organizations(organizations_unformatted)
     return organizations_output
 
 @router.get("/get-organization/{organization_id}", response_model=OrganizationGet, summary="Get a specific organization by ID")
-async def get_organization(organization_id: str):
+async def get_organization(organization_id: str, response: Response, if_none_match: IfNoneMatchHeader = None):
     """
     Retrieve details of a specific organization by its ID.
 
+    The organization is sent with an ETag of its stored properties, and a request whose
+    If-None-Match matches it gets a 304.
+
     Parameters:
     - organization_id (str): The ID of the organization to retrieve.
+    - if_none_match (str, optional): The ETags of the versions the client already has.
 
     Returns:
     - OrganizationGet: The details of the specified organization.
     """
-    organization_object = client.data_object.get_by_id(
+    organization_object = await async_client.get_by_id(
         organization_id,
         class_name="Organization"
     )
+    etag = object_etag(organization_object)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers[ETAG_HEADER] = etag
     return OrganizationGet(id=organization_object["id"], name=organization_object["properties"]["name"],
                            link=organization_object["properties"]["link"],
                            description=organization_object["properties"]["description"],
                            categories=organization_object["properties"]["categories"],
                            countries=organization_object["properties"]["countries"])
 
+def parse_search_cursor(cursor: str) -> Tuple[int, str]:
+    """
+    Parse the cursor of a page of the organization search, '<matches>.<organization ID>'.
+
+    Raises:
+    - HTTPException: If the cursor is malformed.
+    """
+    matches, _, organization_id = cursor.partition(".")
+    try:
+        return int(matches), organization_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
 @router.post("/search-organization/", response_model=List[OrganizationGet], summary="Search for organizations")
-async def get_organization_search(orgSearch: OrganizationSearch):
+async def get_organization_search(orgSearch: OrganizationSearch,
+                                  response: Response,
+                                  limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+                                  offset: Annotated[int, Query(ge=0)] = 0,
+                                  cursor: Optional[str] = None,
+                                  fields: Annotated[Optional[str], Query(description=FIELDS_DESCRIPTION)] = None):
     """
     Search for organizations by categories and/or countries.
 
+    An organization must be in one of the categories and in one of the countries requested. The
+    organizations matching more of the categories and countries come first. The search is answered
+    from the in-memory facet index and the snapshot of the collection, without querying the database.
+
+    The results are returned one page at a time. When more organizations follow, the cursor of the
+    next page is returned in the X-Next-Cursor header.
+
     Parameters:
     - orgSearch (OrganizationSearch): The search criteria including categories and countries.
+    - limit (int, optional): The size of the page. Defaults to MAX_PAGE_SIZE.
+    - offset (int, optional): The number of organizations to skip, after the cursor if one is given.
+    - cursor (str, optional): The X-Next-Cursor header of the previous page.
+    - fields (str, optional): The comma-separated properties to return.
 
     Returns:
-    - List[OrganizationGet]: A list of organizations matching the search criteria.
+    - List[OrganizationGet]: A page of the organizations matching the search criteria.
 
     Raises:
-    - HTTPException: If neither categories nor countries are specified.
+    - HTTPException: If neither categories nor countries are specified, or the cursor is invalid.
     """
-    filters = []
-
-    if orgSearch.categories and len(orgSearch.categories) > 0:
-        filters.append({
-            "path": ["categories"],
-            "operator": "ContainsAny",
-            "valueText": orgSearch.categories
-        })
-
-    if orgSearch.countries and len(orgSearch.countries) > 0:
-        filters.append({
-            "path": ["countries"],
-            "operator": "ContainsAny",
-            "valueText": orgSearch.countries
-        })
-
-    if not filters:
+    projection = parse_fields(fields, OrganizationGet)
+    if not orgSearch.categories and not orgSearch.countries:
         raise HTTPException(status_code=422, detail="Neither organization nor categories were specified")
 
-    query = client.query.get("Organization", ["name", "link", "description", "categories", "countries"])
-
-    if len(filters) == 1:
-        query = query.with_where(filters[0])
-    else:
-        query = query.with_where({
-            "operator": "And",
-            "operands": filters
-        })
-
-    query = query.with_additional("id")
-    response = query.do()
+    await facet_index.ensure_built()
+    ranked = facet_index.rank(orgSearch.categories, orgSearch.countries)
+    start = 0
+    if cursor is not None:
+        matches, organization_id = parse_search_cursor(cursor)
+        start = bisect.bisect_right(ranked, (-matches, organization_id), key=lambda entry: (-entry[0], entry[1]))
+    start += offset
+    limit = limit or MAX_PAGE_SIZE
+    page = ranked[start:start + limit]
+    if start + limit < len(ranked):
+        response.headers[NEXT_CURSOR_HEADER] = f"{page[-1][0]}.{page[-1][1]}"
 
-    organizations = []
-    for i in range(len(response["data"]["Get"]["Organization"])):
-        organizations.append(OrganizationGet(
-            id=response["data"]["Get"]["Organization"][i]["_additional"]["id"],
-            name=response["data"]["Get"]["Organization"][i]["name"],
-            link=response["data"]["Get"]["Organization"][i]["link"],
-            description=response["data"]["Get"]["Organization"][i]["description"],
-            countries=response["data"]["Get"]["Organization"][i]["countries"],
-            categories=response["data"]["Get"]["Organization"][i]["categories"]
-        ))
+    snapshot = await snapshot_cache.get_snapshot("Organization", load_organizations)
+    # An organization indexed but not in the snapshot yet, or anymore, is left out of the page
+    organizations = [organization for organization in (snapshot.get(organization_id) for _, organization_id in page)
+                     if organization is not None]
+    if projection is not None:
+        return projected_response(project_models(organizations, projection), page_headers(response))
     return organizations
 
 
 @router.post("/search-organization-by-name/", response_model=List[OrganizationGet], summary="Search for organizations")
-async def search_organizations_by_name(text: SearchInput):
+async def search_organizations_by_name(text: SearchInput,
+                                       fields: Annotated[Optional[str], Query(description=FIELDS_DESCRIPTION)] = None):
+    projection = parse_fields(fields, OrganizationGet)
     if text.searchString == "":
-        return await get_organizations()
-    response = (
-        client.query
-        .get("Organization", ["name", "link", "description", "categories", "countries"])
-        .with_bm25(
-            query=text.searchString
+        snapshot = await snapshot_cache.get_snapshot("Organization", load_organizations)
+        if projection is not None:
+            return projected_response(project_models(snapshot.objects, projection))
+        return snapshot.response()
+
+    async def run_search() -> List:
+        response = await async_client.do(
+            client.query
+            .get("Organization", list(projection or ORGANIZATION_PROPERTIES))
+            .with_bm25(
+                query=text.searchString
+            )
+            .with_limit(text.limitOfOrganizations)
+            .with_additional("id"),
+            operation="bm25"
         )
-        .with_limit(text.limitOfOrganizations)
-        .with_additional("id")
-        .do()
-    )
+        if projection is not None:
+            return project_objects(response["data"]["Get"]["Organization"], projection)
 
-    organizations = []
-    for i in range(len(response["data"]["Get"]["Organization"])):
-        organizations.append(OrganizationGet(
-            id=response["data"]["Get"]["Organization"][i]["_additional"]["id"],
-            name=response["data"]["Get"]["Organization"][i]["name"],
-            link=response["data"]["Get"]["Organization"][i]["link"],
-            description=response["data"]["Get"]["Organization"][i]["description"],
-            countries=response["data"]["Get"]["Organization"][i]["countries"],
-            categories=response["data"]["Get"]["Organization"][i]["categories"]
-        ))
-    return organizations
\ No newline at end of file
+        organizations = []
+        for i in range(len(response["data"]["Get"]["Organization"])):
+            organizations.append(OrganizationGet(
+                id=response["data"]["Get"]["Organization"][i]["_additional"]["id"],
+                name=response["data"]["Get"]["Organization"][i]["name"],
+                link=response["data"]["Get"]["Organization"][i]["link"],
+                description=response["data"]["Get"]["Organization"][i]["description"],
+                countries=response["data"]["Get"]["Organization"][i]["countries"],
+                categories=response["data"]["Get"]["Organization"][i]["categories"]
+            ))
+        return organizations
+
+    results = await search_cache.get("Organization", text.searchString, text.limitOfOrganizations, projection,
+                                     run_search)
+    return results if projection is None else projected_response(results)
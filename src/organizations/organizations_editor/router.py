@@ -1,10 +1,17 @@
 from io import BytesIO
 from PIL import Image
-import requests
-from fastapi import APIRouter, HTTPException
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, Request
 from src.organizations.models import OrganizationAdd, OrganizationGet
-from src.organizations.organization_user.router import get_organization
-from src.weaviate_client import client
+from src.organizations.organization_user.router import ORGANIZATION_PROPERTIES, get_batch_with_cursor, parse_organizations
+from src.pagination import StreamFormat, stream_collection
+from src.cache import mark_collection_changed
+from src.change_feed import record_deletions
+from src.organizations.facet_index import facet_index
+from src.weaviate_client import async_client
+from src.link_checker import validate_link, check_links
+from src.bulk import BatchSizeQuery, WorkersQuery, ResumeFromQuery, IMPORT_BATCH_SIZE, IMPORT_WORKERS, \
+    MoveRequest, MoveResult, import_collection, move_object, move_objects
 
 router = APIRouter(
     prefix="/organization/edit",
@@ -26,7 +33,7 @@ async def create_organization(organization: OrganizationAdd):
     - HTTPException: If the logo link format is invalid.
     """
 
-    validate_link(organization.link)
+    await validate_link(organization.link)
 
 
     organization_object = {
@@ -37,10 +44,12 @@ async def create_organization(organization: OrganizationAdd):
         "countries": organization.countries
     }
 
-    result = client.data_object.create(
+    result = await async_client.create(
         data_object=organization_object,
         class_name="Organization"
     )
+    mark_collection_changed("Organization")
+    facet_index.add(result, organization.categories, organization.countries)
 
     object_id = result
 
@@ -64,14 +73,17 @@ async def delete_organization(organization_id: str):
     Returns:
     - OrganizationGet: The details of the deleted organization.
     """
-    organization_object = client.data_object.get_by_id(
+    organization_object = await async_client.get_by_id(
         organization_id,
         class_name="Organization"
     )
-    client.data_object.delete(
+    await record_deletions("Organization", [organization_id])
+    await async_client.delete(
         organization_id,
         class_name="Organization",
     )
+    mark_collection_changed("Organization")
+    facet_index.remove(organization_id)
     return OrganizationGet(id=organization_id, name=organization_object["properties"]["name"],
                            link=organization_object["properties"]["link"],
                            description=organization_object["properties"]["description"],
@@ -101,13 +113,15 @@ async def edit_organization(organization: OrganizationAdd, organization_id: str)
     }
 
 
-    validate_link(organization.link)
+    await validate_link(organization.link)
 
-    result = client.data_object.replace(
+    result = await async_client.replace(
         uuid=organization_id,
         class_name="Organization",
         data_object=organization_object
     )
+    mark_collection_changed("Organization")
+    facet_index.add(organization_id, organization.categories, organization.countries)
 
     return OrganizationGet(
         id=organization_id,
@@ -118,68 +132,93 @@ async def edit_organization(organization: OrganizationAdd, organization_id: str)
         countries=organization.countries
     )
 
-def validate_link(url: str):
+
+@router.post("/unpublish/{organization_id}", response_model=OrganizationGet, summary="Unpublishes an organization to saved")
+async def unpublish_organization(organization_id: str):
     """
-    Validate the provided URL to ensure it is accessible.
+    Unpublish an organization and move it to the saved organizations collection.
+
+    The organization keeps its ID. Retrying the request after a failure completes the move.
 
     Parameters:
-    - url (str): The URL to validate.
+    - organization_id (str): The ID of the organization to be unpublished.
 
-    Raises:
-    - HTTPException: If the URL is not accessible or is invalid.
+    Returns:
+    - OrganizationGet: The details of the unpublished organization now saved in the saved organizations collection.
     """
-    try:
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise HTTPException(status_code=422, detail="The site on the link is not accessible")
-    except requests.RequestException as e:
-        raise HTTPException(status_code=422, detail="The provided link is invalid.")
+    organization = await move_object(organization_id, "Organization", "OrganizationSaved", ORGANIZATION_PROPERTIES)
+    facet_index.remove(organization_id)
+    return parse_organizations([organization])[0]
 
 
-@router.post("/unpublish/{organization_id}", response_model=OrganizationGet, summary="Unpublishes an organization to saved")
-async def unpublish_organization(organization_id: str):
+@router.post("/bulk-unpublish", response_model=MoveResult, summary="Unpublish organizations in bulk")
+async def bulk_unpublish_organizations(move: MoveRequest):
     """
-    Unpublish an organization and move it to the saved organizations collection.
+    Unpublish several organizations at once, keeping their IDs.
+
+    The organizations are copied with one batch request and removed from 'Organization' with another.
+    Organizations already in 'OrganizationSaved' are reported as already moved, so the request can be
+    retried.
 
     Parameters:
-    - organization_id (str): The ID of the organization to be unpublished.
+    - move (MoveRequest): The IDs of the organizations.
 
     Returns:
-    - OrganizationGet: The details of the unpublished organization now saved in the saved organizations collection.
+    - MoveResult: The IDs moved, already moved, not found and failed with their error.
     """
-    # Retrieve the details of the organization by its ID
-    organization = await get_organization(organization_id)
+    result, moved = await move_objects(move.ids, "Organization", "OrganizationSaved", ORGANIZATION_PROPERTIES)
+    for organization in moved:
+        facet_index.remove(organization["_additional"]["id"])
+    return result
 
-    # Create an object representation of the organization
-    organization_object = {
-        "name": organization.name,
-        "link": organization.link,
-        "description": organization.description,
-        "categories": organization.categories,
-        "countries": organization.countries
-    }
 
-    # Create the organization in the saved organizations collection
-    result = client.data_object.create(
-        data_object=organization_object,
-        class_name="OrganizationSaved"
-    )
+async def validate_organizations_window(organizations: List[OrganizationAdd]) -> List[Optional[str]]:
+    """
+    Check the links of the organizations of an import concurrently.
+    """
+    return await check_links([organization.link for organization in organizations])
 
-    # Get the ID of the newly created saved organization
-    object_id = result
 
-    # Delete the organization from the published organizations collection
-    client.data_object.delete(
-        organization_id,
-        class_name="Organization",
-    )
+def index_organizations(organizations: List[Tuple[str, OrganizationAdd]]) -> None:
+    for organization_id, organization in organizations:
+        facet_index.add(organization_id, organization.categories, organization.countries)
 
-    # Return the details of the unpublished organization
-    return OrganizationGet(
-        id=object_id,
-        name=organization.name,
-        description=organization.description,
-        link=organization.link,
-        countries=organization.countries,
-        categories=organization.categories
-    )
+
+@router.post("/import-organizations", summary="Import organizations in bulk")
+async def import_organizations(request: Request,
+                               batch_size: BatchSizeQuery = IMPORT_BATCH_SIZE,
+                               workers: WorkersQuery = IMPORT_WORKERS,
+                               resume_from: ResumeFromQuery = 0):
+    """
+    Import organizations from an NDJSON body, one organization per line as returned by the export.
+
+    The organizations are written with the batch API of the database, after their links are checked
+    concurrently. Organizations with an `id` replace the existing organization with that ID, the
+    others get an ID derived from their content.
+
+    Parameters:
+    - batch_size (int, optional): The number of organizations sent in one batch request.
+    - workers (int, optional): The number of batch requests sent concurrently.
+    - resume_from (int, optional): The checkpoint of an interrupted import.
+
+    Returns:
+    - StreamingResponse: NDJSON progress lines with the checkpoint and the errors of the rejected
+      organizations, then a summary line.
+    """
+    return await import_collection(request, "Organization", OrganizationAdd,
+                                   validate=validate_organizations_window, on_imported=index_organizations,
+                                   batch_size=batch_size, workers=workers, resume_from=resume_from)
+
+
+@router.get("/export-organizations", summary="Export all organizations as NDJSON")
+async def export_organizations(cursor: Optional[str] = None):
+    """
+    Stream every organization as NDJSON, in the format accepted by the import.
+
+    Parameters:
+    - cursor (str, optional): The ID of the last organization received, to resume an interrupted export.
+
+    Returns:
+    - StreamingResponse: One organization per line.
+    """
+    return stream_collection("Organization", get_batch_with_cursor, parse_organizations, StreamFormat.ndjson, cursor)
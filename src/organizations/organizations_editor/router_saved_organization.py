@@ -1,9 +1,16 @@
-from typing import List, Dict
-import requests
-from fastapi import APIRouter, HTTPException
+from typing import Annotated, List, Dict, Optional
+from fastapi import APIRouter, Query, Request, Response
 from src.organizations.models import OrganizationAdd
 from src.organizations.models import OrganizationGet
-from src.weaviate_client import client
+from src.cache import snapshot_cache, mark_collection_changed
+from src.pagination import MAX_PAGE_SIZE, StreamFormat, get_page, iterate_batches, stream_collection
+from src.organizations.facet_index import facet_index
+from src.weaviate_client import client, async_client
+from src.link_checker import validate_link
+from src.organizations.organizations_editor.router import validate_organizations_window
+from src.organizations.organization_user.router import ORGANIZATION_PROPERTIES
+from src.bulk import BatchSizeQuery, WorkersQuery, ResumeFromQuery, IMPORT_BATCH_SIZE, IMPORT_WORKERS, \
+    MoveRequest, MoveResult, import_collection, move_object, move_objects
 
 # Create a router for the API endpoints related to saved organizations
 router = APIRouter(
@@ -11,7 +18,7 @@ router = APIRouter(
     tags=["Organizations Editor Saved Organizations"]
 )
 
-def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
+async def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
     """
     Retrieve a batch of objects from the collection with optional cursor for pagination.
 
@@ -32,9 +39,9 @@ def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = N
         .with_limit(batch_size)
     )
     if cursor is not None:
-        result = query.with_after(cursor).do()
+        result = await async_client.do(query.with_after(cursor))
     else:
-        result = query.do()
+        result = await async_client.do(query)
     return result["data"]["Get"][collection_name]
 
 def parse_organizations(data: List[Dict]) -> List[OrganizationGet]:
@@ -61,24 +68,45 @@ def parse_organizations(data: List[Dict]) -> List[OrganizationGet]:
     return organizations
 
 @router.get("/get-saved-organizations", response_model=List[OrganizationGet], summary="Get all saved organizations")
-async def get_saved_organizations():
+async def get_saved_organizations(response: Response,
+                                 limit: Annotated[Optional[int], Query(ge=1, le=MAX_PAGE_SIZE)] = None,
+                                 cursor: Optional[str] = None,
+                                 stream: Optional[StreamFormat] = None):
     """
     Retrieve a list of all organizations.
 
-    This endpoint fetches all the organizations in the collection, handling pagination internally.
+    The organizations are served from an in-memory snapshot of the collection that is refreshed after edits.
+
+    Passing `limit` and/or `cursor` returns a single page read directly from the database instead;
+    the cursor of the next page is returned in the X-Next-Cursor header. Passing `stream` streams
+    the whole collection page by page as NDJSON or as a JSON array.
+
+    Parameters:
+    - limit (int, optional): The size of the page.
+    - cursor (str, optional): The ID of the last organization of the previous page.
+    - stream (StreamFormat, optional): Stream the collection as 'ndjson' or 'json'.
 
     Returns:
     - List[OrganizationGet]: A list of all organizations.
     """
-    cursor = None
-    organizations_unformatted = []
-    while True:
-        next_batch = get_batch_with_cursor("OrganizationSaved", 100, cursor)
-        if len(next_batch) == 0:
-            break
-        organizations_unformatted.extend(next_batch)
-        cursor = next_batch[-1]["_additional"]["id"]
+    if stream is not None:
+        return stream_collection("OrganizationSaved", get_batch_with_cursor, parse_organizations, stream, cursor)
+    if limit is not None or cursor is not None:
+        return await get_page("OrganizationSaved", get_batch_with_cursor, parse_organizations, response, limit, cursor)
+    snapshot = await snapshot_cache.get_snapshot("OrganizationSaved", load_saved_organizations)
+    return snapshot.response()
+
+
+async def load_saved_organizations() -> List[OrganizationGet]:
+    """
+    Read every object of the 'OrganizationSaved' collection, handling pagination internally.
 
+    Returns:
+    - List[OrganizationGet]: The parsed organizations of the collection.
+    """
+    organizations_unformatted = []
+    async for batch in iterate_batches("OrganizationSaved", get_batch_with_cursor):
+        organizations_unformatted.extend(batch)
     organizations_output = parse_organizations(organizations_unformatted)
     return organizations_output
 
@@ -93,7 +121,7 @@ async def get_saved_organization(organization_id: str):
     Returns:
     - OrganizationGet: The details of the specified organization.
     """
-    organization_object = client.data_object.get_by_id(
+    organization_object = await async_client.get_by_id(
         organization_id,
         class_name="OrganizationSaved"
     )
@@ -117,7 +145,7 @@ async def create_saved_organization(organization: OrganizationAdd):
     Raises:
     - HTTPException: If the logo link format is invalid.
     """
-    validate_link(organization.link)
+    await validate_link(organization.link)
 
     organization_object = {
         "name": organization.name,
@@ -127,10 +155,11 @@ async def create_saved_organization(organization: OrganizationAdd):
         "countries": organization.countries
     }
 
-    result = client.data_object.create(
+    result = await async_client.create(
         data_object=organization_object,
         class_name="OrganizationSaved"
     )
+    mark_collection_changed("OrganizationSaved")
 
     object_id = result
 
@@ -154,14 +183,15 @@ async def delete_saved_organization(organization_id: str):
     Returns:
     - OrganizationGet: The details of the deleted organization.
     """
-    organization_object = client.data_object.get_by_id(
+    organization_object = await async_client.get_by_id(
         organization_id,
         class_name="OrganizationSaved"
     )
-    client.data_object.delete(
+    await async_client.delete(
         organization_id,
         class_name="OrganizationSaved",
     )
+    mark_collection_changed("OrganizationSaved")
     return OrganizationGet(id=organization_id, name=organization_object["properties"]["name"],
                            link=organization_object["properties"]["link"],
                            description=organization_object["properties"]["description"],
@@ -188,13 +218,14 @@ async def edit_organization(organization: OrganizationAdd, organization_id: str)
         "countries": organization.countries,
     }
 
-    validate_link(organization.link)
+    await validate_link(organization.link)
 
-    result = client.data_object.replace(
+    result = await async_client.replace(
         uuid=organization_id,
         class_name="OrganizationSaved",
         data_object=organization_object
     )
+    mark_collection_changed("OrganizationSaved")
 
     return OrganizationGet(
         id=organization_id,
@@ -210,56 +241,79 @@ async def publish_organization(saved_organization_id: str):
     """
     Publish a saved organization by moving it from 'OrganizationSaved' to 'Organization'.
 
+    The organization keeps its ID. Retrying the request after a failure completes the move.
+
     Parameters:
     - saved_organization_id (str): The ID of the saved organization to be published.
 
     Returns:
     - OrganizationGet: The published organization's details.
     """
-    organization = await get_saved_organization(saved_organization_id)
+    organization = await move_object(saved_organization_id, "OrganizationSaved", "Organization",
+                                     ORGANIZATION_PROPERTIES)
+    facet_index.add(organization["_additional"]["id"], organization["categories"] or (),
+                    organization["countries"] or ())
+    return parse_organizations([organization])[0]
 
-    organization_object = {
-        "name": organization.name,
-        "link": organization.link,
-        "description": organization.description,
-        "categories": organization.categories,
-        "countries": organization.countries
-    }
 
-    result = client.data_object.create(
-        data_object=organization_object,
-        class_name="Organization"
-    )
+@router.post("/bulk-publish", response_model=MoveResult, summary="Publish saved organizations in bulk")
+async def bulk_publish_organizations(move: MoveRequest):
+    """
+    Publish several organizations at once, keeping their IDs.
 
-    object_id = result
+    The organizations are copied with one batch request and removed from 'OrganizationSaved' with
+    another. Organizations already in 'Organization' are reported as already moved, so the request
+    can be retried.
 
-    client.data_object.delete(
-        saved_organization_id,
-        class_name="OrganizationSaved",
-    )
+    Parameters:
+    - move (MoveRequest): The IDs of the organizations.
 
-    return OrganizationGet(
-        id=object_id,
-        name=organization.name,
-        description=organization.description,
-        link=organization.link,
-        countries=organization.countries,
-        categories=organization.categories
-    )
+    Returns:
+    - MoveResult: The IDs moved, already moved, not found and failed with their error.
+    """
+    result, moved = await move_objects(move.ids, "OrganizationSaved", "Organization", ORGANIZATION_PROPERTIES)
+    for organization in moved:
+        facet_index.add(organization["_additional"]["id"], organization["categories"] or (),
+                        organization["countries"] or ())
+    return result
+
+
+@router.post("/import-saved-organizations", summary="Import saved organizations in bulk")
+async def import_saved_organizations(request: Request,
+                                     batch_size: BatchSizeQuery = IMPORT_BATCH_SIZE,
+                                     workers: WorkersQuery = IMPORT_WORKERS,
+                                     resume_from: ResumeFromQuery = 0):
+    """
+    Import organizations from an NDJSON body, one organization per line as returned by the export.
+
+    The organizations are written with the batch API of the database, after their links are checked
+    concurrently. Organizations with an `id` replace the existing organization with that ID, the
+    others get an ID derived from their content.
 
-def validate_link(url: str):
+    Parameters:
+    - batch_size (int, optional): The number of organizations sent in one batch request.
+    - workers (int, optional): The number of batch requests sent concurrently.
+    - resume_from (int, optional): The checkpoint of an interrupted import.
+
+    Returns:
+    - StreamingResponse: NDJSON progress lines with the checkpoint and the errors of the rejected
+      organizations, then a summary line.
     """
-    Validate the provided URL to ensure it is accessible.
+    return await import_collection(request, "OrganizationSaved", OrganizationAdd,
+                                   validate=validate_organizations_window,
+                                   batch_size=batch_size, workers=workers, resume_from=resume_from)
+
+
+@router.get("/export-saved-organizations", summary="Export all saved organizations as NDJSON")
+async def export_saved_organizations(cursor: Optional[str] = None):
+    """
+    Stream every organization as NDJSON, in the format accepted by the import.
 
     Parameters:
-    - url (str): The URL to validate.
+    - cursor (str, optional): The ID of the last organization received, to resume an interrupted export.
 
-    Raises:
-    - HTTPException: If the URL is not accessible or is invalid.
+    Returns:
+    - StreamingResponse: One organization per line.
     """
-    try:
-        response = requests.get(url)
-        if response.status_code != 200:
-            raise HTTPException(status_code=422, detail="The site on the link is not accessible")
-    except requests.RequestException as e:
-        raise HTTPException(status_code=422, detail="The provided link is invalid.")
+    return stream_collection("OrganizationSaved", get_batch_with_cursor, parse_organizations, StreamFormat.ndjson,
+                             cursor)
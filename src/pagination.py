@@ -0,0 +1,128 @@
+"""
+Helpers shared by the list endpoints to walk a collection with the Weaviate `after` cursor.
+
+A list endpoint either returns the whole collection, a single page selected with `limit` and
+`cursor`, or streams the collection page by page as it arrives from Weaviate.
+"""
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Union
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from fastapi import Response
+from enum import Enum
+import orjson
+
+BATCH_SIZE = 100
+MAX_PAGE_SIZE = 100
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+FetchBatch = Callable[[str, int, Optional[str]], Awaitable[List[Dict]]]
+ParseBatch = Callable[[List[Dict]], List[Union[BaseModel, Dict]]]
+
+
+class StreamFormat(str, Enum):
+    ndjson = "ndjson"
+    json = "json"
+
+
+def dump_item(item: Union[BaseModel, Dict]) -> bytes:
+    """
+    Serialize a parsed object, or a projected one when `fields` was requested.
+    """
+    if isinstance(item, dict):
+        return orjson.dumps(item)
+    return item.model_dump_json().encode()
+
+
+def dump_items(items: List[Union[BaseModel, Dict]]) -> bytes:
+    """
+    Serialize a list of parsed or projected objects into a JSON array, the same body as the
+    response model of the endpoint would produce.
+    """
+    return b"[" + b",".join(dump_item(item) for item in items) + b"]"
+
+
+def page_headers(response: Response) -> Dict[str, str]:
+    """
+    Return the headers set by `get_page`, for endpoints that build their own response.
+    """
+    if NEXT_CURSOR_HEADER in response.headers:
+        return {NEXT_CURSOR_HEADER: response.headers[NEXT_CURSOR_HEADER]}
+    return {}
+
+
+async def iterate_batches(collection_name: str, fetch_batch: FetchBatch, batch_size: int = BATCH_SIZE,
+                          cursor: Optional[str] = None) -> AsyncIterator[List[Dict]]:
+    """
+    Yield the raw objects of a collection batch by batch.
+
+    Parameters:
+    - collection_name (str): The name of the collection to walk.
+    - fetch_batch (FetchBatch): The function retrieving one batch after a cursor.
+    - batch_size (int): The number of items to retrieve in each batch.
+    - cursor (str, optional): The ID after which to start. If None, start from the beginning.
+    """
+    while True:
+        batch = await fetch_batch(collection_name, batch_size, cursor)
+        if len(batch) == 0:
+            return
+        yield batch
+        cursor = batch[-1]["_additional"]["id"]
+
+
+async def get_page(collection_name: str, fetch_batch: FetchBatch, parse: ParseBatch, response: Response,
+                   limit: Optional[int], cursor: Optional[str]) -> List[Union[BaseModel, Dict]]:
+    """
+    Retrieve one page of a collection.
+
+    When more objects may follow, the cursor of the next page is returned in the X-Next-Cursor header.
+
+    Parameters:
+    - collection_name (str): The name of the collection.
+    - fetch_batch (FetchBatch): The function retrieving one batch after a cursor.
+    - parse (ParseBatch): The function converting raw objects into response models.
+    - response (Response): The response whose headers receive the next cursor.
+    - limit (int, optional): The size of the page. Defaults to MAX_PAGE_SIZE.
+    - cursor (str, optional): The ID after which the page starts.
+
+    Returns:
+    - List[Union[BaseModel, Dict]]: The parsed objects of the page.
+    """
+    limit = limit or MAX_PAGE_SIZE
+    batch = await fetch_batch(collection_name, limit, cursor)
+    if len(batch) == limit:
+        response.headers[NEXT_CURSOR_HEADER] = batch[-1]["_additional"]["id"]
+    return parse(batch)
+
+
+def stream_collection(collection_name: str, fetch_batch: FetchBatch, parse: ParseBatch,
+                      stream_format: StreamFormat, cursor: Optional[str] = None) -> StreamingResponse:
+    """
+    Stream a collection to the client, sending every batch as soon as Weaviate returns it.
+
+    Only one batch is held in memory at a time, however big the collection is.
+
+    Parameters:
+    - collection_name (str): The name of the collection.
+    - fetch_batch (FetchBatch): The function retrieving one batch after a cursor.
+    - parse (ParseBatch): The function converting raw objects into response models.
+    - stream_format (StreamFormat): NDJSON (one object per line) or a single JSON array.
+    - cursor (str, optional): The ID after which to start.
+
+    Returns:
+    - StreamingResponse: The streamed collection.
+    """
+    async def ndjson_body() -> AsyncIterator[bytes]:
+        async for batch in iterate_batches(collection_name, fetch_batch, cursor=cursor):
+            yield b"".join(dump_item(item) + b"\n" for item in parse(batch))
+
+    async def json_body() -> AsyncIterator[bytes]:
+        separator = b"["
+        async for batch in iterate_batches(collection_name, fetch_batch, cursor=cursor):
+            chunk = b",".join(dump_item(item) for item in parse(batch))
+            yield separator + chunk
+            separator = b","
+        yield b"]" if separator == b"," else b"[]"
+
+    if stream_format == StreamFormat.ndjson:
+        return StreamingResponse(ndjson_body(), media_type="application/x-ndjson")
+    return StreamingResponse(json_body(), media_type="application/json")
@@ -0,0 +1,56 @@
+"""
+Helpers for the `fields` parameter of the list and search endpoints.
+
+With `fields`, only the requested properties are read from Weaviate and returned, together with
+the ID of every object. The objects are returned as plain dictionaries.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple, Type
+from fastapi.responses import ORJSONResponse
+from fastapi import HTTPException
+from pydantic import BaseModel
+
+FIELDS_DESCRIPTION = "Comma-separated properties to return, e.g. 'title,tags'. The id is always returned."
+
+
+def parse_fields(fields: Optional[str], model: Type[BaseModel]) -> Optional[Tuple[str, ...]]:
+    """
+    Validate the `fields` parameter against the properties of a response model.
+
+    Parameters:
+    - fields (str, optional): The comma-separated property names.
+    - model (Type[BaseModel]): The response model of the endpoint.
+
+    Returns:
+    - Tuple[str, ...], optional: The requested properties in order, or None to return whole objects.
+
+    Raises:
+    - HTTPException: If no property or an unknown property is requested.
+    """
+    if fields is None:
+        return None
+    allowed = [name for name in model.model_fields if name != "id"]
+    requested = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in allowed]
+    if not requested or unknown:
+        raise HTTPException(status_code=422,
+                            detail=f"Unknown fields: {', '.join(unknown)}. Allowed fields: {', '.join(allowed)}")
+    return requested
+
+
+def project_objects(data: List[Dict], fields: Sequence[str]) -> List[Dict]:
+    """
+    Keep the ID and the requested properties of objects returned by a query.
+    """
+    return [{"id": item["_additional"]["id"], **{field: item[field] for field in fields}} for item in data]
+
+
+def project_models(models: List[BaseModel], fields: Sequence[str]) -> List[Dict]:
+    """
+    Keep the ID and the requested properties of parsed objects.
+    """
+    include = {"id", *fields}
+    return [model.model_dump(include=include) for model in models]
+
+
+def projected_response(items: List[Dict], headers: Optional[Dict[str, str]] = None) -> ORJSONResponse:
+    return ORJSONResponse(items, headers=headers)
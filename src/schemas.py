@@ -17,6 +17,10 @@ class_article = {
             "name": "content",
             "dataType": ["text"],
             "vectorizer": "none"
+        },
+        {
+            "name": "updatedAt",
+            "dataType": ["int"]
         }
     ],
     "moduleConfig": {
@@ -45,6 +49,10 @@ class_saved_article = {
             "name": "content",
             "dataType": ["text"],
             "vectorizer": "none"
+        },
+        {
+            "name": "updatedAt",
+            "dataType": ["int"]
         }
     ],
     "vectorizer": "none"
@@ -73,6 +81,10 @@ class_organization = {
             "name": "countries",
             "dataType": ["text[]"]
         },
+        {
+            "name": "updatedAt",
+            "dataType": ["int"]
+        }
     ],
     "vectorizer": "none"
 }
@@ -100,6 +112,10 @@ class_saved_organization = {
             "name": "countries",
             "dataType": ["text[]"]
         },
+        {
+            "name": "updatedAt",
+            "dataType": ["int"]
+        }
     ],
     "vectorizer": "none"
 }
@@ -122,6 +138,10 @@ class_news = {
         {
             "name": "tags",
             "dataType": ["text[]"]
+        },
+        {
+            "name": "updatedAt",
+            "dataType": ["int"]
         }
     ],
     "vectorizer": "none"
@@ -145,6 +165,10 @@ class_saved_news = {
         {
             "name": "tags",
             "dataType": ["text[]"]
+        },
+        {
+            "name": "updatedAt",
+            "dataType": ["int"]
         }
     ],
     "vectorizer": "none"
@@ -156,6 +180,33 @@ class_requests = {
         {
             "name": "requestText",
             "dataType": ["text"]
+        },
+        {
+            "name": "updatedAt",
+            "dataType": ["int"]
+        }
+    ],
+    "vectorizer": "none"
+}
+
+# Records the deletion of an object from a published collection, read by the sync endpoints.
+# Its 'updatedAt' is the time of the deletion.
+class_tombstone = {
+    "class": "Tombstone",
+    "properties": [
+        {
+            "name": "collection",
+            "dataType": ["text"],
+            "tokenization": "field"
+        },
+        {
+            "name": "objectId",
+            "dataType": ["text"],
+            "tokenization": "field"
+        },
+        {
+            "name": "updatedAt",
+            "dataType": ["int"]
         }
     ],
     "vectorizer": "none"
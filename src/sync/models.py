@@ -0,0 +1,18 @@
+from typing import Generic, List, TypeVar
+from pydantic import BaseModel
+
+ItemT = TypeVar("ItemT")
+
+
+class SyncPage(BaseModel, Generic[ItemT]):
+    """
+    Changes of a collection since a watermark.
+    upserts - the objects created or updated, to add or replace by ID
+    deletes - the IDs of the objects deleted
+    watermark - to pass as `since` to the next sync
+    has_more - whether more changes can be read right away with the new watermark
+    """
+    upserts: List[ItemT]
+    deletes: List[str]
+    watermark: str
+    has_more: bool = False
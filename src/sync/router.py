@@ -0,0 +1,105 @@
+from typing import Annotated, Awaitable, Callable, Dict, List, Optional, Sequence
+from fastapi import APIRouter, Query
+from src.cache import SNAPSHOT_CACHE_TTL, snapshot_cache
+from src.change_feed import MAX_SYNC_PAGE_SIZE, SYNC_PAGE_SIZE, parse_watermark, read_changes, safe_watermark
+from src.knowledge_base.knowledge_base_user.router import ARTICLE_PROPERTIES, load_articles, parse_articles
+from src.knowledge_base.models import ArticleGet
+from src.news.models import NewsGet
+from src.news.news_user.router import NEWS_PROPERTIES, load_news, parse_news
+from src.organizations.models import OrganizationGet
+from src.organizations.organization_user.router import ORGANIZATION_PROPERTIES, load_organizations, \
+    parse_organizations
+from src.sync.models import SyncPage
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["Sync"]
+)
+
+SinceQuery = Annotated[Optional[str], Query(description="The watermark returned by the previous sync. "
+                                                        "Omit it to receive the whole collection.")]
+LimitQuery = Annotated[int, Query(ge=1, le=MAX_SYNC_PAGE_SIZE, description="The maximum number of objects.")]
+
+
+async def sync_collection(collection_name: str, properties: Sequence[str], additional: Sequence[str],
+                          load: Callable[[], Awaitable[List]], parse: Callable[[List[Dict]], List],
+                          since: Optional[str], limit: int) -> SyncPage:
+    """
+    Return the changes of a collection since a watermark, or the whole collection without one.
+
+    The whole collection is served from the in-memory snapshot, so its watermark also accounts for the
+    age of the snapshot.
+    """
+    if since is None:
+        objects = await snapshot_cache.get(collection_name, load)
+        return SyncPage(upserts=objects, deletes=[], watermark=safe_watermark(SNAPSHOT_CACHE_TTL))
+    objects, deletes, watermark, has_more = await read_changes(collection_name, properties, additional,
+                                                               parse_watermark(since), limit)
+    return SyncPage(upserts=parse(objects), deletes=deletes, watermark=watermark, has_more=has_more)
+
+
+@router.get("/articles", response_model=SyncPage[ArticleGet], summary="Get the articles changed since a watermark")
+async def sync_articles(since: SinceQuery = None, limit: LimitQuery = SYNC_PAGE_SIZE):
+    """
+    Retrieve the articles created, updated or deleted since the last sync.
+
+    Without `since` every article is returned. Keep the returned watermark and pass it as `since` to
+    the next sync; while `has_more` is true, sync again right away.
+
+    Parameters:
+    - since (str, optional): The watermark returned by the previous sync.
+    - limit (int, optional): The maximum number of articles to return.
+
+    Returns:
+    - SyncPage[ArticleGet]: The articles to add or replace, the IDs of the deleted articles and the new watermark.
+
+    Raises:
+    - HTTPException: If the watermark is invalid (400) or too old (410), sync again without it.
+    """
+    return await sync_collection("Article", ARTICLE_PROPERTIES, ["id", "lastUpdateTimeUnix"], load_articles,
+                                 parse_articles, since, limit)
+
+
+@router.get("/news", response_model=SyncPage[NewsGet], summary="Get the news articles changed since a watermark")
+async def sync_news(since: SinceQuery = None, limit: LimitQuery = SYNC_PAGE_SIZE):
+    """
+    Retrieve the news articles created, updated or deleted since the last sync.
+
+    Without `since` every news article is returned. Keep the returned watermark and pass it as `since`
+    to the next sync; while `has_more` is true, sync again right away.
+
+    Parameters:
+    - since (str, optional): The watermark returned by the previous sync.
+    - limit (int, optional): The maximum number of news articles to return.
+
+    Returns:
+    - SyncPage[NewsGet]: The news articles to add or replace, the IDs of the deleted ones and the new watermark.
+
+    Raises:
+    - HTTPException: If the watermark is invalid (400) or too old (410), sync again without it.
+    """
+    return await sync_collection("News", NEWS_PROPERTIES, ["id"], load_news, parse_news, since, limit)
+
+
+@router.get("/organizations", response_model=SyncPage[OrganizationGet],
+            summary="Get the organizations changed since a watermark")
+async def sync_organizations(since: SinceQuery = None, limit: LimitQuery = SYNC_PAGE_SIZE):
+    """
+    Retrieve the organizations created, updated or deleted since the last sync.
+
+    Without `since` every organization is returned. Keep the returned watermark and pass it as `since`
+    to the next sync; while `has_more` is true, sync again right away.
+
+    Parameters:
+    - since (str, optional): The watermark returned by the previous sync.
+    - limit (int, optional): The maximum number of organizations to return.
+
+    Returns:
+    - SyncPage[OrganizationGet]: The organizations to add or replace, the IDs of the deleted ones and the
+      new watermark.
+
+    Raises:
+    - HTTPException: If the watermark is invalid (400) or too old (410), sync again without it.
+    """
+    return await sync_collection("Organization", ORGANIZATION_PROPERTIES, ["id"], load_organizations,
+                                 parse_organizations, since, limit)
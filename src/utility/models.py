@@ -0,0 +1,10 @@
+from typing import Dict
+from pydantic import BaseModel
+
+
+class FacetsGet(BaseModel):
+    """
+    Number of organizations per category and per country
+    """
+    categories: Dict[str, int]
+    countries: Dict[str, int]
@@ -1,136 +1,93 @@
-from typing import List, Dict, Set
+from typing import List, Dict
 from fastapi import APIRouter
-from src.weaviate_client import client
+from fastapi.responses import JSONResponse
+from src.cache import get_cache_stats
+from src.etag import IfNoneMatchHeader, conditional_json
+from src.metrics import get_metrics_stats
+from src.organizations.facet_index import facet_index
+from src.utility.models import FacetsGet
+from src.weaviate_client import schema_bootstrap
 
 router = APIRouter(
     prefix="/utility",
     tags=["Utility"]
 )
 
-def get_batch_with_cursor_categories(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
+@router.get("/get-categories", summary="Get all unique categories")
+async def get_categories(if_none_match: IfNoneMatchHeader = None) -> List[str]:
     """
-    Retrieve a batch of objects from the collection with optional cursor for pagination.
+    Retrieve a list of all unique categories from the organizations.
 
-    Parameters:
-    - collection_name (str): The name of the collection to query.
-    - batch_size (int): The number of items to retrieve in each batch.
-    - cursor (str, optional): The cursor for pagination. If None, fetch from the start.
+    The categories are served from the in-memory facet index of the organizations, with an ETag.
 
     Returns:
-    - List[Dict]: A list of objects from the collection.
+    - List[str]: A list of all unique categories.
     """
-    query = (
-        client.query.get(
-            collection_name,
-            ["categories"]
-        )
-        .with_additional(["id"])
-        .with_limit(batch_size)
-    )
-    if cursor is not None:
-        result = query.with_after(cursor).do()
-    else:
-        result = query.do()
-    return result["data"]["Get"][collection_name]
-
-def parse_categories(data: List[Dict]) -> Set[str]:
+    await facet_index.ensure_built()
+    return conditional_json(list(facet_index.categories), if_none_match)
+
+@router.get("/get-countries", summary="Get all unique countries")
+async def get_countries(if_none_match: IfNoneMatchHeader = None) -> List[str]:
     """
-    Parse a list of objects to extract unique categories.
+    Retrieve a list of all unique countries from the organizations.
 
-    Parameters:
-    - data (List[Dict]): The list of objects to parse.
+    The countries are served from the in-memory facet index of the organizations, with an ETag.
 
     Returns:
-    - Set[str]: A set of unique categories.
+    - List[str]: A list of all unique countries.
     """
-    categories_set = set()
-    for item in data:
-        for category in item["categories"]:
-            categories_set.add(category)
-    return categories_set
+    await facet_index.ensure_built()
+    return conditional_json(list(facet_index.countries), if_none_match)
 
-@router.get("/get-categories", summary="Get all unique categories")
-async def get_categories():
+@router.get("/get-facets", response_model=FacetsGet, summary="Get the number of organizations per category and country")
+async def get_facets(if_none_match: IfNoneMatchHeader = None):
     """
-    Retrieve a list of all unique categories from the organizations.
+    Retrieve the number of organizations in each category and in each country.
 
-    This endpoint fetches all the categories from the organizations, handling pagination internally.
+    Both facets come from the same in-memory index, built with a single scan of the organizations,
+    and are sent with an ETag.
 
     Returns:
-    - Set[str]: A set of all unique categories.
-    """
-    cursor = None
-    organizations_unformatted = []
-    while True:
-        next_batch = get_batch_with_cursor_categories("Organization", 100, cursor)
-        if len(next_batch) == 0:
-            break
-        organizations_unformatted.extend(next_batch)
-        cursor = next_batch[-1]["_additional"]["id"]
-
-    categories_output = parse_categories(organizations_unformatted)
-    return categories_output
-
-def get_batch_with_cursor(collection_name: str, batch_size: int, cursor: str = None) -> List[Dict]:
+    - FacetsGet: The number of organizations per category and per country.
     """
-    Retrieve a batch of objects from the collection with optional cursor for pagination.
+    await facet_index.ensure_built()
+    return conditional_json({"categories": facet_index.categories, "countries": facet_index.countries},
+                            if_none_match)
 
-    Parameters:
-    - collection_name (str): The name of the collection to query.
-    - batch_size (int): The number of items to retrieve in each batch.
-    - cursor (str, optional): The cursor for pagination. If None, fetch from the start.
 
-    Returns:
-    - List[Dict]: A list of objects from the collection.
+@router.get("/cache-stats", summary="Get the hit/miss counters of the in-process caches")
+async def cache_stats() -> Dict[str, Dict]:
     """
-    query = (
-        client.query.get(
-            collection_name,
-            ["countries"]
-        )
-        .with_additional(["id"])
-        .with_limit(batch_size)
-    )
-    if cursor is not None:
-        result = query.with_after(cursor).do()
-    else:
-        result = query.do()
-    return result["data"]["Get"][collection_name]
-
-def parse_countries(data: List[Dict]) -> Set[str]:
+    Retrieve the hit/miss counters of every in-process cache of this worker.
+
+    Returns:
+    - Dict[str, Dict]: The hits, misses, hit ratio and size of each cache by name.
     """
-    Parse a list of objects to extract unique countries.
+    return get_cache_stats()
 
-    Parameters:
-    - data (List[Dict]): The list of objects to parse.
+@router.get("/latency-stats", summary="Get the latency metrics of this worker")
+async def latency_stats() -> Dict[str, Dict]:
+    """
+    Retrieve the latency metrics recorded by this worker, such as the time to first token of
+    the streamed answers.
 
     Returns:
-    - Set[str]: A set of unique countries.
+    - Dict[str, Dict]: The count, mean, p50 and p99 in seconds of each metric by name.
     """
-    countries_set = set()
-    for item in data:
-        for country in item["countries"]:
-            countries_set.add(country)
-    return countries_set
+    return get_metrics_stats()
 
-@router.get("/get-countries", summary="Get all unique countries")
-async def get_countries():
+
+@router.get("/ready", summary="Check whether the worker is ready to serve requests")
+async def ready():
     """
-    Retrieve a list of all unique countries from the organizations.
+    Report whether the connection to the database is open and its schema is in place.
 
-    This endpoint fetches all the countries from the organizations, handling pagination internally.
+    The worker starts before the database is reached and keeps retrying in the background, so
+    this endpoint answers 503 until the schema bootstrap succeeded.
 
     Returns:
-    - Set[str]: A set of all unique countries.
+    - Dict: Whether the worker is ready, the number of bootstrap attempts, the last error and the
+      time the bootstrap took in seconds.
     """
-    cursor = None
-    organizations_unformatted = []
-    while True:
-        next_batch = get_batch_with_cursor("Organization", 100, cursor)
-        if len(next_batch) == 0:
-            break
-        organizations_unformatted.extend(next_batch)
-        cursor = next_batch[-1]["_additional"]["id"]
-
-    countries_output = parse_countries(organizations_unformatted)
-    return countries_output
+    status = schema_bootstrap.status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
@@ -1,52 +1,345 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from weaviate.config import Config, ConnectionConfig
+from fastapi import HTTPException
 from dotenv import load_dotenv
+import threading
+import functools
+import logging
+import asyncio
 import weaviate
+import time
 import os
 
+from src.fake_weaviate import FakeWeaviateClient
+from src.metrics import Counter, Gauge, Histogram
 from src.schemas import class_article, class_requests, class_saved_news, class_news, class_saved_organization, \
-    class_organization, class_saved_article
+    class_organization, class_saved_article, class_tombstone
 
 load_dotenv('.env')
 
+logger = logging.getLogger(__name__)
+
 jinaApi: str = os.getenv("JINA_AI_API_KEY")
 mistralApi: str = os.getenv("MISTRAL_AI_API_KEY")
 host: str = os.getenv("HOST")
 
-client = weaviate.Client(
-    url=host,
-    additional_headers={
-        "X-Jinaai-Api-Key": jinaApi,
-        "X-Mistral-Api-Key": mistralApi
-    }
-)
+# Size of the HTTP connection pool to Weaviate and the maximum number of Weaviate calls
+# that may be in flight at the same time from one worker
+max_concurrency: int = int(os.getenv("WEAVIATE_MAX_CONCURRENCY", "20"))
+
+# Timeouts in seconds: connect/read timeouts of a single HTTP call and the overall
+# deadline of one call made through the async layer
+connect_timeout: float = float(os.getenv("WEAVIATE_CONNECT_TIMEOUT", "2"))
+read_timeout: float = float(os.getenv("WEAVIATE_READ_TIMEOUT", "20"))
+call_timeout: float = float(os.getenv("WEAVIATE_CALL_TIMEOUT", "30"))
+
+# Schema bootstrap: delay before the first retry and upper bound of the exponential backoff, in seconds
+schema_retry_delay: float = float(os.getenv("WEAVIATE_SCHEMA_RETRY_DELAY", "0.5"))
+schema_retry_max_delay: float = float(os.getenv("WEAVIATE_SCHEMA_RETRY_MAX_DELAY", "30"))
+
+# In-process stand-in for Weaviate, see src/fake_weaviate.py, and the latency it injects in every call
+use_fake: bool = os.getenv("WEAVIATE_FAKE", "false").lower() in ("1", "true", "yes")
+fake_latency: float = float(os.getenv("WEAVIATE_FAKE_LATENCY_MS", "0")) / 1000
+fake_jitter: float = float(os.getenv("WEAVIATE_FAKE_JITTER_MS", "0")) / 1000
+
+SCHEMA_CLASSES = [
+    class_article,
+    class_saved_article,
+    class_organization,
+    class_saved_organization,
+    class_news,
+    class_saved_news,
+    class_requests,
+    class_tombstone,
+]
+
+# Property holding the time of the last write of an object, in milliseconds since the epoch
+UPDATED_AT = "updatedAt"
+
+
+def create_client() -> weaviate.Client:
+    if use_fake:
+        return FakeWeaviateClient(latency=fake_latency, jitter=fake_jitter)
+    return weaviate.Client(
+        url=host,
+        timeout_config=(connect_timeout, read_timeout),
+        additional_headers={
+            "X-Jinaai-Api-Key": jinaApi,
+            "X-Mistral-Api-Key": mistralApi
+        },
+        additional_config=Config(
+            connection_config=ConnectionConfig(
+                session_pool_connections=max_concurrency,
+                session_pool_maxsize=max_concurrency
+            )
+        ),
+        startup_period=None
+    )
+
+
+class LazyWeaviateClient:
+    """
+    Weaviate client connected on first use instead of at import time.
+
+    Creating a weaviate.Client makes a blocking call to Weaviate, so the connection is opened by
+    the schema bootstrap on a worker thread. Until it succeeds every use of the client fails fast
+    with a 503 instead of stalling the event loop. Everything else is delegated to the real client.
+    """
+
+    def __init__(self, factory: Callable[[], weaviate.Client]):
+        self._factory = factory
+        self._client: Optional[weaviate.Client] = None
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self) -> bool:
+        return self._client is not None
+
+    def connect(self) -> weaviate.Client:
+        """
+        Create the underlying client if needed. Blocking, never call it from the event loop.
+
+        Returns:
+        - weaviate.Client: The connected client.
+        """
+        with self._lock:
+            if self._client is None:
+                self._client = self._factory()
+            return self._client
+
+    def __getattr__(self, name: str) -> Any:
+        if self._client is None:
+            raise HTTPException(status_code=503, detail="The database is not available yet")
+        return getattr(self._client, name)
+
+
+client = LazyWeaviateClient(create_client)
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def stamp(data_object: Dict) -> Dict:
+    """
+    Return a copy of the properties of an object with its last-modified time set to now.
+    """
+    return {**data_object, UPDATED_AT: now_ms()}
+
+
+weaviate_duration = Histogram("weaviate_request_duration_seconds",
+                              "Duration of the Weaviate calls by operation, without the wait for a free slot.",
+                              ["operation"])
+weaviate_errors = Counter("weaviate_request_errors_total", "Failed or timed out Weaviate calls by operation.",
+                          ["operation"])
+
+
+class AsyncWeaviateClient:
+    """
+    Async access layer over the blocking Weaviate client.
+
+    Every call is executed on a dedicated thread pool so the event loop is never blocked,
+    the number of calls in flight is bounded by a semaphore and each call has a deadline.
+    A call that misses its deadline, or whose caller is cancelled, keeps its slot until its thread
+    returns, so the bound holds for the blocking calls actually running.
+    Queries are still built with `client.query` (building does no I/O) and executed with `do`.
+    The duration and the failures of every call are recorded per operation. The objects written by
+    `create` and `replace` get their last-modified time, see `stamp`.
+    """
+
+    def __init__(self, sync_client: Any, concurrency: int, timeout: float):
+        self._client = sync_client
+        self._timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="weaviate")
+        self.in_flight = 0
+
+    async def run(self, function: Callable[..., Any], *args, timeout: Optional[float] = None,
+                  operation: str = "other", **kwargs) -> Any:
+        """
+        Run a blocking Weaviate client call without blocking the event loop.
+
+        Parameters:
+        - function (Callable): The blocking function to call.
+        - timeout (float, optional): Deadline of the call in seconds. Defaults to WEAVIATE_CALL_TIMEOUT.
+        - operation (str, optional): The kind of call, the label of its metrics.
+
+        Returns:
+        - Any: The result of the function.
+
+        Raises:
+        - HTTPException: If Weaviate did not answer before the deadline.
+        """
+        loop = asyncio.get_running_loop()
+        await self._semaphore.acquire()
+        try:
+            future = loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+        except BaseException:
+            self._semaphore.release()
+            raise
+        self.in_flight += 1
+        # The thread cannot be interrupted, so the slot is released when it returns, not when the caller gives up
+        future.add_done_callback(self._release)
+        started = time.perf_counter()
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout or self._timeout)
+        except asyncio.TimeoutError:
+            weaviate_errors.inc(operation)
+            raise HTTPException(status_code=504, detail="The database did not respond in time")
+        except Exception:
+            weaviate_errors.inc(operation)
+            raise
+        finally:
+            weaviate_duration.observe(time.perf_counter() - started, operation)
+
+    def _release(self, future: asyncio.Future) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+        # Nobody awaits a call abandoned after its deadline, so its error is only retrieved here
+        if not future.cancelled():
+            future.exception()
+
+    async def do(self, query, timeout: Optional[float] = None, operation: str = "get") -> Dict:
+        """
+        Execute a query built with `client.query`.
+
+        Parameters:
+        - query: The query builder to execute.
+        - timeout (float, optional): Deadline of the call in seconds.
+        - operation (str, optional): The kind of query, e.g. 'get', 'hybrid', 'bm25' or 'generate'.
+
+        Returns:
+        - Dict: The raw GraphQL response.
+        """
+        return await self.run(query.do, timeout=timeout, operation=operation)
+
+    async def get_by_id(self, uuid: str, class_name: str) -> Optional[Dict]:
+        return await self.run(self._client.data_object.get_by_id, uuid, class_name=class_name,
+                              operation="get_by_id")
+
+    async def create(self, data_object: Dict, class_name: str) -> str:
+        return await self.run(self._client.data_object.create, data_object=stamp(data_object),
+                              class_name=class_name, operation="create")
+
+    async def replace(self, uuid: str, class_name: str, data_object: Dict) -> None:
+        return await self.run(self._client.data_object.replace, uuid=uuid, class_name=class_name,
+                              data_object=stamp(data_object), operation="replace")
+
+    async def delete(self, uuid: str, class_name: str) -> None:
+        return await self.run(self._client.data_object.delete, uuid, class_name=class_name, operation="delete")
+
+
+async_client = AsyncWeaviateClient(client, max_concurrency, call_timeout)
+
+Gauge("weaviate_requests_in_flight", "Weaviate calls being executed.", lambda: async_client.in_flight)
 
-if not client.schema.exists("Article"):
-    client.schema.create_class(class_article)
+# The batch object of the client is shared, so the batches of a worker are written one at a time
+batch_lock = threading.Lock()
 
-if not client.schema.exists("ArticleSaved"):
-    client.schema.create_class(class_saved_article)
 
-if not client.schema.exists("Organization"):
-    client.schema.create_class(class_organization)
+def write_batch(class_name: str, objects: List[Tuple[str, Dict]], batch_size: int, workers: int) -> Dict[str, str]:
+    """
+    Write objects with the batch API, setting their last-modified time. Blocking.
 
-if not client.schema.exists("OrganizationSaved"):
-    client.schema.create_class(class_saved_organization)
+    Parameters:
+    - class_name (str): The collection to write to.
+    - objects (List[Tuple[str, Dict]]): The ID and properties of every object.
+    - batch_size (int): The number of objects sent in one batch request.
+    - workers (int): The number of batch requests sent concurrently.
 
-if not client.schema.exists("News"):
-    client.schema.create_class(class_news)
+    Returns:
+    - Dict[str, str]: The error of every object rejected by Weaviate, by ID.
+    """
+    errors: Dict[str, str] = {}
 
-if not client.schema.exists("SavedNews"):
-    client.schema.create_class(class_saved_news)
+    def collect_errors(results: Optional[List[Dict]]) -> None:
+        for result in results or []:
+            for error in ((result.get("result") or {}).get("errors") or {}).get("error", []):
+                errors[result["id"]] = error["message"]
 
-if not client.schema.exists("Request"):
-    client.schema.create_class(class_requests)
+    with batch_lock:
+        client.batch.configure(batch_size=batch_size, num_workers=workers, dynamic=False,
+                               callback=collect_errors)
+        with client.batch as batch:
+            for object_id, properties in objects:
+                batch.add_data_object(stamp(properties), class_name, uuid=object_id)
+    return errors
 
 
 
+class SchemaBootstrap:
+    """
+    Connects to Weaviate and creates the missing classes in the background after startup.
 
+    The existing classes are read with a single `schema.get()` call. Failures are retried with
+    exponential backoff and the app keeps serving in the meantime, reporting itself as not ready.
+    """
 
+    def __init__(self, lazy_client: LazyWeaviateClient, classes: List[Dict], retry_delay: float, max_delay: float):
+        self._client = lazy_client
+        self._classes = classes
+        self._retry_delay = retry_delay
+        self._max_delay = max_delay
+        self.ready = False
+        self.attempts = 0
+        self.last_error: Optional[str] = None
+        self.duration: Optional[float] = None
 
+    def ensure_schema(self) -> List[str]:
+        """
+        Connect, create the classes missing from the schema and add the properties missing from the
+        existing classes. Blocking.
 
+        Returns:
+        - List[str]: The names of the classes created.
+        """
+        connected = self._client.connect()
+        existing = {schema_class["class"]: schema_class
+                    for schema_class in connected.schema.get().get("classes", [])}
+        created = []
+        for schema_class in self._classes:
+            if schema_class["class"] not in existing:
+                connected.schema.create_class(schema_class)
+                created.append(schema_class["class"])
+                continue
+            # Properties added to the definition after the class was created, such as UPDATED_AT
+            existing_properties = {prop["name"] for prop in existing[schema_class["class"]].get("properties") or []}
+            for prop in schema_class["properties"]:
+                if prop["name"] not in existing_properties:
+                    connected.schema.property.create(schema_class["class"], prop)
+        return created
 
+    async def run(self) -> None:
+        """
+        Retry `ensure_schema` until it succeeds, then mark the app as ready.
+        """
+        started = time.perf_counter()
+        delay = self._retry_delay
+        while True:
+            self.attempts += 1
+            try:
+                await asyncio.to_thread(self.ensure_schema)
+            except Exception as error:
+                self.last_error = f"{type(error).__name__}: {error}"
+                logger.warning("Weaviate schema bootstrap failed (attempt %d), retrying in %.1fs: %s",
+                               self.attempts, delay, self.last_error)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self._max_delay)
+                continue
+            self.ready = True
+            self.last_error = None
+            self.duration = time.perf_counter() - started
+            return
 
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "connected": self._client.connected,
+            "attempts": self.attempts,
+            "last_error": self.last_error,
+            "bootstrap_seconds": self.duration,
+        }
 
 
+schema_bootstrap = SchemaBootstrap(client, SCHEMA_CLASSES, schema_retry_delay, schema_retry_max_delay)
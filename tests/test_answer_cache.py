@@ -0,0 +1,71 @@
+"""
+Checks that concurrent requests for the same question share one generation, and that a cancelled
+request does not cancel it for the others.
+"""
+import asyncio
+
+from src.knowledge_base.answer_cache import AnswerCache
+
+
+async def embed_question(question):
+    return [1.0, 0.0] if "nisab" in question else [0.0, 1.0]
+
+
+def build_cache() -> AnswerCache:
+    return AnswerCache("AnswerCacheTest", maxsize=16, ttl=60, similarity_threshold=0.99,
+                       embed_question=embed_question)
+
+
+def test_concurrent_requests_share_one_generation():
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def scenario():
+        cache = build_cache()
+        answers = await asyncio.gather(*(cache.get_answer("What is Nisab?", generate) for _ in range(5)))
+        assert answers == ["answer"] * 5
+        assert await cache.get_answer("what is nisab", generate) == "answer"
+
+    asyncio.run(scenario())
+    assert len(calls) == 1
+
+
+def test_cancelled_request_does_not_cancel_the_others():
+    async def generate():
+        await asyncio.sleep(0.05)
+        return "answer"
+
+    async def scenario():
+        cache = build_cache()
+        first = asyncio.create_task(cache.get_answer("What is Nisab?", generate))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(cache.get_answer("What is Nisab?", generate))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "answer"
+        assert first.cancelled()
+
+    asyncio.run(scenario())
+
+
+def test_failed_generation_is_not_cached():
+    attempts = []
+
+    async def generate():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("upstream failed")
+        return "answer"
+
+    async def scenario():
+        cache = build_cache()
+        results = await asyncio.gather(cache.get_answer("zakat on gold", generate),
+                                       cache.get_answer("zakat on gold", generate), return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        assert await cache.get_answer("zakat on gold", generate) == "answer"
+
+    asyncio.run(scenario())
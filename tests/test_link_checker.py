@@ -0,0 +1,35 @@
+"""
+Checks that the links submitted by the editors are rejected with a 422 when they are invalid or not accessible.
+"""
+import asyncio
+
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from src import link_checker
+from src.link_checker import INVALID_LINK, NOT_ACCESSIBLE, LinkChecker
+
+
+@pytest.fixture
+def stub_sites(monkeypatch):
+    def respond(request):
+        return httpx.Response(200 if request.url.host == "example.com" else 404)
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(respond), follow_redirects=True)
+    monkeypatch.setattr(link_checker, "_http_client", client)
+    monkeypatch.setattr(link_checker, "link_checker", LinkChecker(4, 16, 60, 60))
+
+
+@pytest.mark.parametrize("url", ["http://[::1", "not a link"])
+def test_invalid_link_is_rejected(stub_sites, url):
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(link_checker.validate_link(url))
+    assert raised.value.status_code == 422
+    assert raised.value.detail == INVALID_LINK
+
+
+def test_check_links_reports_each_link(stub_sites):
+    urls = ["https://example.com/", "http://[::1", "https://missing.example.org/", "https://example.com/"]
+    errors = asyncio.run(link_checker.check_links(urls))
+    assert errors == [None, INVALID_LINK, NOT_ACCESSIBLE, None]
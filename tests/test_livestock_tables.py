@@ -0,0 +1,136 @@
+"""
+Checks the livestock bracket tables against the if/elif chains they replaced.
+
+Every head count from 0 to MAX_COUNT must give the same animals as the old chains, except where
+the old chains contradicted the Fiqh rules. `fiqh_due` gives the due of those counts with the
+rule each of them follows.
+"""
+from typing import List, Optional, Tuple
+
+import pytest
+
+from src.calculator.utility.nisab_on_livestock_calculation import LIVESTOCK_TABLES, calculate_herds
+from tests.livestock_oracle import old_due
+
+MAX_COUNT = 700
+
+Due = List[Tuple[str, int, int]]
+
+# Classical dues of camels past the table, from Hanafi resumption (istinaf): one hiqqa (age 4) for
+# every 50, and what is left is taxed like the start of the table
+CAMELS_PAST_TABLE = {
+    160: [("Camel", 3, 4), ("Sheep", 2, 0)],
+    170: [("Camel", 3, 4), ("Sheep", 4, 0)],
+    175: [("Camel", 3, 4), ("Camel", 1, 1)],
+    186: [("Camel", 3, 4), ("Camel", 1, 2)],
+    196: [("Camel", 4, 4)],
+    200: [("Camel", 4, 4)],
+    205: [("Camel", 4, 4), ("Sheep", 1, 0)],
+    250: [("Camel", 5, 4)],
+}
+
+# Classical dues of cattle past the table, from the hadith of Mu'adh: a tabi' (age 1) for every 30
+# and a musinna (age 2) for every 40
+CATTLE_PAST_TABLE = {
+    110: [(1, 1), (2, 2)],
+    120: [(3, 2)],
+    130: [(3, 1), (1, 2)],
+    140: [(2, 1), (2, 2)],
+    150: [(1, 1), (3, 2)],
+    160: [(4, 2)],
+}
+
+
+def as_tuples(animals) -> Due:
+    return [(animal.type, animal.quantity, animal.age) for animal in animals]
+
+
+def camels_by_resumption(count: int) -> Due:
+    """
+    One hiqqa for every 50 camels, and the camels left taxed like the start of the table: a sheep
+    for every 5 from 5, a bint makhad (age 1) from 25, a bint labun (age 2) from 36 and one more
+    hiqqa from 46.
+    """
+    hiqqas, rest = divmod(count, 50)
+    if rest >= 46:
+        return [("Camel", hiqqas + 1, 4)]
+    due = [("Camel", hiqqas, 4)]
+    if rest >= 36:
+        due.append(("Camel", 1, 2))
+    elif rest >= 25:
+        due.append(("Camel", 1, 1))
+    elif rest >= 5:
+        due.append(("Sheep", rest // 5, 0))
+    return due
+
+
+def cattle_by_groups(animal_type: str, count: int) -> Due:
+    """
+    The groups of 30 and 40 covering the most of the herd, with the most groups of 40 among them.
+    """
+    groups = [(thirties, forties) for forties in range(count // 40 + 1)
+              for thirties in range((count - forties * 40) // 30 + 1)]
+    thirties, forties = max(groups, key=lambda group: (group[0] * 30 + group[1] * 40, group[1]))
+    return [(animal_type, quantity, age) for quantity, age in ((thirties, 1), (forties, 2)) if quantity]
+
+
+def fiqh_due(kind: str, count: int) -> Optional[Due]:
+    """
+    Return the due of a count where the old chains were wrong, or None where they were right.
+    """
+    if kind == "camels":
+        # The Nisab of camels is 5, and 5 to 9 camels owe one sheep. The old chain started at 6,
+        # so 5 camels fell through to its last branch, '6 Camels'.
+        if count == 5:
+            return [("Sheep", 1, 1)]
+        # 130 to 134 camels owe two hiqqas and two sheep. The old chain skipped 130 and fell through.
+        if count == 130:
+            return [("Camel", 2, 4), ("Sheep", 2, 0)]
+        # The old chain had no rule past 159 and answered '6 Camels' for any count
+        if count >= 160:
+            return camels_by_resumption(count)
+        return None
+    if kind in ("cows", "buffaloes"):
+        # The old chains stopped at 109 and answered nothing past it
+        if count >= 110:
+            return cattle_by_groups("Cow" if kind == "cows" else "Buffaloe", count)
+        return None
+    animal_type = "Sheep" if kind == "sheep" else "Goat"
+    # From 201 to 399 one sheep is due for every complete hundred, at least three. The old chains
+    # switched to four at 399 instead of 400, kept four up to 598 instead of five from 500, and
+    # answered nothing from 599 on.
+    if count == 399:
+        return [(animal_type, 3, 0)]
+    if count >= 400:
+        return [(animal_type, count // 100, 0)]
+    return None
+
+
+@pytest.mark.parametrize("kind", sorted(LIVESTOCK_TABLES))
+def test_tables_match_old_chains_or_fiqh(kind):
+    for count in range(MAX_COUNT + 1):
+        due = as_tuples(LIVESTOCK_TABLES[kind].lookup(count))
+        expected = fiqh_due(kind, count)
+        if expected is None:
+            expected = as_tuples(old_due(kind, count))
+        assert due == expected, f"{count} {kind}"
+
+
+@pytest.mark.parametrize("count", sorted(CAMELS_PAST_TABLE))
+def test_camels_past_table(count):
+    assert as_tuples(LIVESTOCK_TABLES["camels"].lookup(count)) == CAMELS_PAST_TABLE[count]
+
+
+@pytest.mark.parametrize("count", sorted(CATTLE_PAST_TABLE))
+def test_cattle_past_table(count):
+    for kind, animal_type in (("cows", "Cow"), ("buffaloes", "Buffaloe")):
+        expected = [(animal_type, quantity, age) for quantity, age in CATTLE_PAST_TABLE[count]]
+        for units in range(10):
+            assert as_tuples(LIVESTOCK_TABLES[kind].lookup(count + units)) == expected
+
+
+def test_calculate_herds_matches_lookups():
+    counts = list(range(0, MAX_COUNT + 1, 7))
+    herds = {kind: counts for kind in LIVESTOCK_TABLES}
+    for count, animals in zip(counts, calculate_herds(herds)):
+        assert animals == [animal for kind in herds for animal in LIVESTOCK_TABLES[kind].lookup(count)]
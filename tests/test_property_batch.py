@@ -0,0 +1,83 @@
+"""
+Checks that a currency without an exchange rate only fails the properties of a batch that need it.
+"""
+import asyncio
+
+import orjson
+import pytest
+
+from src.calculator import router
+from src.calculator.schemas import ZakatOnProperty
+from src.calculator.utility import nisab_api_client
+from src.calculator.utility.nisab_api_client import RateCache
+from src.calculator.utility.property_valuation import value_properties, value_property
+
+# KZT is left out, as if metalpriceapi had no rate for it
+STUB_RATES = {"RUB": 90.0, "EUR": 0.92, "XAU": 0.0004, "XAG": 0.034}
+
+PROPERTY_FIELDS = ["cash_on_bank_cards", "silver_jewelry", "gold_jewelry", "purchased_product_for_resaling",
+                   "unfinished_product", "produced_product_for_resaling", "purchased_not_for_resaling",
+                   "used_after_nisab", "rent_money", "stocks_for_resaling", "income_from_stocks", "taxes_value"]
+
+
+def build_property(cash_currency: str, value: float = 1000000) -> ZakatOnProperty:
+    return ZakatOnProperty(cash=[{"currency_code": cash_currency, "value": value}],
+                           **{field: None for field in PROPERTY_FIELDS}, currency="RUB")
+
+
+def build_mixed_property() -> ZakatOnProperty:
+    fields = {field: None for field in PROPERTY_FIELDS}
+    fields.update(
+        cash_on_bank_cards=[{"currency_code": "EUR", "value": 2500.5}, {"currency_code": "XYZ", "value": 10000}],
+        silver_jewelry=[{"measurement_unit": "oz", "value": 12.5, "qarat": "875/884"},
+                        {"measurement_unit": "g", "value": None, "qarat": "999"}],
+        gold_jewelry=[{"measurement_unit": "kg", "value": 0.1, "qarat": "583/585/14K"},
+                      {"measurement_unit": "g", "value": 40, "qarat": "unknown"}],
+        taxes_value=[{"currency_code": "EUR", "value": 300}, {"currency_code": "RUB", "value": None}],
+    )
+    return ZakatOnProperty(cash=[{"currency_code": "RUB", "value": 150000}, {"currency_code": "EUR", "value": None}],
+                           **fields, currency="RUB")
+
+
+async def run_batch(properties):
+    response = await router.calculate_zakat_on_property_batch(properties)
+    body = b"".join([chunk.encode() async for chunk in response.body_iterator])
+    return [orjson.loads(line) for line in body.splitlines()]
+
+
+@pytest.fixture
+def stub_rates(monkeypatch):
+    calls = []
+
+    def fetch_rates(currencies):
+        calls.append(currencies)
+        return {currency: STUB_RATES[currency] for currency in currencies if currency in STUB_RATES}
+
+    rate_cache = RateCache(fetch_rates, ttl=60, timeout=5)
+    monkeypatch.setattr(router, "rate_cache", rate_cache)
+    monkeypatch.setattr(nisab_api_client, "rate_cache", rate_cache)
+    return calls
+
+
+def test_missing_rate_fails_only_its_properties(stub_rates):
+    items = asyncio.run(run_batch([build_property("EUR"), build_property("KZT"), build_property("RUB")]))
+    assert [item["index"] for item in items] == [0, 1, 2]
+    assert items[0]["result"] is not None and items[2]["result"] is not None
+    assert items[1]["result"] is None and items[1]["error"] == "No exchange rate for KZT"
+    assert len(stub_rates) == 1
+
+
+@pytest.mark.parametrize("build", [lambda: build_property("EUR", 500000), build_mixed_property],
+                         ids=["cash", "mixed"])
+def test_batch_matches_single_property(stub_rates, build):
+    items = asyncio.run(run_batch([build()]))
+    single = asyncio.run(router.calculate_zakat_on_property(build()))
+    assert items[0]["result"] == single.model_dump()
+
+
+def test_batch_values_items_like_value_property(stub_rates):
+    properties = [build_mixed_property(), build_property("EUR", 1234.5)]
+    rates = asyncio.run(nisab_api_client.rate_cache.get_rates({"RUB", "EUR", "XAU", "XAG"}))
+    singles = [asyncio.run(value_property(property)) for property in properties]
+    assert value_properties(properties, rates) == singles
+    assert singles[0] > 150000
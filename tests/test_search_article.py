@@ -0,0 +1,65 @@
+"""
+Checks that search_article embeds the normalized search string and filters the candidates of a single query.
+"""
+import asyncio
+import json
+
+import pytest
+
+from src.fake_weaviate import FakeWeaviateClient
+from src.knowledge_base.knowledge_base_user import router
+from src.knowledge_base.models import SearchInput
+from src.weaviate_client import AsyncWeaviateClient
+
+# Articles with their vector, the search string is embedded as [1, 0]
+ARTICLES = {
+    "Nisab of gold": [1.0, 0.1],
+    "Nisab of silver": [1.0, 0.3],
+    "Zakat on livestock": [0.2, 1.0],
+    "Zakat al-Fitr": [0.0, 1.0],
+}
+
+
+@pytest.fixture
+def fake_search(monkeypatch):
+    fake = FakeWeaviateClient()
+    object_ids = fake.load("Article", [{"tags": ["zakat"], "title": title, "text": title, "content": '{"ops": []}'}
+                                       for title in ARTICLES])
+    for object_id, vector in zip(object_ids, ARTICLES.values()):
+        fake.store.get("Article", object_id)["vector"] = vector
+    queries = []
+
+    async def embed_query(text):
+        queries.append(text)
+        return [1.0, 0.0]
+
+    monkeypatch.setattr(router, "client", fake)
+    monkeypatch.setattr(router, "async_client", AsyncWeaviateClient(fake, 2, 5))
+    monkeypatch.setattr(router, "embed_query", embed_query)
+    return fake, queries
+
+
+def search(search_string: str):
+    response = asyncio.run(router.search_article(SearchInput(searchString=search_string)))
+    return [article["title"] for article in json.loads(response.body)]
+
+
+def test_search_embeds_the_normalized_string(fake_search):
+    _, queries = fake_search
+    search("  Nisab  OF Gold ")
+    assert queries == ["nisab of gold"]
+
+
+def test_search_returns_the_close_articles(fake_search, monkeypatch):
+    fake, _ = fake_search
+    monkeypatch.setattr(router, "SEARCH_MIN_RESULTS", 2)
+    titles = search("nisab of gold and silver")
+    assert sorted(titles) == ["Nisab of gold", "Nisab of silver"]
+    assert fake.calls == 1
+
+
+def test_search_falls_back_to_the_best_articles(fake_search):
+    fake, _ = fake_search
+    titles = search("nisab rules")
+    assert len(titles) == router.SEARCH_MIN_RESULTS
+    assert fake.calls == 1
@@ -0,0 +1,60 @@
+"""
+Checks that AsyncWeaviateClient bounds the blocking calls running, including the abandoned ones.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from src.weaviate_client import AsyncWeaviateClient
+
+
+class SlowCall:
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        time.sleep(self.seconds)
+        with self._lock:
+            self.running -= 1
+
+
+def test_timed_out_calls_keep_their_slot():
+    async def scenario():
+        async_client = AsyncWeaviateClient(None, concurrency=2, timeout=0.05)
+        call = SlowCall(0.3)
+
+        async def run():
+            with pytest.raises(HTTPException) as error:
+                await async_client.run(call)
+            return error.value.status_code
+
+        assert await asyncio.gather(*(run() for _ in range(6))) == [504] * 6
+        assert call.peak == 2
+        await asyncio.sleep(0.4)
+        assert async_client.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_keeps_its_slot():
+    async def scenario():
+        async_client = AsyncWeaviateClient(None, concurrency=1, timeout=5)
+        task = asyncio.create_task(async_client.run(SlowCall(0.2)))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        await asyncio.sleep(0)
+        assert async_client.in_flight == 1
+        assert async_client._semaphore.locked()
+        await asyncio.sleep(0.3)
+        assert async_client.in_flight == 0
+
+    asyncio.run(scenario())